@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.tests.utils import commit_callbacks
+from posts.models import Comment, Follow, Group, Post
+from posts.tests.test_queries import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class ApiTests(QueryBudgetMixin, TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(
+            username='TestPostAuthor', first_name='Имя')
+        cls.reader = User.objects.create(username='TestReader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        # Подписка раньше записей: они раскладываются в ленту при публикации.
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, text=f'Запись {number}', group=cls.group)
+            for number in range(25)
+        ]
+        Comment.objects.create(
+            post=cls.posts[-1], author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        self.client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_post_list_pages(self):
+        """Список записей идёт страницами по курсору, новые первыми."""
+        url = reverse('api:post_list')
+        data = self.assertWithinBudget(self.client, url).json()
+        self.assertEqual(len(data['results']), 20)
+        first = data['results'][0]
+        self.assertEqual(first['id'], self.posts[-1].pk)
+        self.assertEqual(first['author'], 'TestPostAuthor')
+        self.assertEqual(first['group'], 'test-slug')
+        self.assertEqual(first['comment_count'], 1)
+        self.assertIsNone(first['image'])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(
+            [row['id'] for row in data['results']],
+            [post.pk for post in self.posts[4::-1]])
+        self.assertIsNone(data['next'])
+
+    def test_sparse_fields(self):
+        """?fields= оставляет только нужные поля и сохраняется в ссылках."""
+        response = self.client.get(
+            reverse('api:post_list'), {'fields': 'id,text'})
+        data = response.json()
+        self.assertEqual(set(data['results'][0]), {'id', 'text'})
+        self.assertIn('fields=id%2Ctext', data['next'])
+        response = self.client.get(
+            reverse('api:post_list'), {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_post_detail_etag(self):
+        """Запись отдаётся с ETag, повтор с ним получает 304."""
+        url = reverse('api:post_detail', kwargs={'post_id': self.posts[0].pk})
+        response = self.assertWithinBudget(self.client, url)
+        self.assertEqual(response.json()['text'], 'Запись 0')
+        repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        missing = self.client.get(
+            reverse('api:post_detail', kwargs={'post_id': 10 ** 6}))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_post_detail_etag_per_representation(self):
+        """У HTML и разных fields одной записи разные ETag."""
+        post_id = self.posts[0].pk
+        url = reverse('api:post_detail', kwargs={'post_id': post_id})
+        responses = [
+            self.client.get(url, {'fields': 'id'}),
+            self.client.get(url, {'fields': 'id,text'}),
+            self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': post_id})),
+        ]
+        etags = {response['ETag'] for response in responses}
+        self.assertEqual(len(etags), 3)
+        self.assertIn('Cookie', responses[0]['Vary'])
+
+    def test_group_and_profile(self):
+        """Группы, посты группы и профиль автора."""
+        groups = self.client.get(reverse('api:group_list')).json()
+        self.assertEqual(groups['results'][0]['slug'], 'test-slug')
+        data = self.assertWithinBudget(self.client, reverse(
+            'api:group_posts', kwargs={'slug': 'test-slug'})).json()
+        self.assertEqual(len(data['results']), 20)
+        profile = self.assertWithinBudget(self.client, reverse(
+            'api:profile', kwargs={'username': 'TestPostAuthor'})).json()
+        self.assertEqual(profile['posts'], 25)
+        self.assertEqual(profile['followers'], 1)
+        self.assertEqual(profile['first_name'], 'Имя')
+        self.assertWithinBudget(self.client, reverse(
+            'api:profile_posts', kwargs={'username': 'TestPostAuthor'}))
+
+    def test_list_etag(self):
+        """Неизменившийся список отдаёт 304, новая запись - новый ETag."""
+        url = reverse('api:post_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with commit_callbacks():
+            Post.objects.create(author=self.author, text='Новая запись')
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed(self):
+        """Лента подписок только для вошедших, с ETag по содержимому."""
+        url = reverse('api:feed')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        response = self.assertWithinBudget(self.authorized_client, url)
+        self.assertEqual(len(response.json()['results']), 20)
+        repeat = self.authorized_client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
@@ -0,0 +1,245 @@
+import hashlib
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_safe
+from django.views.decorators.vary import vary_on_cookie
+
+from core.decorators import query_budget
+from core.page_cache import cache_page_by_generation, make_etag, not_modified
+from core.paginator import ValuesCursorPaginator
+from posts import sharding
+from posts.models import Group, Post
+from posts.sharding import ValuesScatterPaginator
+from posts.timeline import FeedPaginator
+from posts.views import PAGE_CACHE_TIMEOUT, post_validators
+
+User = get_user_model()
+
+JSON_CONTENT_TYPE = 'application/json'
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Поле ответа -> путь для values(). По нему же значение берётся из
+# объекта, когда строки приходят моделями (лента подписок).
+POST_FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'comment_count': 'comment_count',
+    'created': 'created',
+    'modified': 'modified',
+}
+GROUP_FIELDS = ('slug', 'title', 'description')
+PROFILE_FIELDS = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'posts': 'stats__post_count',
+    'followers': 'stats__follower_count',
+    'following': 'stats__following_count',
+}
+# Ключ постраничного вывода читается всегда, даже если его не просили.
+CURSOR_FIELDS = ('id', 'created')
+
+
+class BadRequest(Exception):
+    pass
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def error(status, message):
+    return json_response({'error': message}, status=status)
+
+
+def post_etag(request, post_id):
+    return post_validators(request, post_id, JSON_CONTENT_TYPE)[0]
+
+
+def post_last_modified(request, post_id):
+    return post_validators(request, post_id, JSON_CONTENT_TYPE)[1]
+
+
+def requested_fields(request):
+    """Поля из ?fields=id,text в порядке POST_FIELDS, по умолчанию все."""
+    value = request.GET.get('fields')
+    if not value:
+        return list(POST_FIELDS)
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = set(names) - set(POST_FIELDS)
+    if unknown:
+        raise BadRequest(f'Неизвестные поля: {", ".join(sorted(unknown))}')
+    return [name for name in POST_FIELDS if name in names]
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise BadRequest('limit должен быть числом')
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def resolve(obj, path):
+    for attribute in path.split('__'):
+        if obj is None:
+            return None
+        obj = getattr(obj, attribute)
+    return obj
+
+
+def serialize(row, fields):
+    """Строка values() или модель -> словарь ответа с полями fields."""
+    if isinstance(row, dict):
+        data = {name: row[POST_FIELDS[name]] for name in fields}
+    else:
+        data = {name: resolve(row, POST_FIELDS[name]) for name in fields}
+    if data.get('image'):
+        data['image'] = default_storage.url(str(data['image']))
+    elif 'image' in data:
+        data['image'] = None
+    return data
+
+
+def page_link(request, cursor):
+    if not cursor:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return f'{request.path}?{query.urlencode()}'
+
+
+def post_page(request, queryset=None, paginator=None,
+              paginator_class=ValuesScatterPaginator):
+    """
+    Страница записей по курсору.
+
+    Быстрый путь: values() только с нужными полями, без создания
+    моделей и лишних JOIN - автор и группа присоединяются, только если
+    их попросили. Курсоры те же, что у HTML-страниц. По умолчанию
+    queryset читается со всех шардов.
+    """
+    try:
+        fields = requested_fields(request)
+        size = page_size(request)
+    except BadRequest as exc:
+        return error(400, str(exc))
+    if paginator is None:
+        lookups = {POST_FIELDS[name] for name in fields} | set(CURSOR_FIELDS)
+        paginator = paginator_class(queryset.values(*lookups), size)
+    else:
+        paginator.per_page = size
+    page = paginator.get_page(request.GET.get('cursor'))
+    return json_response({
+        'results': [serialize(row, fields) for row in page],
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+    })
+
+
+@query_budget(1, per_shard=1)
+@require_safe
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'index')
+def post_list(request):
+    return post_page(request, Post.objects.all())
+
+
+# С шардами запись, которой нет в кеше, ищется опросом шардов.
+@query_budget(2, per_shard=2)
+@require_safe
+@vary_on_cookie
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
+def post_detail(request, post_id):
+    try:
+        fields = requested_fields(request)
+    except BadRequest as exc:
+        return error(400, str(exc))
+    row = (
+        sharding.using_post(Post.objects.filter(pk=post_id), post_id)
+        .values(*{POST_FIELDS[name] for name in fields}).first()
+    )
+    if row is None:
+        return error(404, 'Запись не найдена')
+    return json_response(serialize(row, fields))
+
+
+@query_budget(1)
+@require_safe
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'groups')
+def group_list(request):
+    groups = Group.objects.order_by('title').values(*GROUP_FIELDS)
+    return json_response({'results': list(groups)})
+
+
+@query_budget(2, per_shard=1)
+@require_safe
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'group:{slug}')
+def group_posts(request, slug):
+    group_id = (
+        Group.objects.filter(slug=slug).values_list('pk', flat=True).first())
+    if group_id is None:
+        return error(404, 'Группа не найдена')
+    return post_page(request, Post.objects.filter(group_id=group_id))
+
+
+@query_budget(1)
+@require_safe
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'profile:{username}')
+def profile(request, username):
+    row = (
+        User.objects.filter(username=username)
+        .values(*PROFILE_FIELDS.values()).first()
+    )
+    if row is None:
+        return error(404, 'Пользователь не найден')
+    data = {name: row[lookup] for name, lookup in PROFILE_FIELDS.items()}
+    # Счётчиков может ещё не быть, их создаёт первая запись.
+    for name in ('posts', 'followers', 'following'):
+        data[name] = data[name] or 0
+    return json_response(data)
+
+
+# С шардами к запросам добавляется шард автора, пока его нет в кеше.
+@query_budget(2, per_shard=1)
+@require_safe
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'profile:{username}')
+def profile_posts(request, username):
+    author_id = (
+        User.objects.filter(username=username)
+        .values_list('pk', flat=True).first()
+    )
+    if author_id is None:
+        return error(404, 'Пользователь не найден')
+    posts = sharding.using_author(
+        Post.objects.filter(author_id=author_id), author_id)
+    return post_page(request, posts, paginator_class=ValuesCursorPaginator)
+
+
+@query_budget(6, per_shard=4)
+@require_safe
+def feed(request):
+    """
+    Лента подписок текущего пользователя.
+
+    Лента собирается FeedPaginator из моделей, поэтому идёт обычным
+    путём, а ETag считается по готовому ответу: клиент с той же
+    страницей получит 304 без тела.
+    """
+    if not request.user.is_authenticated:
+        return error(401, 'Нужен вход')
+    response = post_page(
+        request, paginator=FeedPaginator(request.user, PAGE_SIZE))
+    if response.status_code != 200:
+        return response
+    etag = make_etag(request, hashlib.md5(response.content).hexdigest())
+    response['ETag'] = etag
+    return not_modified(request, etag) or response
@@ -0,0 +1,35 @@
+from django.contrib import admin
+
+from core.models import SlowQuery
+
+
+class SlowQueryAdmin(admin.ModelAdmin):
+    list_display = (
+        'sql',
+        'view',
+        'calls',
+        'total_ms',
+        'max_ms',
+        'last_seen',
+    )
+    list_filter = ('view', 'database')
+    search_fields = ('sql', 'view')
+    readonly_fields = (
+        'fingerprint',
+        'sql',
+        'example',
+        'view',
+        'database',
+        'plan',
+        'calls',
+        'total_ms',
+        'max_ms',
+        'created',
+        'last_seen',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+
+admin.site.register(SlowQuery, SlowQueryAdmin)
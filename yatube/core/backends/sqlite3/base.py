@@ -0,0 +1,224 @@
+import collections
+import logging
+import random
+import sqlite3
+import threading
+import time
+
+from django.db.backends.sqlite3 import base
+
+logger = logging.getLogger(__name__)
+
+# Выполняются на каждом новом соединении, переопределяются через
+# OPTIONS['PRAGMAS']. WAL даёт читать во время записи, NORMAL в WAL не
+# теряет согласованность при падении процесса. cache_size в минус
+# килобайтах - 64 МБ страниц на соединение.
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,
+    'mmap_size': 268435456,
+    'busy_timeout': 5000,
+}
+BUSY_RETRIES = 3
+BUSY_BACKOFF = 0.05
+WRITE_STATEMENTS = (
+    'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER')
+
+
+def is_busy(exc):
+    message = str(exc)
+    return 'locked' in message or 'busy' in message
+
+
+class WriteQueue:
+    """
+    Очередь на запись в один файл базы внутри процесса.
+
+    Потоки получают право писать строго по очереди прихода. Пока оно у
+    одного потока, остальные ждут здесь, а не крутятся в busy handler
+    SQLite, который будит их наугад и по таймеру. Между процессами
+    запись по-прежнему разводит блокировка самой SQLite.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters = collections.deque()
+        self._busy = False
+
+    def acquire(self, timeout):
+        """Ждёт очереди не дольше timeout, False - не дождались."""
+        with self._lock:
+            if not self._busy and not self._waiters:
+                self._busy = True
+                return True
+            turn = threading.Event()
+            self._waiters.append(turn)
+        if turn.wait(timeout):
+            return True
+        with self._lock:
+            try:
+                self._waiters.remove(turn)
+            except ValueError:
+                # Очередь передали, пока истекал таймаут.
+                return True
+        return False
+
+    def release(self):
+        with self._lock:
+            if self._waiters:
+                # Право писать переходит следующему без освобождения,
+                # чтобы его не перехватил только что пришедший поток.
+                self._waiters.popleft().set()
+            else:
+                self._busy = False
+
+
+_queues = collections.defaultdict(WriteQueue)
+
+
+class CursorWrapper(base.SQLiteCursorWrapper):
+    """
+    Курсор, который встаёт в очередь на запись и повторяет запрос,
+    получивший SQLITE_BUSY.
+
+    Транзакцию atomic_write() DatabaseWrapper открывает уже с
+    блокировкой, внутри неё SQLite занятой не бывает, и запросы идут
+    как есть. В обычной транзакции (BEGIN DEFERRED) - это atomic()
+    самого Django: delete(), bulk_create(), get_or_create() - первая
+    запись встаёт в очередь и держит её до фиксации или отката.
+    """
+
+    db = None
+
+    def execute(self, query, params=None):
+        return self._run(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self._run(super().executemany, query, param_list)
+
+    def _run(self, method, query, params):
+        if self.db.write_locked:
+            return method(query, params)
+        writes = query.lstrip()[:7].upper().startswith(WRITE_STATEMENTS)
+        queue = None
+        if writes and self.db.held_queue is None:
+            queue = self.db.queue_write()
+        try:
+            return self.db.retry_busy(method, query, params)
+        finally:
+            if queue is not None and self.connection.in_transaction:
+                # Очередь отпустят фиксация или откат транзакции.
+                self.db.held_queue = queue
+            elif queue is not None:
+                queue.release()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    SQLite для нагрузки с несколькими потоками и воркерами.
+
+    Каждое соединение получает PRAGMAS, ошибки занятой базы вне
+    транзакции atomic_write() повторяются BUSY_RETRIES раз с растущей
+    паузой.
+    Транзакции core.db.atomic_write() открываются через BEGIN
+    IMMEDIATE: блокировка на запись берётся сразу, а не при первой
+    записи, когда отдать её уже нельзя и SQLite отвечает "database is
+    locked" без ожидания. Обычный atomic() остаётся BEGIN DEFERRED и
+    не мешает писателям. Записи одного процесса идут через WriteQueue.
+
+    Дополнительные OPTIONS: PRAGMAS (слияние с PRAGMAS) и
+    BUSY_RETRIES.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.held_queue = None
+        # Ставит core.db.atomic_write() на время BEGIN.
+        self.begin_immediate = False
+        # Транзакция открыта через BEGIN IMMEDIATE.
+        self.write_locked = False
+        options = self.settings_dict['OPTIONS']
+        self.pragmas = {**PRAGMAS, **options.get('PRAGMAS', {})}
+        self.busy_retries = options.get('BUSY_RETRIES', BUSY_RETRIES)
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('PRAGMAS', None)
+        params.pop('BUSY_RETRIES', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorWrapper)
+        cursor.db = self
+        return cursor
+
+    def queue_write(self):
+        """
+        Встаёт в очередь на запись и возвращает её, когда подошла
+        очередь. Не дождавшись за busy_timeout, возвращает None и пишет
+        без очереди: дальше рассудит сама SQLite.
+        """
+        # NAME читается каждый раз: тесты подменяют его после создания.
+        queue = _queues[self.settings_dict['NAME']]
+        timeout = self.pragmas['busy_timeout'] / 1000
+        if queue.acquire(timeout):
+            return queue
+        logger.warning('Очередь на запись в %s не дошла за %s с',
+                       self.alias, timeout)
+        return None
+
+    def retry_busy(self, method, *args):
+        delay = BUSY_BACKOFF
+        for attempt in range(self.busy_retries + 1):
+            try:
+                return method(*args)
+            except sqlite3.OperationalError as exc:
+                if not is_busy(exc) or attempt == self.busy_retries:
+                    raise
+                logger.info('%s занята, повтор через %.2f с',
+                            self.alias, delay)
+            time.sleep(delay + random.uniform(0, delay))
+            delay *= 2
+
+    def _start_transaction_under_autocommit(self):
+        if not self.begin_immediate:
+            super()._start_transaction_under_autocommit()
+            return
+        self.held_queue = self.queue_write()
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self._release_write()
+            raise
+        self.write_locked = True
+
+    def _release_write(self):
+        self.write_locked = False
+        queue, self.held_queue = self.held_queue, None
+        if queue is not None:
+            queue.release()
+
+    def _commit(self):
+        try:
+            super()._commit()
+        finally:
+            self._release_write()
+
+    def _rollback(self):
+        try:
+            super()._rollback()
+        finally:
+            self._release_write()
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self._release_write()
@@ -0,0 +1,313 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.profiling import timed
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires REAL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (name, value) VALUES
+    ('entries', 0), ('bytes', 0), ('hits', 0), ('misses', 0),
+    ('evictions', 0);
+CREATE TRIGGER IF NOT EXISTS cache_insert AFTER INSERT ON cache BEGIN
+    UPDATE meta SET value = value + 1 WHERE name = 'entries';
+    UPDATE meta SET value = value + NEW.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_delete AFTER DELETE ON cache BEGIN
+    UPDATE meta SET value = value - 1 WHERE name = 'entries';
+    UPDATE meta SET value = value - OLD.size WHERE name = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS cache_update AFTER UPDATE OF size ON cache
+BEGIN
+    UPDATE meta SET value = value + NEW.size - OLD.size
+    WHERE name = 'bytes';
+END;
+'''
+
+UPSERT = '''
+INSERT INTO cache (key, value, expires, accessed, size)
+VALUES (?, ?, ?, ?, ?)
+ON CONFLICT (key) DO UPDATE SET
+    value = excluded.value,
+    expires = excluded.expires,
+    accessed = excluded.accessed,
+    size = excluded.size
+'''
+
+# SQLite ограничивает число параметров в одном запросе.
+CHUNK_SIZE = 500
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кеш в файле SQLite, общий для всех процессов на одной машине.
+
+    В отличие от LocMemCache все воркеры видят одни и те же записи и
+    сбросы кеша. Размер ограничен MAX_ENTRIES и MAX_BYTES, при
+    переполнении вытесняются давно не читавшиеся записи (LRU). Время
+    чтения обновляется не чаще раза в LRU_RESOLUTION секунд, чтобы
+    чтения почти не превращались в записи. incr атомарен между
+    процессами, счётчики попаданий, промахов и вытеснений общие.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_bytes = int(options.get('MAX_BYTES', 64 * 1024 * 1024))
+        self._lru_resolution = float(options.get('LRU_RESOLUTION', 1))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._stats_flush_every = int(options.get('STATS_FLUSH_EVERY', 100))
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._pending = {'hits': 0, 'misses': 0}
+
+    @property
+    def _db(self):
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            # После fork соединение родителя использовать нельзя.
+            self._local.db = self._connect()
+            self._local.pid = pid
+        return self._local.db
+
+    def _connect(self):
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(
+            self._path, timeout=self._busy_timeout, isolation_level=None,
+            check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('PRAGMA mmap_size=268435456')
+        db.executescript(SCHEMA)
+        return db
+
+    @staticmethod
+    def _chunks(items):
+        items = list(items)
+        for start in range(0, len(items), CHUNK_SIZE):
+            yield items[start:start + CHUNK_SIZE]
+
+    def _make(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _count(self, hits=0, misses=0):
+        with self._stats_lock:
+            self._pending['hits'] += hits
+            self._pending['misses'] += misses
+            total = self._pending['hits'] + self._pending['misses']
+            if total < self._stats_flush_every:
+                return
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+        self._flush_stats(pending)
+
+    def _flush_stats(self, pending):
+        self._db.executemany(
+            'UPDATE meta SET value = value + ? WHERE name = ?',
+            [(value, name) for name, value in pending.items() if value])
+
+    def _read(self, keys):
+        now = time.time()
+        found, stale = {}, []
+        for chunk in self._chunks(keys):
+            marks = ','.join('?' * len(chunk))
+            rows = self._db.execute(
+                f'SELECT key, value, expires, accessed FROM cache '
+                f'WHERE key IN ({marks})', chunk)
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    continue
+                found[key] = pickle.loads(value)
+                if accessed < now - self._lru_resolution:
+                    stale.append(key)
+        for chunk in self._chunks(stale):
+            marks = ','.join('?' * len(chunk))
+            self._db.execute(
+                f'UPDATE cache SET accessed = ? WHERE key IN ({marks})',
+                [now, *chunk])
+        self._count(hits=len(found), misses=len(keys) - len(found))
+        return found
+
+    def _write(self, items, timeout):
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in items:
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            rows.append((key, data, expires, now, len(data)))
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(UPSERT, rows)
+            self._evict(db, now)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+
+    def _evict(self, db, now):
+        entries, size = self._usage(db)
+        if entries <= self._max_entries and size <= self._max_bytes:
+            return
+        evicted = db.execute(
+            'DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?',
+            [now]).rowcount
+        entries, size = self._usage(db)
+        if entries > self._max_entries:
+            excess = entries - self._max_entries
+            limit = max(excess, entries // self._cull_frequency)
+            evicted += db.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', [limit]).rowcount
+            entries, size = self._usage(db)
+        if size > self._max_bytes:
+            freed, victims = 0, []
+            rows = db.execute('SELECT key, size FROM cache ORDER BY accessed')
+            for key, item_size in rows:
+                victims.append(key)
+                freed += item_size
+                if size - freed <= self._max_bytes:
+                    break
+            for chunk in self._chunks(victims):
+                marks = ','.join('?' * len(chunk))
+                evicted += db.execute(
+                    f'DELETE FROM cache WHERE key IN ({marks})',
+                    chunk).rowcount
+        if evicted:
+            db.execute(
+                "UPDATE meta SET value = value + ? WHERE name = 'evictions'",
+                [evicted])
+
+    @staticmethod
+    def _usage(db):
+        values = dict(db.execute(
+            "SELECT name, value FROM meta WHERE name IN ('entries', 'bytes')"))
+        return values['entries'], values['bytes']
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._make(key, version)
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        now = time.time()
+        expires = self.get_backend_timeout(timeout)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires IS NOT NULL '
+                'AND expires <= ?', [key, now])
+            added = db.execute(
+                'INSERT OR IGNORE INTO cache '
+                '(key, value, expires, accessed, size) '
+                'VALUES (?, ?, ?, ?, ?)',
+                [key, data, expires, now, len(data)]).rowcount
+            if added:
+                self._evict(db, now)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return bool(added)
+
+    def get(self, key, default=None, version=None):
+        key = self._make(key, version)
+        with timed('cache'):
+            return self._read([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._make(key, version): key for key in keys}
+        with timed('cache'):
+            found = self._read(list(made))
+        return {made[key]: value for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        with timed('cache'):
+            self._write([(self._make(key, version), value)], timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with timed('cache'):
+            self._write(
+                [(self._make(key, version), value)
+                 for key, value in data.items()],
+                timeout,
+            )
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._make(key, version)
+        return bool(self._db.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? AND '
+            '(expires IS NULL OR expires > ?)',
+            [self.get_backend_timeout(timeout), key, time.time()]).rowcount)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def delete_many(self, keys, version=None):
+        made = [self._make(key, version) for key in keys]
+        for chunk in self._chunks(made):
+            marks = ','.join('?' * len(chunk))
+            self._db.execute(
+                f'DELETE FROM cache WHERE key IN ({marks})', chunk)
+
+    def has_key(self, key, version=None):
+        key = self._make(key, version)
+        row = self._db.execute(
+            'SELECT 1 FROM cache WHERE key = ? AND '
+            '(expires IS NULL OR expires > ?)', [key, time.time()]).fetchone()
+        return row is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._make(key, version)
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT value FROM cache WHERE key = ? AND '
+                '(expires IS NULL OR expires > ?)',
+                [key, time.time()]).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET value = ?, size = ? WHERE key = ?',
+                [data, len(data), key])
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        return value
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def stats(self):
+        """Общие для всех процессов счётчики кеша."""
+        with self._stats_lock:
+            pending, self._pending = self._pending, {'hits': 0, 'misses': 0}
+        self._flush_stats(pending)
+        return dict(self._db.execute('SELECT name, value FROM meta'))
+
+    def close(self, **kwargs):
+        # Соединение живёт всё время жизни потока, как и у LocMemCache
+        # состояние - всё время жизни процесса.
+        pass
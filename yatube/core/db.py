@@ -0,0 +1,23 @@
+import contextlib
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+@contextlib.contextmanager
+def atomic_write(using=None, savepoint=True):
+    """
+    transaction.atomic() для блоков, которые пишут.
+
+    core.backends.sqlite3 открывает такую транзакцию через BEGIN
+    IMMEDIATE в очереди на запись, а обычный atomic() - через BEGIN
+    DEFERRED без очереди. Вложенный блок идёт в уже открытой транзакции,
+    другие бэкенды флаг не читают.
+    """
+    connection = connections[using or DEFAULT_DB_ALIAS]
+    connection.begin_immediate = True
+    try:
+        with transaction.atomic(using, savepoint):
+            connection.begin_immediate = False
+            yield
+    finally:
+        connection.begin_immediate = False
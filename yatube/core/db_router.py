@@ -0,0 +1,65 @@
+import contextvars
+import random
+
+from django.conf import settings
+
+PRIMARY = 'default'
+
+# Чтения идут в основную базу. По умолчанию так везде: в миграциях,
+# командах и shell реплика может отставать от только что записанного.
+# В реплики читают лишь веб-запросы, которые ReplicaMiddleware
+# открепил: запрос не пишет сам и пользователь недавно не писал.
+_pinned = contextvars.ContextVar('db_pinned', default=True)
+# Запрос что-то записал: остаток запроса и следующие запросы
+# пользователя читают основную базу, пока реплики не догонят.
+_wrote = contextvars.ContextVar('db_wrote', default=False)
+
+
+def pin(value=True):
+    return _pinned.set(value)
+
+
+def unpin(token):
+    _pinned.reset(token)
+
+
+def start_tracking():
+    return _wrote.set(False)
+
+
+def wrote():
+    return _wrote.get()
+
+
+def stop_tracking(token):
+    _wrote.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Запись - в основную базу, чтение - в случайную реплику.
+
+    Реплики перечислены в DATABASE_REPLICAS, без них всё идёт в
+    default. Вне откреплённого веб-запроса (см. ReplicaMiddleware)
+    чтение тоже идёт в основную базу. Миграции применяются только к
+    ней: реплики - её копии.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or _pinned.get() or _wrote.get():
+            return PRIMARY
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
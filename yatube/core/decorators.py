@@ -0,0 +1,17 @@
+from django.conf import settings
+
+
+def query_budget(limit, per_shard=0):
+    """
+    Объявляет, сколько SQL-запросов может сделать view за один запрос.
+
+    Сам по себе ничего не проверяет: бюджет читают тесты, и они падают,
+    если шаблон или view снова начинают ходить в базу на каждую запись.
+    per_shard - сколько запросов добавляет каждый шард сверх первого:
+    ленты собираются по запросу с каждого шарда.
+    """
+    def decorator(view):
+        shards = len(settings.DATABASE_SHARDS)
+        view.query_budget = limit + per_shard * (shards - 1)
+        return view
+    return decorator
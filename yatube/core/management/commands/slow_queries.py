@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = 'Показывает самые дорогие запросы из журнала медленных запросов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=20,
+            help='Сколько запросов показать',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Вывести журнал в JSON',
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Очистить журнал после вывода',
+        )
+
+    def handle(self, *args, **options):
+        queries = SlowQuery.objects.all()[:options['limit']]
+        if options['json']:
+            self.stdout.write(json.dumps([
+                {
+                    'sql': query.sql,
+                    'example': query.example,
+                    'view': query.view,
+                    'database': query.database,
+                    'plan': query.plan,
+                    'calls': query.calls,
+                    'total_ms': query.total_ms,
+                    'max_ms': query.max_ms,
+                    'last_seen': query.last_seen.isoformat(),
+                }
+                for query in queries
+            ], ensure_ascii=False, indent=2))
+        else:
+            for query in queries:
+                self.stdout.write(self.style.WARNING(
+                    f'{query.total_ms:.0f} мс всего, {query.calls} раз, '
+                    f'до {query.max_ms:.0f} мс, {query.view}'))
+                self.stdout.write(query.sql)
+                if query.plan:
+                    self.stdout.write(query.plan)
+                self.stdout.write('')
+        if options['clear']:
+            SlowQuery.objects.all().delete()
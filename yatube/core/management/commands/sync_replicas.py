@@ -0,0 +1,48 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.db_router import PRIMARY
+
+
+class Command(BaseCommand):
+    help = 'Копирует основную базу SQLite в файлы реплик'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0,
+            help='Повторять каждые N секунд, 0 - скопировать один раз',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Снимок делается через backup API SQLite: копия согласована даже
+        при идущей записи. Файл реплики заменяется постранично, читатели
+        реплики видят либо старую, либо новую копию целиком. Интервал
+        стоит держать меньше REPLICA_PIN_SECONDS.
+        """
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплик нет, задайте YATUBE_REPLICAS')
+        primary = connections[PRIMARY]
+        if primary.vendor != 'sqlite':
+            raise CommandError('Копировать файлом можно только SQLite')
+        while True:
+            started = time.monotonic()
+            primary.ensure_connection()
+            for alias in settings.DATABASE_REPLICAS:
+                target = sqlite3.connect(
+                    connections[alias].settings_dict['NAME'])
+                try:
+                    primary.connection.backup(target)
+                finally:
+                    target.close()
+            self.stdout.write(
+                f'Реплики обновлены за {time.monotonic() - started:.2f} с')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
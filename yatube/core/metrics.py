@@ -0,0 +1,232 @@
+import atexit
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+FAMILIES = (
+    ('yatube_requests_total', 'counter',
+     'Ответы по имени view и коду статуса'),
+    ('yatube_request_duration_seconds', 'histogram',
+     'Время ответа по имени view'),
+    ('yatube_db_queries', 'histogram',
+     'Число SQL-запросов на один запрос по имени view'),
+)
+HISTOGRAM_SUFFIXES = ('_bucket', '_sum', '_count')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS samples (
+    name TEXT NOT NULL,
+    labels TEXT NOT NULL,
+    le TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (name, labels, le)
+)
+'''
+
+UPSERT = '''
+INSERT INTO samples (name, labels, le, value) VALUES (?, ?, ?, ?)
+ON CONFLICT (name, labels, le) DO UPDATE SET value = value + excluded.value
+'''
+
+
+def escape(value):
+    return (str(value).replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Registry:
+    """
+    Счётчики и гистограммы запросов, общие для всех процессов.
+
+    Наблюдения копятся в памяти процесса и сбрасываются в файл SQLite
+    одной транзакцией раз в METRICS_FLUSH_EVERY запросов или
+    METRICS_FLUSH_INTERVAL секунд: в самом запросе нет ни одной записи
+    на диск. Файл складывает приращения всех воркеров, render() читает
+    уже общую сумму.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = {}
+        self._requests = 0
+        self._flushed = time.monotonic()
+        atexit.register(self.flush)
+
+    @property
+    def _db(self):
+        key = (os.getpid(), settings.METRICS_PATH)
+        if getattr(self._local, 'key', None) != key:
+            self._local.db = self._connect(settings.METRICS_PATH)
+            self._local.key = key
+        return self._local.db
+
+    @staticmethod
+    def _connect(path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        db = sqlite3.connect(
+            path, timeout=5, isolation_level=None, check_same_thread=False)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute(SCHEMA)
+        return db
+
+    def _add(self, name, labels, value, le=''):
+        key = (name, labels, le)
+        self._pending[key] = self._pending.get(key, 0) + value
+
+    def _histogram(self, name, labels, value, buckets):
+        # Корзины накопительные: значение попадает во все le >= value.
+        # Остальные тоже пишутся, чтобы у гистограммы был полный набор.
+        for bound in buckets:
+            self._add(
+                f'{name}_bucket', labels, int(value <= bound),
+                format_value(bound))
+        self._add(f'{name}_bucket', labels, 1, '+Inf')
+        self._add(f'{name}_sum', labels, value)
+        self._add(f'{name}_count', labels, 1)
+
+    def observe(self, view, status, seconds, queries):
+        labels = f'view="{escape(view)}"'
+        with self._lock:
+            self._add(
+                'yatube_requests_total', f'{labels},status="{status}"', 1)
+            self._histogram(
+                'yatube_request_duration_seconds', labels, seconds,
+                LATENCY_BUCKETS)
+            self._histogram(
+                'yatube_db_queries', labels, queries, QUERY_BUCKETS)
+            self._requests += 1
+            due = (
+                self._requests >= settings.METRICS_FLUSH_EVERY
+                or time.monotonic() - self._flushed
+                >= settings.METRICS_FLUSH_INTERVAL
+            )
+            if not due:
+                return
+            pending = self._take()
+        self._write(pending)
+
+    def _take(self):
+        pending, self._pending = self._pending, {}
+        self._requests = 0
+        self._flushed = time.monotonic()
+        return pending
+
+    def flush(self):
+        with self._lock:
+            pending = self._take()
+        self._write(pending)
+
+    def _write(self, pending):
+        if not pending:
+            return
+        try:
+            db = self._db
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.executemany(UPSERT, [
+                    (name, labels, le, value)
+                    for (name, labels, le), value in pending.items()])
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        except sqlite3.Error:
+            logger.exception('Не удалось сохранить метрики')
+            # Вернём приращения, они уйдут со следующим сбросом.
+            with self._lock:
+                for (name, labels, le), value in pending.items():
+                    self._add(name, labels, value, le)
+
+    def samples(self):
+        self.flush()
+        return self._db.execute(
+            'SELECT name, labels, le, value FROM samples').fetchall()
+
+    def clear(self):
+        with self._lock:
+            self._take()
+        self._db.execute('DELETE FROM samples')
+
+    def render(self):
+        """Все метрики в текстовом формате Prometheus."""
+        families = {}
+        for name, kind, _ in FAMILIES:
+            suffixes = HISTOGRAM_SUFFIXES if kind == 'histogram' else ('',)
+            for suffix in suffixes:
+                families[name + suffix] = name
+        rows = {}
+        for name, labels, le, value in self.samples():
+            if name in families:
+                rows.setdefault(families[name], []).append(
+                    (labels, name, le, value))
+        lines = []
+        for family, kind, help_text in FAMILIES:
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            for labels, name, le, value in sorted(
+                    rows.get(family, []), key=self._order):
+                if le:
+                    labels = f'{labels},le="{le}"'
+                lines.append(f'{name}{{{labels}}} {format_value(value)}')
+        return '\n'.join(lines + self._cache_lines()) + '\n'
+
+    @staticmethod
+    def _order(row):
+        labels, name, le, _ = row
+        bound = float('inf') if le in ('', '+Inf') else float(le)
+        return labels, name, bound
+
+    @staticmethod
+    def _cache_lines():
+        """Счётчики общего кеша, если бэкенд их ведёт."""
+        stats = getattr(cache, 'stats', None)
+        if stats is None:
+            return []
+        values = stats()
+        lookups = values['hits'] + values['misses']
+        ratio = values['hits'] / lookups if lookups else 0
+        metrics = (
+            ('yatube_cache_hits_total', 'counter', 'Попадания в кеш',
+             values['hits']),
+            ('yatube_cache_misses_total', 'counter', 'Промахи кеша',
+             values['misses']),
+            ('yatube_cache_evictions_total', 'counter',
+             'Вытесненные из кеша записи', values['evictions']),
+            ('yatube_cache_hit_ratio', 'gauge',
+             'Доля попаданий среди всех чтений кеша', ratio),
+            ('yatube_cache_entries', 'gauge', 'Записей в кеше',
+             values['entries']),
+            ('yatube_cache_bytes', 'gauge', 'Объём кеша в байтах',
+             values['bytes']),
+        )
+        lines = []
+        for name, kind, help_text, value in metrics:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.append(f'{name} {format_value(value)}')
+        return lines
+
+
+registry = Registry()
@@ -0,0 +1,136 @@
+import cProfile
+import hmac
+import logging
+import os
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import db_router, metrics, profiling, slow_queries
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware:
+    """
+    Замеряет запрос и отдаёт замеры в заголовке Server-Timing.
+
+    db - время и число SQL-запросов, tpl - отрисовка шаблонов, thumb -
+    поиск миниатюр, cache - чтение и запись кеша, view - весь запрос
+    целиком. Доля PROFILE_SAMPLE_RATE запросов, а также запросы с
+    заголовком PROFILE_HEADER, дополнительно профилируются cProfile,
+    дамп pstats пишется в PROFILE_DIR. Те же замеры уходят в метрики
+    Prometheus (core.metrics) с меткой имени view, а запросы к базе
+    дольше SLOW_QUERY_MS - в журнал медленных запросов.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record, token = profiling.start()
+        profiler = self.start_profiler(request)
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profiling.record_query))
+                response = self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            profiling.stop(token)
+        elapsed = time.perf_counter() - started
+        record.add('view', elapsed)
+        match = request.resolver_match
+        view_name = match.view_name if match else 'unresolved'
+        if settings.METRICS:
+            metrics.registry.observe(
+                view_name, response.status_code, elapsed, record.queries)
+        slow_queries.record(record.slow, view_name)
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = record.server_timing()
+        if profiler is not None:
+            self.dump(request, profiler, view_name)
+        return response
+
+    def start_profiler(self, request):
+        if not self.should_profile(request):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В потоке уже работает другой профилировщик.
+            return None
+        return profiler
+
+    @staticmethod
+    def should_profile(request):
+        value = request.headers.get(settings.PROFILE_HEADER)
+        if value is not None:
+            # Без токена профилирование по заголовку есть только в DEBUG.
+            # compare_digest не выдаёт временем ответа длину совпадения.
+            if settings.PROFILE_TOKEN:
+                return hmac.compare_digest(
+                    value.encode(), settings.PROFILE_TOKEN.encode())
+            return settings.DEBUG
+        return random.random() < settings.PROFILE_SAMPLE_RATE
+
+    @staticmethod
+    def dump(request, profiler, view_name):
+        name = '{}-{}-{}.prof'.format(
+            time.strftime('%Y%m%d-%H%M%S'),
+            view_name.replace(':', '.'),
+            f'{os.getpid()}-{time.perf_counter_ns()}',
+        )
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        path = os.path.join(settings.PROFILE_DIR, name)
+        try:
+            profiler.dump_stats(path)
+        except OSError:
+            logger.exception('Не удалось сохранить профиль %s', path)
+            return
+        logger.info('Профиль %s сохранён в %s', request.path, path)
+
+
+class ReplicaMiddleware:
+    """
+    Закрепляет за основной базой запросы, которым важна свежесть.
+
+    Небезопасные методы (POST и прочие) читают из основной базы
+    целиком. GET, который что-то записал (подписка), читает основную
+    базу с первой записи до конца. Записавший пользователь получает куку
+    REPLICA_PIN_COOKIE на REPLICA_PIN_SECONDS: пока она жива, его
+    чтения тоже идут в основную базу и он видит свой комментарий или
+    запись сразу, даже если реплики ещё не обновились. Кука, а не
+    сессия - чтобы проверка сама не ходила в базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        pinned = (
+            request.method not in ('GET', 'HEAD', 'OPTIONS')
+            or settings.REPLICA_PIN_COOKIE in request.COOKIES
+        )
+        pin_token = db_router.pin(pinned)
+        wrote_token = db_router.start_tracking()
+        try:
+            response = self.get_response(request)
+            if db_router.wrote():
+                response.set_cookie(
+                    settings.REPLICA_PIN_COOKIE, '1',
+                    max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                    samesite='Lax')
+        finally:
+            db_router.stop_tracking(wrote_token)
+            db_router.unpin(pin_token)
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlowQuery',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('fingerprint', models.CharField(max_length=40, unique=True, verbose_name='Отпечаток')),
+                ('sql', models.TextField(verbose_name='Нормализованный SQL')),
+                ('example', models.TextField(verbose_name='Пример с параметрами')),
+                ('view', models.CharField(max_length=200, verbose_name='Последний view')),
+                ('database', models.CharField(max_length=100, verbose_name='База')),
+                ('plan', models.TextField(blank=True, verbose_name='План запроса')),
+                ('calls', models.PositiveIntegerField(default=0, verbose_name='Вызовов')),
+                ('total_ms', models.FloatField(default=0, verbose_name='Суммарное время, мс')),
+                ('max_ms', models.FloatField(default=0, verbose_name='Самый долгий, мс')),
+                ('last_seen', models.DateTimeField(verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'медленный запрос',
+                'verbose_name_plural': 'медленные запросы',
+                'ordering': ['-total_ms'],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_slowquery_modified'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Модель')),
+                ('next_id', models.BigIntegerField(verbose_name='Следующий id')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_idsequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='slowquery',
+            name='example',
+            field=models.TextField(verbose_name='Пример запроса без значений'),
+        ),
+    ]
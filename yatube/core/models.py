@@ -1,12 +1,170 @@
-from django.db import models
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, models
+from django.db.models import Max
+
+from core.db import atomic_write
+
+# Столько id процесс забирает у IdSequence за раз.
+ID_BLOCK_SIZE = 100
+
+_id_blocks = {}
+_id_lock = threading.Lock()
+# Модели, которым keep_created разрешил свои даты в текущем потоке.
+_kept_dates = contextvars.ContextVar('kept_dates', default=frozenset())
+
+
+class AutoDateTimeField(models.DateTimeField):
+    """
+    DateTimeField с auto_now(_add), уступающий keep_created.
+
+    Для миграций это обычный DateTimeField: схема не меняется.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if value is not None and self.model in _kept_dates.get():
+            return value
+        return super().pre_save(model_instance, add)
+
+    def deconstruct(self):
+        name, _, args, kwargs = super().deconstruct()
+        return name, 'django.db.models.DateTimeField', args, kwargs
 
 
 class CreatedModel(models.Model):
-    """Абстрактная модель. Добавляет дату создания."""
-    created = models.DateTimeField(
+    """Абстрактная модель. Добавляет даты создания и изменения."""
+    created = AutoDateTimeField(
         'Дата создания',
         auto_now_add=True
     )
+    modified = AutoDateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+
+    class Meta:
+        abstract = True
+
+
+class IdSequence(models.Model):
+    """Следующий свободный id модели, общий для всех шардов."""
+    name = models.CharField('Модель', max_length=100, primary_key=True)
+    next_id = models.BigIntegerField('Следующий id')
+
+    def __str__(self):
+        return self.name
+
+
+def next_id(model):
+    """
+    Id для новой строки model, не занятый ни на одном шарде.
+
+    Процесс резервирует в IdSequence блок из ID_BLOCK_SIZE id и
+    раздаёт его без запросов, так что счётчик трогается раз на сотню
+    записей. Id из разных блоков не упорядочены по времени: ленты
+    сортируются по created.
+    """
+    label = model._meta.label_lower
+    with _id_lock:
+        start, end = _id_blocks.get(label, (0, 0))
+        if start >= end:
+            start, end = _reserve_ids(model, ID_BLOCK_SIZE)
+        _id_blocks[label] = (start + 1, end)
+        return start
+
+
+def _reserve_ids(model, size):
+    # Блок начинается не ниже самого большого id на шардах: строки,
+    # загруженные со своими id (import_posts), счётчик не обходят.
+    label = model._meta.label_lower
+    sequences = IdSequence.objects.using(DEFAULT_DB_ALIAS)
+    with atomic_write(using=DEFAULT_DB_ALIAS):
+        stored = (
+            sequences.select_for_update().filter(name=label)
+            .values_list('next_id', flat=True).first()
+        )
+        highest = [
+            model._base_manager.using(alias).aggregate(Max('pk'))['pk__max']
+            for alias in settings.DATABASE_SHARDS
+        ]
+        start = max([stored or 1] + [pk + 1 for pk in highest if pk])
+        sequences.update_or_create(
+            name=label, defaults={'next_id': start + size})
+    return start, start + size
+
+
+class GlobalIdQuerySet(models.QuerySet):
+    def create(self, **kwargs):
+        """
+        Без явного using базу выбирает роутер по самой строке, как при
+        save(): шард зависит от её автора.
+        """
+        if self._db is not None:
+            return super().create(**kwargs)
+        obj = self.model(**kwargs)
+        obj.save(force_insert=True)
+        return obj
+
+
+class GlobalIdModel(CreatedModel):
+    """
+    Абстрактная модель для строк, которые лежат на шардах.
+
+    Пока шард один, id выдаёт сама база. Автоинкремент нескольких
+    шардов выдал бы одинаковые id, поэтому тогда их выдаёт next_id.
+    """
+    objects = GlobalIdQuerySet.as_manager()
 
     class Meta:
         abstract = True
+
+    def save(self, *args, **kwargs):
+        if self.pk is None and len(settings.DATABASE_SHARDS) > 1:
+            self.pk = next_id(type(self))
+            kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
+
+
+@contextmanager
+def keep_created(*models):
+    """
+    Даёт bulk_create сохранить заданные даты вместо auto_now(_add).
+
+    Действует только в текущем потоке: сами поля моделей не меняются,
+    остальные потоки получают даты как обычно.
+    """
+    token = _kept_dates.set(_kept_dates.get() | set(models))
+    try:
+        yield
+    finally:
+        _kept_dates.reset(token)
+
+
+class SlowQuery(CreatedModel):
+    """Медленный запрос к базе, одна строка на нормализованный SQL."""
+    fingerprint = models.CharField(
+        'Отпечаток',
+        max_length=40,
+        unique=True,
+    )
+    sql = models.TextField('Нормализованный SQL')
+    example = models.TextField('Пример запроса без значений')
+    view = models.CharField('Последний view', max_length=200)
+    database = models.CharField('База', max_length=100)
+    plan = models.TextField('План запроса', blank=True)
+    calls = models.PositiveIntegerField('Вызовов', default=0)
+    total_ms = models.FloatField('Суммарное время, мс', default=0)
+    max_ms = models.FloatField('Самый долгий, мс', default=0)
+    last_seen = models.DateTimeField('Последний раз')
+
+    class Meta:
+        ordering = ['-total_ms']
+        verbose_name = 'медленный запрос'
+        verbose_name_plural = 'медленные запросы'
+
+    def __str__(self):
+        return self.sql[:80]
@@ -0,0 +1,127 @@
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+from django.views.decorators.cache import cache_page
+
+
+def generation_key(scope):
+    return f'generation:{scope}'
+
+
+def new_generation():
+    # Счётчик мог вытесниться из кеша: новое значение от времени не
+    # совпадёт ни с одним старым, и старые страницы не оживут.
+    return time.time_ns()
+
+
+def get_generations(scopes):
+    """Текущие поколения областей одной строкой для ключа кеша."""
+    keys = [generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for key in keys:
+        if key not in values:
+            cache.add(key, new_generation(), None)
+            values[key] = cache.get(key)
+    return '.'.join(str(values[key]) for key in keys)
+
+
+def make_etag(request, *parts):
+    """
+    ETag страницы: её версии плюс зритель, которому она показана.
+
+    Зрителя определяет кука сессии, а не request.user, чтобы проверка
+    не читала сессию из базы. В хеше кука не раскрывается.
+    """
+    viewer = request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    raw = '|'.join(str(part) for part in (*parts, viewer))
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """Ответ 304, если у клиента уже есть эта версия страницы."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def revalidate(response, private=False):
+    """
+    Клиент хранит ответ, но перед показом сверяет его по ETag или
+    Last-Modified. Срок хранения в кеше страниц к браузеру не относится.
+    """
+    response['Cache-Control'] = (
+        'private, no-cache' if private else 'no-cache')
+    if 'Expires' in response:
+        del response['Expires']
+    return response
+
+
+def bump(*scopes):
+    """Сдвигает поколения областей: их страницы в кеше больше не читаются."""
+    for scope in scopes:
+        key = generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_generation(), None)
+
+
+def bump_on_commit(*scopes, using=None):
+    """
+    bump() после фиксации транзакции. Сдвинь поколение раньше, читатель
+    успел бы положить в кеш ещё старые данные под новым поколением.
+    """
+    transaction.on_commit(lambda: bump(*scopes), using=using)
+
+
+def cache_page_by_generation(timeout, *scopes):
+    """
+    cache_page, в ключ которого входят поколения областей страницы.
+
+    Области - шаблоны строк с именованными аргументами view, например
+    'group:{slug}'. Запись в базу сдвигает поколение нужных областей
+    через bump_on_commit(), поэтому страницы можно держать в кеше часами и всё
+    равно показывать свежие данные сразу после изменения.
+
+    Те же поколения дают ETag: если у клиента страница той же версии,
+    он получает 304 ещё до чтения кеша страниц и без запросов к базе.
+    Часами живёт только запись на сервере, клиент сверяет ETag на
+    каждом показе.
+
+    В кеш попадают только страницы анонимов: вошедшему показываются
+    его имя, кнопки подписки и ссылки выгрузки. Поэтому ключ кеша от
+    кук не зависит, одна запись служит всем анонимам, а Vary: Cookie
+    ставится уже на ответ - для кешей браузера и прокси.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            names = [scope.format(**kwargs) for scope in scopes]
+            prefix = f'{view.__name__}:{get_generations(names)}'
+            etag = make_etag(request, prefix, request.get_full_path())
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+            private = request.user.is_authenticated
+            if private:
+                response = view(request, *args, **kwargs)
+            else:
+                cached_view = cache_page(timeout, key_prefix=prefix)(view)
+                response = cached_view(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+                patch_vary_headers(response, ('Cookie',))
+                revalidate(response, private)
+            return response
+        return wrapped
+    return decorator
@@ -0,0 +1,216 @@
+import base64
+import binascii
+from collections import namedtuple
+from datetime import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+PageLink = namedtuple('PageLink', ['number', 'cursor', 'is_current'])
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def dump_position(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return repr(float(value))
+
+
+def encode_cursor(direction, created, pk, number):
+    """Упаковывает позицию в ленте в токен для адресной строки."""
+    raw = f'{direction}|{dump_position(created)}|{pk}|{number}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, load_position=parse_datetime):
+    """
+    Распаковывает токен. Для битого токена возвращает None.
+
+    load_position разбирает позицию: возвращает None или бросает
+    ValueError, если она не того типа, что ждёт пагинатор.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, created, pk, number = raw.split('|')
+        created = load_position(created)
+        pk, number = int(pk), int(number)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or created is None or number < 1:
+        return None
+    return direction, created, pk, number
+
+
+class CursorPage:
+    """Страница ленты, совместимая по интерфейсу с django Page."""
+
+    def __init__(self, object_list, number, has_next, has_previous,
+                 next_cursor=None, previous_cursor=None, window=()):
+        self.object_list = object_list
+        self.number = number
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.window = list(window)
+
+    def __repr__(self):
+        return f'<CursorPage {self.number}>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __contains__(self, item):
+        return item in self.object_list
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """
+    Постраничный вывод по ключу (created, id) вместо OFFSET.
+
+    Каждая страница читается одним запросом по индексу с LIMIT, без
+    COUNT(*), поэтому глубокие страницы открываются так же быстро, как
+    первая. window задаёт, сколько соседних страниц показать номерами
+    с каждой стороны: для этого читаются только ключи записей.
+    """
+
+    def __init__(self, queryset, per_page, window=0):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.window = window
+
+    def key(self, obj):
+        return obj.created, obj.pk
+
+    def load_position(self, text):
+        """Позиция из курсора: здесь дата публикации."""
+        return parse_datetime(text)
+
+    def fetch(self, cursor, direction, limit, keys_only=False):
+        """
+        Читает до limit записей за курсором.
+
+        NEXT отдаёт записи старше курсора от новых к старым, PREVIOUS -
+        записи новее курсора от старых к новым. При keys_only вместо
+        объектов возвращаются только ключи (created, pk).
+        """
+        if direction == NEXT:
+            queryset = self.queryset.order_by('-created', '-pk')
+            if cursor is not None:
+                created, pk = cursor
+                queryset = queryset.filter(
+                    Q(created__lt=created) | Q(created=created, pk__lt=pk))
+        else:
+            queryset = self.queryset.order_by('created', 'pk')
+            if cursor is not None:
+                created, pk = cursor
+                queryset = queryset.filter(
+                    Q(created__gt=created) | Q(created=created, pk__gt=pk))
+        if keys_only:
+            queryset = queryset.values_list('created', 'pk')
+        return list(queryset[:limit])
+
+    def get_page(self, token=None):
+        cursor = decode_cursor(token, self.load_position)
+        if cursor is None:
+            return self._first_page()
+        direction, created, pk, number = cursor
+        rows = self.fetch((created, pk), direction, self.per_page + 1)
+        if direction == NEXT:
+            has_next = len(rows) > self.per_page
+            return self._build(rows[:self.per_page], number, has_next, True)
+        if len(rows) <= self.per_page or number <= 1:
+            # Дошли до начала ленты: отдаём первую страницу целиком.
+            return self._first_page()
+        rows = rows[:self.per_page][::-1]
+        return self._build(rows, number, True, True)
+
+    def _first_page(self):
+        rows = self.fetch(None, NEXT, self.per_page + 1)
+        has_next = len(rows) > self.per_page
+        return self._build(rows[:self.per_page], 1, has_next, False)
+
+    def _build(self, rows, number, has_next, has_previous):
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(
+                NEXT, *self.key(rows[-1]), number + 1)
+        if rows and has_previous:
+            previous_cursor = encode_cursor(
+                PREVIOUS, *self.key(rows[0]), number - 1)
+        window = []
+        if rows and self.window:
+            window = self._window(rows, number, has_next, has_previous)
+        return CursorPage(rows, number, has_next, has_previous,
+                          next_cursor, previous_cursor, window)
+
+    def _window(self, rows, number, has_next, has_previous):
+        """Курсоры соседних страниц: одно чтение ключей в каждую сторону."""
+        limit = self.per_page * (self.window - 1) + 1
+        links = []
+        if has_previous:
+            first = self.key(rows[0])
+            keys = self.fetch(first, PREVIOUS, limit, keys_only=True)
+            links.append(PageLink(number - 1, encode_cursor(
+                PREVIOUS, *first, number - 1), False))
+            for step in range(1, self.window):
+                index = step * self.per_page - 1
+                page_number = number - 1 - step
+                if index + 1 >= len(keys) or page_number < 1:
+                    break
+                links.append(PageLink(page_number, encode_cursor(
+                    PREVIOUS, *keys[index], page_number), False))
+            links.reverse()
+        links.append(PageLink(number, None, True))
+        if has_next:
+            last = self.key(rows[-1])
+            keys = self.fetch(last, NEXT, limit, keys_only=True)
+            links.append(PageLink(number + 1, encode_cursor(
+                NEXT, *last, number + 1), False))
+            for step in range(1, self.window):
+                index = step * self.per_page - 1
+                if index + 1 >= len(keys):
+                    break
+                links.append(PageLink(number + 1 + step, encode_cursor(
+                    NEXT, *keys[index], number + 1 + step), False))
+        return links
+
+
+class ChronologicalPaginator(CursorPaginator):
+    """
+    Тот же постраничный вывод по ключу, но от старых записей к новым.
+
+    Первая страница - самые ранние записи, NEXT ведёт к более новым.
+    Подходит для обсуждений, которые читают по порядку.
+    """
+
+    def fetch(self, cursor, direction, limit, keys_only=False):
+        flipped = PREVIOUS if direction == NEXT else NEXT
+        return super().fetch(cursor, flipped, limit, keys_only)
+
+
+class ValuesCursorPaginator(CursorPaginator):
+    """Постраничный вывод по queryset.values(), с created и id в строках."""
+
+    def key(self, row):
+        return row['created'], row['id']
@@ -0,0 +1,100 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+
+_record = contextvars.ContextVar('profiling_record', default=None)
+
+
+class Record:
+    """Замеры одного запроса: число SQL-запросов и время по участкам."""
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = {}
+        self.active = set()
+        # Запросы дольше SLOW_QUERY_MS: (алиас базы, sql, params, мс).
+        self.slow = []
+
+    def add(self, name, seconds):
+        self.durations[name] = self.durations.get(name, 0) + seconds
+
+    def server_timing(self):
+        parts = []
+        for name, seconds in self.durations.items():
+            part = f'{name};dur={seconds * 1000:.1f}'
+            if name == 'db':
+                part += f';desc="{self.queries} queries"'
+            parts.append(part)
+        return ', '.join(parts)
+
+
+def start():
+    record = Record()
+    return record, _record.set(record)
+
+
+def stop(token):
+    _record.reset(token)
+
+
+@contextmanager
+def timed(name):
+    """
+    Добавляет время блока к участку name текущего запроса.
+
+    Вложенные блоки с тем же именем не считаются повторно: шаблон,
+    отрисованный внутри другого шаблона, уже входит в его время.
+    Вне запроса ничего не делает.
+    """
+    record = _record.get()
+    if record is None or name in record.active:
+        yield
+        return
+    record.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record.active.discard(name)
+        record.add(name, time.perf_counter() - started)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обёртка для connection.execute_wrapper: считает запросы и время."""
+    record = _record.get()
+    if record is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        record.queries += 1
+        record.add('db', elapsed)
+        if elapsed * 1000 >= settings.SLOW_QUERY_MS and not many:
+            record.slow.append((
+                context['connection'].alias, sql, params, elapsed * 1000))
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timed('tpl'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблонный бэкенд django, который замеряет время отрисовки."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return TimedTemplate(
+                self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
@@ -0,0 +1,42 @@
+import copy
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from core import metrics
+
+SQLITE_CACHE = 'core.cache_backend.SQLiteCache'
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Прогон тестов с кешем и метриками во временном каталоге.
+
+    cache.clear() в тестах не стирает кеш разработки, а параллельные
+    прогоны не делят один файл.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+        caches = copy.deepcopy(settings.CACHES)
+        for alias, config in caches.items():
+            if config['BACKEND'] == SQLITE_CACHE:
+                config['LOCATION'] = os.path.join(
+                    self.cache_dir, f'{alias}.sqlite3')
+        self.cache_settings = override_settings(
+            CACHES=caches,
+            METRICS_PATH=os.path.join(self.cache_dir, 'metrics.sqlite3'),
+        )
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        # Накопленное сбрасывается во временный файл, а не при выходе.
+        metrics.registry.flush()
+        self.cache_settings.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
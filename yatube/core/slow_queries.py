@@ -0,0 +1,166 @@
+import atexit
+import hashlib
+import logging
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import (
+    DatabaseError, NotSupportedError, connections)
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.db import atomic_write
+from core.models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_pending = {}
+_flushed = time.monotonic()
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+VALUES_LIST = re.compile(r'\((?:\s*\?\s*,)+\s*\?\s*\)')
+SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """SQL без значений: запросы, отличающиеся только ими, совпадают."""
+    sql = STRING.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = NUMBER.sub('?', sql)
+    sql = VALUES_LIST.sub('(...)', sql)
+    return SPACES.sub(' ', sql).strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+
+def explain(alias, sql, params):
+    """План запроса от базы или пустая строка, если его не получить."""
+    if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+        return ''
+    connection = connections[alias]
+    try:
+        prefix = connection.ops.explain_query_prefix()
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            rows = cursor.fetchall()
+    except (DatabaseError, NotSupportedError):
+        return ''
+    if rows and len(rows[0]) == 4:
+        # SQLite: (id, parent, notused, detail), дерево по parent.
+        depth = {0: -1}
+        lines = []
+        for node, parent, _, detail in rows:
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node] + detail)
+        return '\n'.join(lines)
+    return '\n'.join(str(row[0]) for row in rows)
+
+
+def record(slow, view):
+    """
+    Копит медленные запросы одного HTTP-запроса в памяти процесса.
+
+    Повторы одного запроса складываются по отпечатку. В базу журнал
+    пишет flush() уже после отдачи ответа. Параметры запросов нужны
+    только для плана и в журнал не попадают: в них бывают ключи
+    сессий, хеши паролей и адреса почты.
+    """
+    if not slow:
+        return
+    now = timezone.now()
+    with _lock:
+        for alias, sql, params, duration in slow:
+            normalized = normalize(sql)
+            key = fingerprint(normalized)
+            entry = _pending.get(key)
+            if entry is None:
+                entry = _pending[key] = {
+                    'sql': normalized, 'example': sql, 'params': params,
+                    'database': alias, 'calls': 0, 'total_ms': 0,
+                    'max_ms': 0,
+                }
+            entry['calls'] += 1
+            entry['total_ms'] += duration
+            entry['max_ms'] = max(entry['max_ms'], duration)
+            entry['view'] = view
+            entry['last_seen'] = now
+
+
+@receiver(request_finished)
+def flush_due(**kwargs):
+    """После ответа сбрасывает журнал, если подошёл срок."""
+    flush(force=False)
+
+
+def flush(force=True):
+    """
+    Записывает накопленное в журнал одной транзакцией.
+
+    Без force - не чаще раза в SLOW_QUERY_FLUSH_INTERVAL секунд.
+    Повтор уже известного запроса только увеличивает счётчики, план
+    снимается при первой встрече. Журнал держит SLOW_QUERY_LOG_SIZE
+    самых дорогих по суммарному времени запросов.
+    """
+    global _pending, _flushed
+    with _lock:
+        due = (
+            time.monotonic() - _flushed >= settings.SLOW_QUERY_FLUSH_INTERVAL)
+        if not _pending or not (force or due):
+            return
+        pending, _pending = _pending, {}
+        _flushed = time.monotonic()
+    try:
+        with atomic_write():
+            save(pending)
+    except DatabaseError:
+        logger.exception('Не удалось записать медленные запросы')
+
+
+def save(pending):
+    created = False
+    for key, entry in pending.items():
+        updated = SlowQuery.objects.filter(fingerprint=key).update(
+            calls=F('calls') + entry['calls'],
+            total_ms=F('total_ms') + entry['total_ms'],
+            max_ms=Greatest('max_ms', entry['max_ms']),
+            view=entry['view'],
+            last_seen=entry['last_seen'],
+        )
+        if updated:
+            continue
+        SlowQuery.objects.create(
+            fingerprint=key,
+            sql=entry['sql'],
+            example=entry['example'],
+            view=entry['view'],
+            database=entry['database'],
+            plan=explain(entry['database'], entry['example'],
+                         entry['params']),
+            calls=entry['calls'],
+            total_ms=entry['total_ms'],
+            max_ms=entry['max_ms'],
+            last_seen=entry['last_seen'],
+        )
+        created = True
+    if created:
+        trim()
+
+
+def trim():
+    keep = (
+        SlowQuery.objects.order_by('-total_ms')
+        .values_list('pk', flat=True)[:settings.SLOW_QUERY_LOG_SIZE]
+    )
+    SlowQuery.objects.exclude(pk__in=list(keep)).delete()
+
+
+atexit.register(flush)
@@ -0,0 +1,13 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def page_url(context, cursor=None):
+    """Ссылка на страницу по курсору с остальными параметрами запроса."""
+    query = context['request'].GET.copy()
+    query.pop('cursor', None)
+    if cursor:
+        query['cursor'] = cursor
+    return f'?{query.urlencode()}'
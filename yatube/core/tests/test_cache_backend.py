@@ -0,0 +1,92 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.cache_backend import SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        options.setdefault('LRU_RESOLUTION', 0)
+        options.setdefault('STATS_FLUSH_EVERY', 1)
+        return SQLiteCache(
+            os.path.join(self.directory, 'cache.sqlite3'),
+            {'OPTIONS': options},
+        )
+
+    def test_set_get_many(self):
+        """set_many и get_many работают одной пачкой."""
+        self.cache.set_many({'a': 1, 'b': [2, 3]})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': [2, 3]})
+
+    def test_shared_between_instances(self):
+        """Второй экземпляр на том же файле видит те же записи."""
+        self.cache.set('key', 'value')
+        self.assertEqual(self.make_cache().get('key'), 'value')
+
+    def test_expired_and_add(self):
+        """Истёкшая запись не читается, add на её месте срабатывает."""
+        self.cache.set('key', 'old', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertFalse(self.cache.add('key', 'newer'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        """incr меняет число и падает на отсутствующем ключе."""
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 5), 6)
+        self.assertEqual(self.make_cache().decr('counter'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_lru_eviction(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_ENTRIES=2, CULL_FREQUENCY=10)
+        cache.set('first', 1)
+        time.sleep(0.01)
+        cache.set('second', 2)
+        time.sleep(0.01)
+        cache.get('first')
+        cache.set('third', 3)
+        self.assertEqual(cache.get_many(['first', 'second', 'third']),
+                         {'first': 1, 'third': 3})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_size_limit(self):
+        """Суммарный размер записей не превышает MAX_BYTES."""
+        cache = self.make_cache(MAX_BYTES=3000)
+        for i in range(10):
+            cache.set(f'key{i}', 'x' * 1000)
+        self.assertLessEqual(cache.stats()['bytes'], 3000)
+        self.assertEqual(cache.get('key9'), 'x' * 1000)
+
+    def test_stats(self):
+        """Счётчики попаданий и промахов общие для экземпляров."""
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        self.cache.get('missing')
+        stats = self.make_cache().stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        self.assertEqual(stats['entries'], 1)
+
+
+class TestCacheLocationTests(SimpleTestCase):
+    def test_tests_do_not_touch_development_cache(self):
+        """Под тестами кеш лежит вне каталога cache/ проекта."""
+        location = settings.CACHES['default']['LOCATION']
+        development = os.path.join(settings.BASE_DIR, 'cache')
+        self.assertFalse(
+            location.startswith(development + os.sep), location)
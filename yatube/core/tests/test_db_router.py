@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.db_router import PrimaryReplicaRouter
+from core.middleware import ReplicaMiddleware
+from posts.models import Post
+
+router = PrimaryReplicaRouter()
+
+
+def reading_view(request):
+    return HttpResponse(router.db_for_read(Post))
+
+
+def writing_view(request):
+    return HttpResponse(router.db_for_write(Post))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def run_view(self, view, request):
+        return ReplicaMiddleware(view)(request)
+
+    def test_reads_go_to_replicas(self):
+        """Обычное чтение уходит в реплику, запись - в основную базу."""
+        response = self.run_view(reading_view, self.factory.get('/'))
+        self.assertIn(response.content.decode(), ['replica1', 'replica2'])
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_write_pins_user_to_primary(self):
+        """После записи пользователь читает из основной базы по куке."""
+        response = self.run_view(writing_view, self.factory.post('/'))
+        cookie = response.cookies[settings.REPLICA_PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_PIN_COOKIE] = cookie.value
+        response = self.run_view(reading_view, request)
+        self.assertEqual(response.content.decode(), 'default')
+
+    def test_write_pins_rest_of_request(self):
+        """После записи в GET тот же запрос читает из основной базы."""
+        def view(request):
+            before = router.db_for_read(Post)
+            router.db_for_write(Post)
+            return HttpResponse(f'{before} {router.db_for_read(Post)}')
+
+        before, after = self.run_view(
+            view, self.factory.get('/')).content.decode().split()
+        self.assertIn(before, ['replica1', 'replica2'])
+        self.assertEqual(after, 'default')
+
+    def test_unsafe_methods_read_primary(self):
+        """POST читает из основной базы ещё до первой записи."""
+        response = self.run_view(reading_view, self.factory.post('/'))
+        self.assertEqual(response.content.decode(), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Без реплик всё идёт в default, куки не ставятся."""
+        response = self.run_view(writing_view, self.factory.post('/'))
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertNotIn(settings.REPLICA_PIN_COOKIE, response.cookies)
+
+    def test_outside_requests_read_primary(self):
+        """Команды и миграции читают из основной базы."""
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
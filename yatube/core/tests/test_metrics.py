@@ -0,0 +1,80 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.metrics import Registry, registry
+
+User = get_user_model()
+
+
+class MetricsTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'metrics.sqlite3')
+        self.settings = override_settings(
+            METRICS_PATH=path, METRICS_FLUSH_EVERY=1000,
+            METRICS_TOKEN='secret')
+        self.settings.enable()
+        registry.clear()
+        cache.clear()
+        self.client = Client()
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def scrape(self):
+        response = self.client.get(
+            reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_protected(self):
+        """Без токена и прав персонала метрики не отдаются."""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        for header in ('Bearer wrong', 'Bearer пароль'):
+            response = self.client.get(
+                reverse('metrics'), HTTP_AUTHORIZATION=header)
+            self.assertEqual(response.status_code, 403)
+        staff = User.objects.create(username='staff', is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_requests_by_view(self):
+        """Запросы считаются по имени view и коду ответа."""
+        for _ in range(2):
+            self.client.get(reverse('posts:index'))
+        self.client.get('/no-such-page/')
+        text = self.scrape()
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"} 2', text)
+        self.assertIn(
+            'yatube_requests_total{view="unresolved",status="404"} 1', text)
+        self.assertIn(
+            'yatube_request_duration_seconds_bucket'
+            '{view="posts:index",le="+Inf"} 2', text)
+        self.assertIn(
+            'yatube_db_queries_count{view="posts:index"} 2', text)
+        self.assertIn('# TYPE yatube_cache_hit_ratio gauge', text)
+
+    def test_histogram_and_processes(self):
+        """Корзины накопительные, сбросы разных процессов складываются."""
+        worker = Registry()
+        registry.observe('posts:index', 200, 0.02, 3)
+        worker.observe('posts:index', 200, 0.3, 7)
+        worker.flush()
+        text = registry.render()
+        for le, count in (('0.01', 0), ('0.025', 1), ('0.5', 2)):
+            self.assertIn(
+                'yatube_request_duration_seconds_bucket'
+                f'{{view="posts:index",le="{le}"}} {count}', text)
+        self.assertIn('yatube_db_queries_sum{view="posts:index"} 10', text)
+        self.assertIn(
+            'yatube_requests_total{view="posts:index",status="200"} 2', text)
@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+
+class ProfilingMiddlewareTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = Client()
+        cache.clear()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def timings(self, response):
+        timings = {}
+        for part in response['Server-Timing'].split(', '):
+            name, *fields = part.split(';')
+            timings[name] = dict(field.split('=', 1) for field in fields)
+        return timings
+
+    def test_server_timing(self):
+        """Ответ несёт время базы, шаблонов, кеша и всего запроса."""
+        timings = self.timings(self.client.get(reverse('posts:index')))
+        self.assertEqual(set(timings), {'db', 'tpl', 'cache', 'view'})
+        self.assertRegex(timings['db']['desc'], r'^"\d+ queries"$')
+        self.assertGreaterEqual(
+            float(timings['view']['dur']), float(timings['tpl']['dur']))
+
+    @override_settings(PROFILE_TOKEN='secret')
+    def test_profile_by_header(self):
+        """Запрос с верным токеном в заголовке сохраняет профиль."""
+        with override_settings(PROFILE_DIR=self.directory):
+            for value in ('wrong', 'пароль'):
+                self.client.get(reverse('posts:index'), HTTP_X_PROFILE=value)
+            self.assertEqual(os.listdir(self.directory), [])
+            self.client.get(reverse('posts:index'), HTTP_X_PROFILE='secret')
+        names = os.listdir(self.directory)
+        self.assertEqual(len(names), 1)
+        self.assertIn('posts.index', names[0])
+
+    def test_profile_sampling(self):
+        """При PROFILE_SAMPLE_RATE = 1 профилируется каждый запрос."""
+        with override_settings(
+                PROFILE_DIR=self.directory, PROFILE_SAMPLE_RATE=1):
+            self.client.get(reverse('posts:index'))
+            self.client.get(reverse('about:author'))
+        self.assertEqual(len(os.listdir(self.directory)), 2)
@@ -0,0 +1,70 @@
+import json
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import slow_queries
+from core.models import SlowQuery
+from core.slow_queries import normalize
+
+
+@override_settings(SLOW_QUERY_FLUSH_INTERVAL=0)
+class SlowQueryTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+        slow_queries.flush()
+        SlowQuery.objects.all().delete()
+
+    def test_normalize(self):
+        """Значения и списки параметров не попадают в отпечаток."""
+        self.assertEqual(
+            normalize("SELECT *  FROM t1\n WHERE a = 5 AND b = 'x''y' "
+                      "AND c IN (%s, %s, %s) LIMIT 21"),
+            'SELECT * FROM t1 WHERE a = ? AND b = ? AND c IN (...) LIMIT ?')
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_slow_queries_logged_with_plan(self):
+        """Медленные запросы попадают в журнал с view и планом."""
+        url = reverse('posts:group_list', kwargs={'slug': 'missing'})
+        self.client.get(url)
+        self.client.get(url)
+        query = SlowQuery.objects.get(sql__contains='FROM "posts_group"')
+        self.assertEqual(query.view, 'posts:group_list')
+        self.assertEqual(query.calls, 2)
+        self.assertIn('posts_group', query.plan)
+        self.assertNotIn('missing', query.sql)
+        self.assertNotIn('missing', query.example)
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_FLUSH_INTERVAL=3600)
+    def test_written_after_interval(self):
+        """Журнал копится в памяти и пишется одной пачкой."""
+        url = reverse('posts:group_list', kwargs={'slug': 'missing'})
+        self.client.get(url)
+        self.client.get(url)
+        self.assertFalse(SlowQuery.objects.exists())
+        slow_queries.flush()
+        self.assertEqual(
+            SlowQuery.objects.get(sql__contains='FROM "posts_group"').calls,
+            2)
+
+    @override_settings(SLOW_QUERY_MS=0, SLOW_QUERY_LOG_SIZE=2)
+    def test_log_is_bounded(self):
+        """Журнал хранит не больше SLOW_QUERY_LOG_SIZE запросов."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:post_search'), {'q': 'кот'})
+        self.assertEqual(SlowQuery.objects.count(), 2)
+
+    @override_settings(SLOW_QUERY_MS=0)
+    def test_command(self):
+        """Команда выводит журнал и умеет его очищать."""
+        self.client.get(reverse('posts:index'))
+        out = StringIO()
+        call_command('slow_queries', '--json', '--clear', stdout=out)
+        self.assertTrue(json.loads(out.getvalue()))
+        self.assertFalse(SlowQuery.objects.exists())
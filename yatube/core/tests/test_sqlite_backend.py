@@ -0,0 +1,169 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.backends.sqlite3.base import DatabaseWrapper, WriteQueue
+from core.db import atomic_write
+
+
+class SQLiteBackendTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'db.sqlite3')
+        self.db = self.make_db()
+        with self.db.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (value INTEGER)')
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_db(self, **options):
+        settings_dict = {
+            **connection.settings_dict, 'NAME': self.path,
+            'OPTIONS': options}
+        return DatabaseWrapper(settings_dict, alias='backend_test')
+
+    def pragma(self, name):
+        with self.db.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_on_connect(self):
+        """Новое соединение в WAL и с заданными PRAGMA."""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('cache_size'), -64000)
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('foreign_keys'), 1)
+
+    def test_pragmas_from_options(self):
+        """OPTIONS['PRAGMAS'] дополняют умолчания, а не заменяют."""
+        self.db.close()
+        self.db = self.make_db(PRAGMAS={'busy_timeout': 100})
+        self.assertEqual(self.pragma('busy_timeout'), 100)
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+
+    def hold_lock(self, seconds):
+        """Чужое соединение держит блокировку на запись seconds секунд."""
+        other = sqlite3.connect(self.path, check_same_thread=False)
+        other.execute('BEGIN IMMEDIATE')
+        timer = threading.Timer(seconds, other.commit)
+        timer.start()
+        self.addCleanup(other.close)
+        self.addCleanup(timer.join)
+
+    def test_busy_write_is_retried(self):
+        """Запись, не дождавшаяся блокировки, повторяется."""
+        self.db.close()
+        self.db = self.make_db(PRAGMAS={'busy_timeout': 10}, BUSY_RETRIES=5)
+        self.hold_lock(0.1)
+        with self.db.cursor() as cursor:
+            cursor.execute('INSERT INTO item (value) VALUES (%s)', [1])
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_busy_error_after_retries(self):
+        """Исчерпав повторы, ошибка уходит наружу."""
+        self.db.close()
+        self.db = self.make_db(PRAGMAS={'busy_timeout': 10}, BUSY_RETRIES=1)
+        self.hold_lock(1)
+        with self.assertRaisesMessage(Exception, 'locked'):
+            with self.db.cursor() as cursor:
+                cursor.execute('INSERT INTO item (value) VALUES (%s)', [1])
+
+    def test_transaction_is_deferred(self):
+        """Обычный atomic() не берёт ни блокировку, ни очередь."""
+        self.db.set_autocommit(True)
+        self.db._start_transaction_under_autocommit()
+        try:
+            other = sqlite3.connect(self.path, timeout=0)
+            other.execute('BEGIN IMMEDIATE')
+            other.rollback()
+            other.close()
+            self.assertIsNone(self.db.held_queue)
+        finally:
+            self.db.rollback()
+
+    def test_deferred_write_waits_in_queue(self):
+        """Запись в обычной транзакции ждёт блокировку и держит очередь."""
+        self.db.close()
+        self.db = self.make_db(PRAGMAS={'busy_timeout': 10}, BUSY_RETRIES=5)
+        self.db.set_autocommit(True)
+        self.db._start_transaction_under_autocommit()
+        self.hold_lock(0.1)
+        try:
+            with self.db.cursor() as cursor:
+                cursor.execute('INSERT INTO item (value) VALUES (%s)', [1])
+            self.assertIsNotNone(self.db.held_queue)
+            self.db.commit()
+        finally:
+            self.db.rollback()
+        self.assertIsNone(self.db.held_queue)
+        with self.db.cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM item')
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_write_transaction_takes_write_lock(self):
+        """atomic_write() начинает транзакцию с блокировкой на запись."""
+        self.db.set_autocommit(True)
+        self.db.begin_immediate = True
+        self.db._start_transaction_under_autocommit()
+        try:
+            other = sqlite3.connect(self.path, timeout=0)
+            with self.assertRaises(sqlite3.OperationalError):
+                other.execute('BEGIN IMMEDIATE')
+            other.close()
+            self.assertIsNotNone(self.db.held_queue)
+        finally:
+            self.db.rollback()
+        self.assertIsNone(self.db.held_queue)
+
+
+class WriteQueueTests(SimpleTestCase):
+    def test_fifo_order(self):
+        """Право писать переходит в порядке прихода."""
+        queue = WriteQueue()
+        self.assertTrue(queue.acquire(1))
+        order = []
+        threads = []
+        for number in range(3):
+            thread = threading.Thread(
+                target=lambda n=number: (
+                    queue.acquire(5), order.append(n), queue.release()))
+            thread.start()
+            # Дожидаемся, пока поток встанет в очередь.
+            while len(queue._waiters) <= number:
+                time.sleep(0.001)
+            threads.append(thread)
+        queue.release()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(order, [0, 1, 2])
+
+    def test_timeout(self):
+        """Не дождавшись, acquire возвращает False и уходит из очереди."""
+        queue = WriteQueue()
+        queue.acquire(1)
+        self.assertFalse(queue.acquire(0.01))
+        self.assertFalse(queue._waiters)
+
+
+class AtomicWriteTests(TransactionTestCase):
+    def test_flag_only_for_begin(self):
+        """Флаг стоит только на время BEGIN и снимается после блока."""
+        with atomic_write():
+            self.assertFalse(connection.begin_immediate)
+            self.assertIsNotNone(connection.held_queue)
+        self.assertIsNone(connection.held_queue)
+        with self.assertRaises(ZeroDivisionError):
+            with atomic_write():
+                1 / 0
+        self.assertFalse(connection.begin_immediate)
+        self.assertIsNone(connection.held_queue)
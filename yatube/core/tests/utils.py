@@ -0,0 +1,19 @@
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def commit_callbacks():
+    """
+    Выполняет on_commit, отложенные внутри блока, на всех базах.
+
+    TestCase держит транзакцию открытой до конца теста, и сами по себе
+    такие функции не запустятся.
+    """
+    starts = {
+        alias: len(connections[alias].run_on_commit) for alias in connections}
+    yield
+    for alias, start in starts.items():
+        for _, callback in connections[alias].run_on_commit[start:]:
+            callback()
@@ -1,5 +1,12 @@
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from core.metrics import registry
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +22,18 @@ def permission_denied(request, exception):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics(request):
+    """Метрики для Prometheus: по токену METRICS_TOKEN или персоналу."""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    # Сравнение за постоянное время: по задержке токен не подобрать.
+    authorized = bool(token) and hmac.compare_digest(
+        authorization.encode(), f'Bearer {token}'.encode())
+    if not (authorized or request.user.is_staff):
+        raise PermissionDenied
+    return HttpResponse(
+        registry.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
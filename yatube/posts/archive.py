@@ -0,0 +1,105 @@
+import io
+import itertools
+import json
+import time
+import zipfile
+from operator import itemgetter
+
+from django.core.files.storage import default_storage
+
+from posts import sharding
+from posts.models import Comment, Post
+from posts.transfer import Encoder
+
+CHUNK_SIZE = 500
+
+POST_FIELDS = ('id', 'text', 'group__slug', 'image', 'created', 'modified')
+COMMENT_FIELDS = ('id', 'post_id', 'text', 'created', 'modified')
+
+
+def records(author):
+    """
+    Записи и комментарии автора строками NDJSON.
+
+    Таблицы читаются iterator() пачками по CHUNK_SIZE строк, так что в
+    памяти никогда не лежит больше одной пачки на шард. Комментарии
+    лежат на шардах чужих записей, поэтому обходятся все шарды.
+    """
+    sources = (
+        ('post', Post.objects.filter(author=author).values(*POST_FIELDS)),
+        ('comment',
+         Comment.objects.filter(author=author).values(*COMMENT_FIELDS)),
+    )
+    for kind, queryset in sources:
+        rows = sharding.iterate(
+            queryset.order_by('pk'), itemgetter('id'), CHUNK_SIZE)
+        for row in rows:
+            row['type'] = kind
+            yield (json.dumps(row, cls=Encoder, ensure_ascii=False)
+                   + '\n').encode()
+
+
+def image_names(author):
+    names = (
+        Post.objects.filter(author=author)
+        .exclude(image='').exclude(image__isnull=True)
+        .order_by('image').values_list('image', flat=True).distinct()
+    )
+    merged = sharding.iterate(names, None, CHUNK_SIZE)
+    return (name for name, _ in itertools.groupby(merged))
+
+
+class Pipe(io.RawIOBase):
+    """
+    Поток только для записи, из которого готовые байты сразу забирают.
+
+    zipfile умеет писать в поток без seek: вместо правки заголовков
+    после сжатия он дописывает дескрипторы данных. Всё записанное
+    отдаётся в ответ при каждом take() и не копится.
+    """
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_archive(author):
+    """
+    ZIP с data.ndjson и картинками автора, собираемый по мере отдачи.
+
+    Картинки читаются из хранилища кусками и не сжимаются повторно:
+    JPEG и PNG уже сжаты.
+    """
+    return (chunk for chunk in _zip_chunks(author) if chunk)
+
+
+def _zip_chunks(author):
+    pipe = Pipe()
+    with zipfile.ZipFile(pipe, 'w', zipfile.ZIP_DEFLATED) as archive:
+        with archive.open('data.ndjson', 'w', force_zip64=True) as entry:
+            for line in records(author):
+                entry.write(line)
+                yield pipe.take()
+        for name in image_names(author):
+            if not default_storage.exists(name):
+                continue
+            info = zipfile.ZipInfo(
+                f'images/{name}', time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with default_storage.open(name) as source, \
+                    archive.open(info, 'w', force_zip64=True) as entry:
+                for chunk in source.chunks():
+                    entry.write(chunk)
+                    yield pipe.take()
+    yield pipe.take()
@@ -0,0 +1,60 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Post
+
+LATEST_COMMENTS = 2
+
+
+def prefetch_latest(posts, amount=LATEST_COMMENTS):
+    """
+    Последние комментарии ко всем записям страницы одним запросом.
+
+    Для каждой записи коррелированный подзапрос берёт amount ключей по
+    индексу (post, created, id), так что читается не больше amount
+    строк на запись. Записи без комментариев по comment_count
+    пропускаются. Результат, от ранних к поздним, кладётся в
+    post.latest_comments. Комментарии лежат на шарде записи: записи
+    с разных шардов - по запросу на шард.
+    """
+    ids = {}
+    for post in posts:
+        if post.comment_count:
+            ids.setdefault(post._state.db, []).append(post.pk)
+    by_post = {}
+    for using, shard_ids in ids.items():
+        latest = (
+            Comment.objects.filter(post_id=OuterRef('post_id'))
+            .order_by('-created', '-pk').values('pk')[:amount]
+        )
+        comments = (
+            Comment.objects.using(using)
+            .filter(post_id__in=shard_ids, pk__in=Subquery(latest))
+            .select_related('author').order_by('created', 'pk')
+        )
+        for comment in comments:
+            by_post.setdefault(comment.post_id, []).append(comment)
+    for post in posts:
+        post.latest_comments = by_post.get(post.pk, [])
+    return posts
+
+
+def recount(dry_run=False, using=None):
+    """
+    Сверяет comment_count с комментариями на шарде using, возвращает
+    число расхождений.
+    """
+    actual = Subquery(
+        Comment.objects.filter(post_id=OuterRef('pk')).order_by()
+        .values('post_id').annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    )
+    posts = Post.objects.using(using)
+    wrong = (
+        posts.order_by().annotate(actual=Coalesce(actual, 0))
+        .exclude(comment_count=Coalesce(actual, 0))
+    )
+    if dry_run:
+        return wrong.count()
+    return posts.filter(pk__in=wrong.values('pk')).update(
+        comment_count=Coalesce(actual, 0))
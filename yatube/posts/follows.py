@@ -0,0 +1,42 @@
+from array import array
+
+from django.core.cache import cache
+
+from posts.models import Follow
+
+FOLLOWS_TIMEOUT = 60 * 60 * 24
+
+
+def follows_key(user_id):
+    return f'follows:{user_id}'
+
+
+def followed_ids(user):
+    """
+    Множество id авторов, на которых подписан пользователь.
+
+    В кеше хранится упакованный массив id (8 байт на подписку), за
+    время запроса множество запоминается на самом user: проверка
+    подписки на любом авторе - поиск в множестве без запросов к базе.
+    Кеш сбрасывается сигналами Follow.
+    """
+    if not user.is_authenticated:
+        return frozenset()
+    if not hasattr(user, '_followed_ids'):
+        key = follows_key(user.pk)
+        packed = cache.get(key)
+        if packed is None:
+            ids = Follow.objects.filter(user_id=user.pk).values_list(
+                'author_id', flat=True)
+            packed = array('q', sorted(ids)).tobytes()
+            cache.set(key, packed, FOLLOWS_TIMEOUT)
+        user._followed_ids = frozenset(array('q', packed))
+    return user._followed_ids
+
+
+def is_following(user, author_id):
+    return author_id in followed_ids(user)
+
+
+def invalidate(user_id):
+    cache.delete(follows_key(user_id))
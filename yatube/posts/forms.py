@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from posts import images
 from posts.models import Post, Comment
 
 
@@ -11,6 +13,13 @@ class PostForm(forms.ModelForm):
             'image': 'Картинка'
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Новую загрузку пережимаем, уже сохранённую картинку не трогаем.
+        if isinstance(image, UploadedFile):
+            return images.ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
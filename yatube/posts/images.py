@@ -0,0 +1,68 @@
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, features
+
+# WebP, если Pillow собран с libwebp, иначе JPEG.
+OUTPUT_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+CONTENT_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+def ingest(upload):
+    """
+    Приводит загруженную картинку к виду, в котором её стоит хранить.
+
+    Сначала читается только заголовок: картинка больше
+    IMAGE_MAX_PIXELS отклоняется, не будучи распакованной. JPEG
+    распаковывается сразу в уменьшенном масштабе (draft), затем
+    поворачивается по EXIF, уменьшается до IMAGE_MAX_SIDE по большей
+    стороне и пережимается в OUTPUT_FORMAT с качеством IMAGE_QUALITY.
+    EXIF, GPS и прочие метаданные в новый файл не попадают.
+    """
+    if upload.size > settings.IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ',
+            code='file_too_large',
+            params={'limit': settings.IMAGE_MAX_UPLOAD_SIZE // 2 ** 20})
+    upload.seek(0)
+    try:
+        image = Image.open(upload)
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка слишком большая: %(width)sx%(height)s',
+                code='too_many_pixels',
+                params={'width': width, 'height': height})
+        side = settings.IMAGE_MAX_SIDE
+        image.draft('RGB', (side, side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((side, side), Image.LANCZOS)
+    except ValidationError:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError):
+        raise ValidationError('Не картинка', code='invalid_image')
+    options = {'quality': settings.IMAGE_QUALITY, 'optimize': True}
+    if OUTPUT_FORMAT == 'JPEG':
+        options['progressive'] = True
+    buffer = io.BytesIO()
+    flatten(image).save(buffer, OUTPUT_FORMAT, **options)
+    stem = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(
+        f'{stem}.{EXTENSIONS[OUTPUT_FORMAT]}', buffer.getvalue(),
+        CONTENT_TYPES[OUTPUT_FORMAT])
+
+
+def flatten(image):
+    """Прозрачность ложится на белый фон: JPEG её не хранит."""
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        if OUTPUT_FORMAT == 'WEBP':
+            return image
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
@@ -0,0 +1,172 @@
+import json
+import platform
+import random
+import time
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Перцентиль с линейной интерполяцией между соседними значениями."""
+    values = sorted(values)
+    if not values:
+        return 0
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(timings, queries, sizes):
+    result = {
+        f'p{percent}_ms': round(percentile(timings, percent) * 1000, 2)
+        for percent in PERCENTILES
+    }
+    result.update({
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 2),
+        'queries': max(queries),
+        'bytes': max(sizes),
+        'requests': len(timings),
+    })
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Замеряет время ответа основных страниц на текущих данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=50,
+            help='Сколько запросов к каждой странице',
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=5,
+            help='Сколько запросов сделать до начала замеров',
+        )
+        parser.add_argument(
+            '--cold',
+            action='store_true',
+            help='Очищать кеш перед каждым запросом',
+        )
+        parser.add_argument(
+            '--json',
+            metavar='FILE',
+            help='Записать результаты в JSON-файл, "-" - в stdout',
+        )
+        parser.add_argument(
+            '--compare',
+            metavar='FILE',
+            help='Сравнить с результатами прошлого запуска',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        targets = self.targets()
+        results = {}
+        for name, (urls, user) in targets.items():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            results[name] = self.measure(client, urls, options)
+        report = {
+            'meta': {
+                'started': timezone.now().isoformat(),
+                'cold': options['cold'],
+                'requests': options['requests'],
+                'posts': Post.objects.count(),
+                'users': User.objects.count(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'results': results,
+        }
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)['results']
+        if options['json'] == '-':
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(results, previous)
+            if options['json']:
+                with open(options['json'], 'w') as file:
+                    json.dump(report, file, indent=2)
+
+    def targets(self):
+        """Адреса для замера: самые нагруженные автор, группа и читатель."""
+        post_ids = list(Post.objects.values_list('pk', flat=True)[:1000])
+        if not post_ids:
+            raise CommandError('Нет записей, сначала запустите seed_data')
+        author = User.objects.annotate(
+            total=Count('posts')).order_by('-total').first()
+        reader = User.objects.annotate(
+            total=Count('follower')).order_by('-total').first()
+        group = Group.objects.annotate(
+            total=Count('group_posts')).order_by('-total').first()
+        targets = {
+            'index': ([reverse('posts:index')], None),
+            'profile': ([reverse(
+                'posts:profile', kwargs={'username': author.username})], None),
+            'post_detail': ([
+                reverse('posts:post_detail', kwargs={'post_id': pk})
+                for pk in self.random.sample(post_ids, min(20, len(post_ids)))
+            ], None),
+            'follow_index': ([reverse('posts:follow_index')], reader),
+        }
+        if group is not None:
+            targets['group_posts'] = ([reverse(
+                'posts:group_list', kwargs={'slug': group.slug})], None)
+        return targets
+
+    def measure(self, client, urls, options):
+        for _ in range(options['warmup']):
+            client.get(self.random.choice(urls))
+        timings, queries, sizes = [], [], []
+        for _ in range(options['requests']):
+            url = self.random.choice(urls)
+            if options['cold']:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: ответ {response.status_code}')
+            queries.append(len(captured))
+            sizes.append(len(response.content))
+        return summarize(timings, queries, sizes)
+
+    def print_table(self, results, previous=None):
+        columns = ['p50_ms', 'p95_ms', 'p99_ms', 'queries', 'bytes']
+        self.stdout.write(
+            f'{"страница":<14}' + ''.join(f'{name:>16}' for name in columns))
+        for name, result in results.items():
+            line = f'{name:<14}'
+            for column in columns:
+                cell = f'{result[column]}'
+                if previous and name in previous and previous[name][column]:
+                    change = result[column] / previous[name][column] - 1
+                    cell += f' ({change:+.0%})'
+                line += f'{cell:>16}'
+            self.stdout.write(line)
@@ -0,0 +1,165 @@
+import json
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding, transfer
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Поля каждой выгрузки. Пользователи и группы узнаются по username и
+# slug, записи и комментарии сохраняют свои id: так адреса записей
+# остаются прежними, а повторная загрузка пропускает уже перенесённое.
+QUERIES = {
+    'group': (Group.objects, {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+    }),
+    'user': (User.objects, {
+        'username': 'username',
+        'first_name': 'first_name',
+        'last_name': 'last_name',
+        'email': 'email',
+        'is_active': 'is_active',
+        'date_joined': 'date_joined',
+    }),
+    'post': (Post.objects, {
+        'id': 'pk',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'image': 'image',
+        'created': 'created',
+        'modified': 'modified',
+    }),
+    'comment': (Comment.objects, {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+        'modified': 'modified',
+    }),
+    'follow': (Follow.objects, {
+        'user': 'user__username',
+        'author': 'author__username',
+    }),
+}
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, пользователей, записи, комментарии и подписки'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output',
+            help='Файл JSONL, с .gz - сжатый, "-" - stdout',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из базы за раз',
+        )
+        parser.add_argument(
+            '--media',
+            metavar='DIR',
+            help='Скопировать картинки записей в этот каталог',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Сколько потоков копируют картинки',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            metavar='FILE',
+            help='Файл с местом остановки: с ним выгрузка продолжается',
+        )
+        parser.add_argument(
+            '--with-passwords',
+            action='store_true',
+            help='Выгрузить хеши паролей пользователей',
+        )
+
+    def handle(self, *args, **options):
+        state = transfer.load_checkpoint(options['checkpoint'])
+        if state and options['output'] == '-':
+            raise CommandError('Продолжить можно только выгрузку в файл')
+        fields = dict(QUERIES['user'][1])
+        if options['with_passwords']:
+            fields['password'] = 'password'
+        queries = dict(QUERIES, user=(User.objects, fields))
+        self.progress = transfer.Progress(self.stderr)
+        self.missing = []
+        if options['output'] == '-':
+            output = self.stdout
+        else:
+            output = transfer.open_stream(
+                options['output'], 'a' if state else 'w')
+        try:
+            start = transfer.KINDS.index(state.get('kind', 'group'))
+            for kind in transfer.KINDS[start:]:
+                after = state.get('pk', 0) if kind == state.get('kind') else 0
+                self.export(output, kind, queries[kind], after, options)
+        finally:
+            if output is not self.stdout:
+                output.close()
+        transfer.clear_checkpoint(options['checkpoint'])
+        for name in self.missing:
+            self.stderr.write(f'Картинка не скопирована: {name}')
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено: {self.progress.line()}'))
+
+    def export(self, output, kind, query, after, options):
+        """
+        Выгружает одну таблицу по возрастанию pk.
+
+        Строки читаются iterator() пачками chunk_size, в памяти лежит
+        одна пачка. После каждой пачки файл сбрасывается на диск и
+        запоминается последний pk: прерванная выгрузка дописывает файл
+        с этого места. Записи и комментарии читаются со всех шардов.
+        """
+        manager, fields = query
+        queryset = (
+            manager.filter(pk__gt=after).order_by('pk')
+            .values_list('pk', *fields.values())
+        )
+        if manager.model in (Post, Comment):
+            rows = sharding.iterate(
+                queryset, itemgetter(0), options['chunk_size'])
+        else:
+            rows = queryset.iterator(chunk_size=options['chunk_size'])
+        names = list(fields)
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= options['chunk_size']:
+                self.write(output, kind, names, chunk, options)
+                chunk = []
+        if chunk:
+            self.write(output, kind, names, chunk, options)
+
+    def write(self, output, kind, names, chunk, options):
+        lines = []
+        for pk, *values in chunk:
+            record = {'type': kind}
+            record.update(
+                (name, value) for name, value in zip(names, values)
+                if value not in (None, ''))
+            lines.append(json.dumps(
+                record, cls=transfer.Encoder, ensure_ascii=False) + '\n')
+        output.writelines(lines)
+        output.flush()
+        if kind == 'post' and options['media']:
+            image = names.index('image') + 1
+            self.missing += transfer.copy_media(
+                transfer.export_file, [row[image] for row in chunk],
+                options['media'], options['workers'])
+        transfer.save_checkpoint(
+            options['checkpoint'], {'kind': kind, 'pk': chunk[-1][0]})
+        self.progress.add(kind, len(chunk))
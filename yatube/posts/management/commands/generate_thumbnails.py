@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from posts import sharding, thumbnails
+from posts.models import Post
+
+
+def generate(name):
+    try:
+        thumbnails.generate(name)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Строит миниатюры для картинок уже опубликованных записей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=4,
+            help='Сколько потоков строят миниатюры',
+        )
+
+    def handle(self, *args, **options):
+        names = (
+            Post.objects.exclude(image='').exclude(image__isnull=True)
+            .order_by('image').values_list('image', flat=True).distinct()
+        )
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(generate, name): name
+                for name in set(sharding.iterate(names, None))
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {done}, с ошибками: {failed}'))
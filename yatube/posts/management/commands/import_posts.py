@@ -0,0 +1,257 @@
+import io
+import json
+import sys
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+from django.utils.dateparse import parse_datetime
+
+from core.db import atomic_write
+from core.models import keep_created
+from posts import sharding, timeline, transfer
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+def by_key(manager, field, values):
+    """Словарь значение -> pk для одной пачки, одним запросом."""
+    return dict(
+        manager.filter(**{f'{field}__in': set(values)})
+        .values_list(field, 'pk'))
+
+
+def check_ids(model, objects, fields):
+    """
+    Останавливает загрузку, если id из выгрузки занят другой строкой.
+
+    Строка с тем же id и теми же fields загружена прошлым запуском, её
+    пропустит ignore_conflicts. Чужую строку пропускать нельзя: к ней
+    прицепились бы комментарии из выгрузки.
+    """
+    by_pk = {obj.pk: obj for obj in objects}
+    for alias in sharding.aliases():
+        rows = (
+            model.objects.using(alias).filter(pk__in=by_pk)
+            .values_list('pk', *fields)
+        )
+        for pk, *values in rows:
+            if values != [getattr(by_pk[pk], field) for field in fields]:
+                raise CommandError(
+                    f'{model.__name__} с id {pk} уже есть в '
+                    f'базе и не совпадает с выгрузкой, загрузите её в '
+                    f'пустую базу')
+
+
+class Command(BaseCommand):
+    help = 'Загружает данные, выгруженные export_posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='Файл JSONL, с .gz - сжатый, "-" - stdin',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк вставлять одним bulk_create',
+        )
+        parser.add_argument(
+            '--media',
+            metavar='DIR',
+            help='Каталог с картинками, выгруженными export_posts --media',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Сколько потоков копируют картинки',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            metavar='FILE',
+            help='Файл с местом остановки: с ним загрузка продолжается',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Читает файл построчно и вставляет строки пачками.
+
+        Каждая пачка - одна транзакция с bulk_create, после неё номер
+        последней строки пишется в checkpoint. Уже существующие строки
+        (тот же username, slug, id) пропускаются, поэтому прерванную
+        загрузку можно просто запустить снова. Занятый другой строкой id
+        записи или комментария останавливает загрузку. Сигналы при bulk_create
+        не срабатывают: счётчики, ленты подписок и кеш приводятся в
+        порядок в конце.
+        """
+        state = transfer.load_checkpoint(options['checkpoint'])
+        if state and options['input'] == '-':
+            raise CommandError('Продолжить можно только загрузку из файла')
+        skip = state.get('line', 0)
+        self.options = options
+        self.progress = transfer.Progress(self.stderr)
+        self.missing = []
+        self.followers = set()
+        self.resumed = skip > 0
+        if options['input'] == '-':
+            stream = sys.stdin
+        else:
+            stream = transfer.open_stream(options['input'])
+        kind, batch, number = None, [], 0
+        try:
+            for number, line in enumerate(stream, 1):
+                if number <= skip or not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                    record_kind = record.pop('type')
+                except (ValueError, KeyError):
+                    raise CommandError(f'Строка {number}: не запись выгрузки')
+                if record_kind not in transfer.KINDS:
+                    raise CommandError(
+                        f'Строка {number}: неизвестный тип {record_kind}')
+                if batch and (record_kind != kind
+                              or len(batch) >= options['batch_size']):
+                    self.load(kind, batch, number - 1)
+                    batch = []
+                kind = record_kind
+                batch.append(record)
+            if batch:
+                self.load(kind, batch, number)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.finish()
+        transfer.clear_checkpoint(options['checkpoint'])
+        for name in self.missing:
+            self.stderr.write(f'Картинка не скопирована: {name}')
+        self.stderr.write(self.style.SUCCESS(
+            f'Загружено: {self.progress.line()}'))
+
+    def load(self, kind, records, number):
+        with atomic_write(), keep_created(Post, Comment):
+            getattr(self, f'load_{kind}s')(records)
+        if kind == 'post' and self.options['media']:
+            self.missing += transfer.copy_media(
+                transfer.import_file,
+                [record.get('image') for record in records],
+                self.options['media'], self.options['workers'])
+        transfer.save_checkpoint(self.options['checkpoint'], {'line': number})
+        self.progress.add(kind, len(records))
+
+    def load_groups(self, records):
+        Group.objects.bulk_create(
+            [Group(**record) for record in records], ignore_conflicts=True)
+
+    def load_users(self, records):
+        # Без выгруженного хеша пароль непригоден, вход - через сброс.
+        unusable = make_password(None)
+        users = []
+        for record in records:
+            record.setdefault('password', unusable)
+            record['date_joined'] = parse_datetime(record['date_joined'])
+            users.append(User(**record))
+        User.objects.bulk_create(users, ignore_conflicts=True)
+
+    def load_posts(self, records):
+        authors = by_key(
+            User.objects, 'username', [record['author'] for record in records])
+        groups = by_key(
+            Group.objects, 'slug',
+            [record['group'] for record in records if 'group' in record])
+        posts = []
+        for record in records:
+            posts.append(Post(
+                pk=record['id'],
+                author_id=authors[record['author']],
+                group_id=groups.get(record.get('group')),
+                text=record['text'],
+                image=record.get('image', ''),
+                created=parse_datetime(record['created']),
+                modified=parse_datetime(record['modified']),
+            ))
+        check_ids(Post, posts, ('author_id', 'created'))
+        # Запись - на шард автора: закреплённый или назначенный сейчас,
+        # как при обычной публикации.
+        shards = defaultdict(list)
+        for post in posts:
+            alias = None
+            if sharding.enabled():
+                alias = sharding.place(post.author_id)
+            shards[alias].append(post)
+        for alias, chunk in shards.items():
+            if alias is not None:
+                sharding.copy_reference(
+                    Group, {post.group_id for post in chunk}, alias)
+            Post.objects.using(alias).bulk_create(
+                chunk, ignore_conflicts=True)
+
+    def load_comments(self, records):
+        authors = by_key(
+            User.objects, 'username', [record['author'] for record in records])
+        # Комментарий - на шард своей записи, там же её и ищем.
+        wanted = {record['post'] for record in records}
+        post_shards = {}
+        for alias in sharding.aliases():
+            for pk in Post.objects.using(alias).filter(
+                    pk__in=wanted).values_list('pk', flat=True):
+                post_shards[pk] = alias
+        comments = [
+            Comment(
+                pk=record['id'],
+                post_id=record['post'],
+                author_id=authors[record['author']],
+                text=record['text'],
+                created=parse_datetime(record['created']),
+                modified=parse_datetime(record['modified']),
+            )
+            for record in records if record['post'] in post_shards
+        ]
+        check_ids(Comment, comments, ('post_id', 'author_id', 'created'))
+        shards = defaultdict(list)
+        for comment in comments:
+            shards[post_shards[comment.post_id]].append(comment)
+        for alias, chunk in shards.items():
+            if alias is not None:
+                sharding.copy_reference(
+                    User, {comment.author_id for comment in chunk}, alias)
+            Comment.objects.using(alias).bulk_create(
+                chunk, ignore_conflicts=True)
+
+    def load_follows(self, records):
+        users = by_key(
+            User.objects, 'username',
+            [record[field] for record in records
+             for field in ('user', 'author')])
+        follows = [
+            Follow(user_id=users[record['user']],
+                   author_id=users[record['author']])
+            for record in records]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        self.followers.update(follow.user_id for follow in follows)
+
+    def finish(self):
+        """Всё, что при обычной записи делают сигналы."""
+        # Записи и комментарии пришли со своими id: счётчики
+        # автоинкремента должны уйти за них.
+        sequences = connection.ops.sequence_reset_sql(
+            no_style(), [Post, Comment])
+        with connection.cursor() as cursor:
+            for sql in sequences:
+                cursor.execute(sql)
+        call_command('reconcile_stats', stdout=io.StringIO())
+        followers = self.followers
+        if self.resumed:
+            # Подписки до места остановки загружены прошлым запуском.
+            followers = Follow.objects.values_list(
+                'user_id', flat=True).distinct()
+        timeline.rebuild(followers)
+        cache.clear()
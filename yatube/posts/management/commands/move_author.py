@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Переносит записи автора с комментариями и лентами на другой '
+            'шард, не останавливая сайт')
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Чьи записи переносить')
+        parser.add_argument('shard', help='Алиас шарда из DATABASE_SHARDS')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=sharding.BATCH_SIZE,
+            help='Сколько строк копировать за раз',
+        )
+
+    def handle(self, *args, **options):
+        if not sharding.enabled():
+            raise CommandError('Шард один, задайте YATUBE_SHARDS')
+        target = options['shard']
+        if target not in settings.DATABASE_SHARDS:
+            raise CommandError(
+                f'Нет шарда {target}, есть: '
+                f'{", ".join(settings.DATABASE_SHARDS)}')
+        try:
+            author = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f'Нет пользователя {options["username"]}')
+        source = sharding.shard_for(author.pk)
+        moved = sharding.move_author(author, target, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{author.username}: {source} -> {target}, записей: {moved}'))
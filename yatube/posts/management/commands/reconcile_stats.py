@@ -0,0 +1,86 @@
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from core.db import atomic_write
+from posts import comments, sharding
+from posts.models import Follow, Post, UserStats
+
+User = get_user_model()
+
+FIELDS = ('post_count', 'follower_count', 'following_count')
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики пользователей и комментариев записей с '
+            'таблицами и чинит расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать расхождения, ничего не меняя',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Сколько пользователей обрабатывать за один проход',
+        )
+
+    def handle(self, *args, **options):
+        post_counts = Counter()
+        for using in sharding.aliases():
+            post_counts.update(
+                self.grouped(Post.objects.using(using), 'author_id'))
+        counts = {
+            'post_count': post_counts,
+            'follower_count': self.grouped(Follow.objects, 'author_id'),
+            'following_count': self.grouped(Follow.objects, 'user_id'),
+        }
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        batch, fixed = [], 0
+        for user_id in user_ids.iterator():
+            batch.append(user_id)
+            if len(batch) >= options['batch_size']:
+                fixed += self.reconcile(batch, counts, options['dry_run'])
+                batch = []
+        if batch:
+            fixed += self.reconcile(batch, counts, options['dry_run'])
+        for using in sharding.aliases():
+            fixed += comments.recount(options['dry_run'], using)
+        self.stdout.write(self.style.SUCCESS(
+            f'Расхождений найдено: {fixed}'))
+
+    @staticmethod
+    def grouped(manager, field):
+        # Без order_by() сортировка модели попала бы в GROUP BY.
+        return dict(
+            manager.order_by().values(field).annotate(total=Count('id'))
+            .values_list(field, 'total')
+        )
+
+    def reconcile(self, user_ids, counts, dry_run):
+        existing = UserStats.objects.in_bulk(user_ids, field_name='user_id')
+        to_create, to_update = [], []
+        for user_id in user_ids:
+            expected = {
+                field: counts[field].get(user_id, 0) for field in FIELDS}
+            stats = existing.get(user_id)
+            if stats is None:
+                to_create.append(UserStats(user_id=user_id, **expected))
+                continue
+            actual = {field: getattr(stats, field) for field in FIELDS}
+            if actual != expected:
+                self.stdout.write(
+                    f'Пользователь {user_id}: {actual} -> {expected}')
+                for field, value in expected.items():
+                    setattr(stats, field, value)
+                to_update.append(stats)
+        if not dry_run:
+            with atomic_write():
+                UserStats.objects.bulk_create(to_create)
+                UserStats.objects.bulk_update(to_update, FIELDS)
+        return len(to_create) + len(to_update)
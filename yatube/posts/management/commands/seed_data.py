@@ -0,0 +1,214 @@
+import io
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from PIL import Image
+
+from core.db import atomic_write
+from core.models import keep_created
+from posts import timeline
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'день ночь город дом кот собака море лес река поле солнце дождь снег '
+    'ветер утро вечер дорога друг книга музыка фильм кофе чай работа отпуск '
+    'поездка горы парк улица окно сад весна лето осень зима фото история '
+    'новый старый большой тихий яркий тёплый холодный быстрый долгий '
+    'смотреть читать писать гулять думать видеть слушать ждать знать '
+    'сегодня вчера завтра снова очень всегда иногда почти вместе рядом'
+).split()
+
+PASSWORD = 'seed-password'
+
+
+def zipf_weights(count, skew):
+    """Вес i-го по популярности объекта убывает как 1 / i ** skew."""
+    return [1 / (rank ** skew) for rank in range(1, count + 1)]
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными для замеров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--comments', type=int, default=10000)
+        parser.add_argument(
+            '--follows',
+            type=int,
+            default=20,
+            help='Сколько авторов в среднем читает пользователь',
+        )
+        parser.add_argument(
+            '--images',
+            type=float,
+            default=0.1,
+            help='Доля записей с картинкой',
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Перекос активности авторов (показатель закона Ципфа)',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=365,
+            help='За сколько дней распределить записи',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix',
+            default='seed',
+            help='Префикс имён созданных пользователей и групп',
+        )
+        parser.add_argument(
+            '--flush',
+            action='store_true',
+            help='Сначала удалить данные с тем же префиксом',
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = options['days']
+        prefix = options['prefix']
+        users = User.objects.filter(username__startswith=f'{prefix}_')
+        if options['flush']:
+            users.delete()
+            Group.objects.filter(slug__startswith=f'{prefix}-').delete()
+        elif users.exists():
+            raise CommandError(
+                f'Данные с префиксом {prefix} уже есть, добавьте --flush')
+        started = time.monotonic()
+        with atomic_write(), keep_created(Post, Comment):
+            user_ids = self.create_users(prefix, options['users'])
+            group_ids = self.create_groups(prefix, options['groups'])
+            images = self.create_images(prefix, options['images'])
+            self.create_posts(
+                user_ids, group_ids, images, options['posts'],
+                options['images'], options['skew'])
+            post_ids = list(
+                Post.objects.filter(author_id__in=user_ids)
+                .order_by('pk').values_list('pk', flat=True))
+            self.create_comments(
+                user_ids, post_ids, options['comments'], options['skew'])
+            self.create_follows(user_ids, options['follows'], options['skew'])
+        call_command('reconcile_stats', stdout=io.StringIO())
+        # Ленты после сверки: по счётчикам отбираются знаменитости.
+        timeline.rebuild(user_ids)
+        cache.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {len(user_ids)}, записей '
+            f'{len(post_ids)}, за {time.monotonic() - started:.1f} с'))
+
+    @staticmethod
+    def bulk(model, objects):
+        # Размер пачки выбирает бэкенд: у SQLite свой предел параметров.
+        model.objects.bulk_create(objects, ignore_conflicts=True)
+
+    def words(self, low, high):
+        count = self.random.randint(low, high)
+        text = ' '.join(self.random.choices(WORDS, k=count))
+        return text.capitalize() + '.'
+
+    def past(self):
+        return self.now - timedelta(seconds=self.random.uniform(
+            0, self.days * 24 * 60 * 60))
+
+    def create_users(self, prefix, count):
+        password = make_password(PASSWORD)
+        self.bulk(User, [
+            User(username=f'{prefix}_{i:05d}', password=password,
+                 first_name=self.random.choice(WORDS).capitalize())
+            for i in range(count)
+        ])
+        # Порядок имён задаёт популярность: первые авторы самые активные.
+        return list(
+            User.objects.filter(username__startswith=f'{prefix}_')
+            .order_by('username').values_list('pk', flat=True))
+
+    def create_groups(self, prefix, count):
+        self.bulk(Group, [
+            Group(title=f'Сообщество {i}', slug=f'{prefix}-group-{i}',
+                  description=self.words(5, 20))
+            for i in range(count)
+        ])
+        return list(
+            Group.objects.filter(slug__startswith=f'{prefix}-group-')
+            .values_list('pk', flat=True))
+
+    def create_images(self, prefix, share, count=10):
+        """Несколько картинок, которые делят между собой записи."""
+        if share <= 0:
+            return []
+        names = []
+        for i in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            buffer = io.BytesIO()
+            Image.new('RGB', (1200, 800), color).save(buffer, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{prefix}_{i}.jpg', ContentFile(buffer.getvalue())))
+        return names
+
+    def create_posts(self, user_ids, group_ids, images, count, share, skew):
+        weights = zipf_weights(len(user_ids), skew)
+        authors = self.random.choices(user_ids, weights, k=count)
+        group_weights = zipf_weights(len(group_ids), skew)
+        posts = []
+        for author_id in authors:
+            group_id = None
+            if group_ids and self.random.random() < 0.7:
+                group_id = self.random.choices(group_ids, group_weights)[0]
+            image = ''
+            if images and self.random.random() < share:
+                image = self.random.choice(images)
+            created = self.past()
+            posts.append(Post(
+                author_id=author_id, group_id=group_id, image=image,
+                text=self.words(5, 80), created=created, modified=created))
+        self.bulk(Post, posts)
+
+    def create_comments(self, user_ids, post_ids, count, skew):
+        if not post_ids:
+            return
+        weights = zipf_weights(len(post_ids), skew)
+        # Больше всего обсуждают свежие записи.
+        targets = self.random.choices(post_ids[::-1], weights, k=count)
+        comments = []
+        for post_id in targets:
+            created = self.past()
+            comments.append(Comment(
+                post_id=post_id, author_id=self.random.choice(user_ids),
+                text=self.words(2, 30), created=created, modified=created))
+        self.bulk(Comment, comments)
+
+    def create_follows(self, user_ids, average, skew):
+        weights = zipf_weights(len(user_ids), skew)
+        follows = []
+        for user_id in user_ids:
+            count = min(
+                len(user_ids) - 1,
+                int(self.random.expovariate(1 / average)) if average else 0)
+            authors = set()
+            while len(authors) < count:
+                author_id = self.random.choices(user_ids, weights)[0]
+                if author_id != user_id:
+                    authors.add(author_id)
+            follows += [
+                Follow(user_id=user_id, author_id=author_id)
+                for author_id in authors]
+        self.bulk(Follow, follows)
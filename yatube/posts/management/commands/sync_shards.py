@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import sharding
+
+
+class Command(BaseCommand):
+    help = ('Копирует пользователей и группы из default на шарды, '
+            'где их ещё нет')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=sharding.BATCH_SIZE,
+            help='Сколько строк копировать за раз',
+        )
+
+    def handle(self, *args, **options):
+        """
+        Нужна после подключения нового шарда: дальше пользователей и
+        группы на шарды переносят сигналы сохранения. Схему шарда
+        создаёт migrate --database.
+        """
+        if not sharding.enabled():
+            raise CommandError('Шард один, задайте YATUBE_SHARDS')
+        for alias in settings.DATABASE_SHARDS[1:]:
+            checked = sharding.sync_reference(alias, options['batch_size'])
+            self.stdout.write(f'{alias}: проверено строк {checked}')
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:50
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+TIMELINE_LENGTH = 500
+
+
+def fill_timelines(apps, schema_editor):
+    """Собирает ленты для уже существующих подписок."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    db = schema_editor.connection.alias
+    for follow in Follow.objects.using(db).iterator():
+        posts = (
+            Post.objects.using(db).filter(author_id=follow.author_id)
+            .order_by('-created', '-pk')
+            .values_list('pk', 'created')[:TIMELINE_LENGTH]
+        )
+        TimelineEntry.objects.using(db).bulk_create(
+            [TimelineEntry(user_id=follow.user_id, post_id=pk, created=created)
+             for pk, created in posts],
+            ignore_conflicts=True,
+        )
+    user_ids = (
+        Follow.objects.using(db).values_list('user_id', flat=True).distinct())
+    for user_id in user_ids:
+        keep = (
+            TimelineEntry.objects.using(db).filter(user_id=user_id)
+            .order_by('-created', '-post_id')
+            .values_list('pk', flat=True)[:TIMELINE_LENGTH]
+        )
+        TimelineEntry.objects.using(db).filter(user_id=user_id).exclude(
+            pk__in=list(keep)).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0002_post_cursor_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(verbose_name='Дата публикации записи')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post', verbose_name='Запись')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL, verbose_name='Читатель')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-created', '-post'], name='timeline_user_created_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='timelineentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:51
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_stats(apps, schema_editor):
+    """Заводит счётчики для уже зарегистрированных пользователей."""
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    db = schema_editor.connection.alias
+    users = User.objects.using(db).annotate(
+        post_count=Count('posts', distinct=True),
+        follower_count=Count('following', distinct=True),
+        following_count=Count('follower', distinct=True),
+    ).values_list('pk', 'post_count', 'follower_count', 'following_count')
+    UserStats.objects.using(db).bulk_create(
+        [UserStats(user_id=pk, post_count=posts, follower_count=followers,
+                   following_count=followings)
+         for pk, posts, followers, followings in users.iterator()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0003_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('post_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('follower_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.19 on 2026-10-18 04:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_userstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Растёт при каждом изменении, входит в ключ кеша карточки', verbose_name='Версия'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:40
+
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from posts import search
+        search.create_index(schema_editor.connection.alias)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        from posts import search
+        search.drop_index(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_post_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
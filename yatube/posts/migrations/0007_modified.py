@@ -0,0 +1,33 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_modified(apps, schema_editor):
+    """Уже опубликованные записи и комментарии не менялись с создания."""
+    for name in ('Post', 'Comment'):
+        model = apps.get_model('posts', name)
+        model.objects.using(schema_editor.connection.alias).update(
+            modified=F('created'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(fill_modified, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:13
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+
+
+def fill_comment_count(apps, schema_editor):
+    Comment = apps.get_model('posts', 'Comment')
+    Post = apps.get_model('posts', 'Post')
+    db = schema_editor.connection.alias
+    total = Subquery(
+        Comment.objects.filter(post_id=OuterRef('pk')).order_by()
+        .values('post_id').annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField(),
+    )
+    Post.objects.using(db).filter(comments__isnull=False).update(
+        comment_count=total)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_comment_cursor_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Ведётся сигналами комментариев, сверяет reconcile_stats', verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_comment_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.19 on 2026-10-18 05:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0009_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShardPlacement',
+            fields=[
+                ('author', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='shard_placement', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('alias', models.CharField(max_length=100, verbose_name='Шард')),
+            ],
+        ),
+    ]
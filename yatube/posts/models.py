@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
-from core.models import CreatedModel
+from core.models import GlobalIdModel
 
 User = get_user_model()
 
@@ -15,7 +15,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(CreatedModel):
+class Post(GlobalIdModel):
     text = models.TextField(
         'Текст поста',
         help_text='Введите текст поста'
@@ -43,12 +43,32 @@ class Post(CreatedModel):
         null=True,
         error_messages={'invalid_image': 'Не картинка'},
     )
+    version = models.PositiveIntegerField(
+        'Версия',
+        default=1,
+        editable=False,
+        help_text='Растёт при каждом изменении, входит в ключ кеша карточки',
+    )
+    comment_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+        help_text='Ведётся сигналами комментариев, сверяет reconcile_stats',
+    )
 
     def __str__(self):
         return self.text[:15]
 
     class Meta:
         ordering = ['-created']
+        indexes = [
+            models.Index(fields=['-created', '-id'],
+                         name='post_created_id_idx'),
+            models.Index(fields=['author', '-created', '-id'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', '-created', '-id'],
+                         name='post_group_created_idx'),
+        ]
 
     def short_text(self):
         characters = 100
@@ -69,7 +89,7 @@ class Post(CreatedModel):
         return title
 
 
-class Comment(CreatedModel):
+class Comment(GlobalIdModel):
     text = models.TextField(
         'Комментарий',
         help_text='Комментарий'
@@ -90,6 +110,12 @@ class Comment(CreatedModel):
     def __str__(self) -> str:
         return self.text[:15]
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -107,3 +133,59 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = [['user', 'author']]
+
+
+class TimelineEntry(models.Model):
+    """Запись в ленте подписок читателя, раскладывается при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Читатель',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Запись',
+    )
+    created = models.DateTimeField('Дата публикации записи')
+
+    class Meta:
+        ordering = ['-created']
+        unique_together = [['user', 'post']]
+        indexes = [
+            models.Index(fields=['user', '-created', '-post'],
+                         name='timeline_user_created_idx'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляются вместе с записями и подписками."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Пользователь',
+    )
+    post_count = models.PositiveIntegerField('Записей', default=0)
+    follower_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    def __str__(self) -> str:
+        return f'Счётчики {self.user}'
+
+
+class ShardPlacement(models.Model):
+    """Шард, на котором лежат записи автора, см. posts.sharding."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='shard_placement',
+        verbose_name='Автор',
+    )
+    alias = models.CharField('Шард', max_length=100)
+
+    def __str__(self) -> str:
+        return f'{self.author_id} -> {self.alias}'
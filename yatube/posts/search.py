@@ -0,0 +1,216 @@
+import math
+import re
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.paginator import CursorPaginator, NEXT
+from posts import sharding
+from posts.models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+# unicode61 приводит кириллицу к нижнему регистру, префиксные индексы
+# ускоряют запросы вида "кот"*. Букву ё unicode61 не снимает, поэтому
+# в индекс и в запрос она попадает уже заменённой на е.
+CREATE_TABLE = f'''
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    text,
+    content='posts_post',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+'''
+
+
+def normalized(column):
+    return f"replace(replace({column}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+NEW_TEXT = normalized('new.text')
+OLD_TEXT = normalized('old.text')
+
+TRIGGERS = {
+    f'{FTS_TABLE}_insert': f'''
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert
+AFTER INSERT ON posts_post BEGIN
+    INSERT INTO {FTS_TABLE} (rowid, text)
+    VALUES (new.id, {NEW_TEXT});
+END
+''',
+    f'{FTS_TABLE}_delete': f'''
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete
+AFTER DELETE ON posts_post BEGIN
+    INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+    VALUES ('delete', old.id, {OLD_TEXT});
+END
+''',
+    f'{FTS_TABLE}_update': f'''
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update
+AFTER UPDATE OF text ON posts_post BEGIN
+    INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, text)
+    VALUES ('delete', old.id, {OLD_TEXT});
+    INSERT INTO {FTS_TABLE} (rowid, text)
+    VALUES (new.id, {NEW_TEXT});
+END
+''',
+}
+
+# Частые окончания русских слов. Отбрасываем их у слов запроса и ищем
+# по префиксу основы: "котики" найдёт и "котик", и "котиков".
+ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ией', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ах', 'ях', 'ов', 'ев', 'ей', 'ой', 'ий', 'ый', 'ая', 'яя', 'ое', 'ее',
+    'ые', 'ие', 'ом', 'ем', 'ам', 'ям', 'ую', 'юю', 'ть',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'е', 'о', 'ь', 'й',
+), key=len, reverse=True)
+MIN_STEM = 3
+MAX_TERMS = 8
+CYRILLIC = re.compile('[а-яё]')
+
+
+def available(using=DEFAULT_DB_ALIAS):
+    return connections[using].vendor == 'sqlite'
+
+
+def stem(word):
+    if not CYRILLIC.search(word):
+        return word
+    for ending in ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def match_expression(query):
+    """
+    Переводит строку поиска в запрос FTS5.
+
+    Все слова обязательны, каждое ищется по префиксу своей основы.
+    Спецсимволы FTS5 в запрос не попадают, поэтому пользователь не
+    может сломать его синтаксис. Пустая строка - запрос без слов.
+    """
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+    return ' '.join(f'"{stem(word)}"*' for word in words[:MAX_TERMS])
+
+
+def terms(query):
+    """Основы слов запроса для поиска без FTS5."""
+    words = re.findall(r'\w+', query.lower().replace('ё', 'е'))
+    return [stem(word) for word in words]
+
+
+def _table_exists(cursor):
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+        [FTS_TABLE])
+    return cursor.fetchone() is not None
+
+
+def create_index(using=DEFAULT_DB_ALIAS):
+    """
+    Создаёт индекс с триггерами синхронизации и заполняет его.
+
+    Индекс свой на каждом шарде: в нём записи только этого шарда.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(CREATE_TABLE)
+        for sql in TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('delete-all')")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, text) "
+            f"SELECT id, {normalized('text')} FROM posts_post")
+
+
+def drop_index(using=DEFAULT_DB_ALIAS):
+    with connections[using].cursor() as cursor:
+        for name in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def restore_triggers(using=DEFAULT_DB_ALIAS):
+    """
+    Возвращает триггеры, если их снесла перестройка таблицы постов.
+
+    SQLite-бэкенд django меняет схему, пересоздавая таблицу целиком, и
+    триггеры старой таблицы пропадают. Индекс после этого
+    перестраивается, чтобы не пропустить изменения без триггеров.
+    """
+    if not available(using):
+        return
+    with connections[using].cursor() as cursor:
+        if not _table_exists(cursor):
+            return
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+            "AND tbl_name = 'posts_post'")
+        existing = {name for name, in cursor.fetchall()}
+        if set(TRIGGERS) <= existing:
+            return
+    create_index(using)
+
+
+class SearchPaginator(CursorPaginator):
+    """
+    Результаты поиска от самых релевантных, по ключу (ранг, id).
+
+    Ранг bm25 считает FTS5, курсор хранит ранг последней записи
+    страницы, поэтому следующая страница - тот же диапазонный запрос,
+    что и в лентах, только по рангу вместо даты.
+
+    С шардами запрос уходит в индекс каждого шарда, страница
+    собирается слиянием по рангу. bm25 считается по словам своего
+    шарда, так что ранги разных шардов сравнимы лишь приблизительно.
+    """
+
+    def __init__(self, query, per_page, window=0):
+        posts = Post.objects.select_related('author', 'group')
+        super().__init__(posts, per_page, window)
+        self.match = match_expression(query)
+
+    def key(self, post):
+        return post.search_rank, post.pk
+
+    def load_position(self, text):
+        """Позиция из курсора: конечный ранг bm25."""
+        rank = float(text)
+        return rank if math.isfinite(rank) else None
+
+    def fetch(self, cursor, direction, limit, keys_only=False):
+        if not self.match:
+            return []
+        if direction == NEXT:
+            order, compare = 'ASC', '>'
+        else:
+            order, compare = 'DESC', '<'
+        sql = f'SELECT rank, rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [self.match]
+        if cursor is not None:
+            rank, pk = cursor
+            sql += (f' AND (rank {compare} %s OR '
+                    f'(rank = %s AND rowid {compare} %s))')
+            params += [rank, rank, pk]
+        sql += f' ORDER BY rank {order}, rowid {order} LIMIT %s'
+        params.append(limit)
+
+        def fetch_shard(alias):
+            with connections[alias or DEFAULT_DB_ALIAS].cursor() as db_cursor:
+                db_cursor.execute(sql, params)
+                keys = db_cursor.fetchall()
+            if keys_only:
+                return keys
+            queryset = self.queryset.using(alias) if alias else self.queryset
+            posts = queryset.in_bulk([pk for _, pk in keys])
+            rows = []
+            for rank, pk in keys:
+                post = posts.get(pk)
+                if post is not None:
+                    post.search_rank = rank
+                    rows.append(post)
+            return rows
+        return sharding.gather(
+            fetch_shard, direction, limit, None if keys_only else self.key,
+            descending=False)
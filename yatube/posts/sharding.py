@@ -0,0 +1,389 @@
+import heapq
+import itertools
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from core.db import atomic_write
+from core.models import keep_created
+from core.paginator import CursorPaginator, NEXT, ValuesCursorPaginator
+from posts.models import Comment, Group, Post, ShardPlacement, TimelineEntry
+
+User = get_user_model()
+
+PLACEMENT_TIMEOUT = 60 * 60 * 24
+BATCH_SIZE = 500
+# Лежат на шарде автора записи: запись, комментарии к ней и её места
+# в лентах читателей.
+SHARDED = (Post, Comment, TimelineEntry)
+# Справочники: основная копия в default, на других шардах - копии,
+# чтобы работали внешние ключи и select_related.
+REFERENCE = (User, Group)
+
+
+def enabled():
+    return len(settings.DATABASE_SHARDS) > 1
+
+
+def aliases():
+    """Шарды для обхода; [None] - шард один, базу выбирают роутеры."""
+    return settings.DATABASE_SHARDS if enabled() else [None]
+
+
+def placement_key(author_id):
+    return f'shard:{author_id}'
+
+
+def location_key(post_id):
+    return f'post-shard:{post_id}'
+
+
+def _placement(author_id):
+    """Закреплённый шард автора или '' без закрепления, через кеш."""
+    key = placement_key(author_id)
+    alias = cache.get(key)
+    if alias is None:
+        alias = (
+            ShardPlacement.objects.using(DEFAULT_DB_ALIAS)
+            .filter(author_id=author_id)
+            .values_list('alias', flat=True).first()
+        ) or ''
+        cache.set(key, alias, PLACEMENT_TIMEOUT)
+    return alias
+
+
+def shard_for(author_id):
+    """
+    Шард с записями автора.
+
+    Автор без закрепления ещё ничего не публиковал или публиковал до
+    включения шардов - его записи, если есть, лежат в первом шарде.
+    """
+    if not enabled():
+        return settings.DATABASE_SHARDS[0]
+    return _placement(author_id) or settings.DATABASE_SHARDS[0]
+
+
+def place(author_id):
+    """
+    Шард для новой записи автора, при первой записи - закрепляет.
+
+    Новые авторы распределяются по остатку от деления id, автор с
+    прежними записями в первом шарде остаётся там же.
+    """
+    alias = _placement(author_id)
+    if alias:
+        return alias
+    shards = settings.DATABASE_SHARDS
+    if Post.objects.using(shards[0]).filter(author_id=author_id).exists():
+        alias = shards[0]
+    else:
+        alias = shards[author_id % len(shards)]
+    copy_reference(User, [author_id], alias)
+    placement, _ = ShardPlacement.objects.using(
+        DEFAULT_DB_ALIAS).get_or_create(
+            author_id=author_id, defaults={'alias': alias})
+    cache.set(placement_key(author_id), placement.alias, PLACEMENT_TIMEOUT)
+    return placement.alias
+
+
+def remember_post(post):
+    if enabled():
+        cache.set(location_key(post.pk), post._state.db, PLACEMENT_TIMEOUT)
+
+
+def locate_post(post_id):
+    """Шард записи по её id: из кеша, иначе опросом шардов."""
+    key = location_key(post_id)
+    alias = cache.get(key)
+    if alias is None:
+        for alias in settings.DATABASE_SHARDS:
+            if Post.objects.using(alias).filter(pk=post_id).exists():
+                break
+        else:
+            return None
+        cache.set(key, alias, PLACEMENT_TIMEOUT)
+    return alias
+
+
+def using_post(queryset, post_id):
+    """queryset на шарде записи post_id; для неизвестной записи - пустой."""
+    if not enabled():
+        return queryset
+    alias = locate_post(post_id)
+    return queryset.using(alias) if alias else queryset.none()
+
+
+def using_author(queryset, author_id):
+    """queryset на шарде записей автора."""
+    if not enabled():
+        return queryset
+    return queryset.using(shard_for(author_id))
+
+
+def gather(fetch, direction, limit, key=None, descending=True):
+    """
+    Scatter-gather: fetch(alias) с каждого шарда и слияние по ключу.
+
+    fetch возвращает уже упорядоченный по направлению direction
+    список не длиннее limit, поэтому хватает слияния heapq.merge.
+    descending - ключ убывает в направлении NEXT, как дата в лентах.
+    """
+    parts = [fetch(alias) for alias in aliases()]
+    if len(parts) == 1:
+        return parts[0]
+    merged = heapq.merge(
+        *parts, key=key, reverse=(direction == NEXT) == descending)
+    return list(itertools.islice(merged, limit))
+
+
+def iterate(queryset, key, chunk_size=BATCH_SIZE):
+    """
+    Строки queryset со всех шардов, слитые по возрастанию key.
+
+    queryset уже упорядочен по key, каждый шард читается iterator()
+    пачками по chunk_size. id записей и комментариев общие для всех
+    шардов, поэтому поток по pk не повторяет строк и его можно
+    продолжать с последнего pk.
+    """
+    parts = [
+        (queryset.using(alias) if alias else queryset)
+        .iterator(chunk_size=chunk_size)
+        for alias in aliases()
+    ]
+    if len(parts) == 1:
+        return parts[0]
+    return heapq.merge(*parts, key=key)
+
+
+class ScatterPaginator(CursorPaginator):
+    """
+    Лента по записям всех шардов.
+
+    Каждый шард читается тем же запросом по индексу с LIMIT, что и у
+    CursorPaginator, страница собирается слиянием по (created, id).
+    С одним шардом это ровно CursorPaginator.
+    """
+
+    def fetch(self, cursor, direction, limit, keys_only=False):
+        def fetch_shard(alias):
+            shard = CursorPaginator(
+                self.queryset.using(alias), self.per_page)
+            return shard.fetch(cursor, direction, limit, keys_only)
+        return gather(
+            fetch_shard, direction, limit, None if keys_only else self.key)
+
+
+class ValuesScatterPaginator(ValuesCursorPaginator, ScatterPaginator):
+    """ScatterPaginator по queryset.values()."""
+
+
+class ShardRouter:
+    """
+    Записи, комментарии и ленты - на шард автора записи.
+
+    Шард берётся из объекта-подсказки: записи, её комментария или
+    автора для author.posts. Пользователи и группы пишутся только в
+    default, а читаются через запись с её шарда. Новая запись
+    закрепляет автора за шардом (place). Запросы без подсказки, вроде
+    Post.objects.filter(), уходят дальше по DATABASE_ROUTERS, то есть
+    в первый шард: другие шарды читаются явно, через using_post,
+    using_author и gather.
+    Схема одинакова на всех шардах.
+    """
+
+    def _shard(self, model, instance):
+        if not enabled() or instance is None:
+            return None
+        if isinstance(instance, Post):
+            if instance._state.adding:
+                return place(instance.author_id)
+            return instance._state.db
+        if isinstance(instance, (Comment, TimelineEntry)):
+            if not instance._state.adding:
+                return instance._state.db
+            post = instance._state.fields_cache.get('post')
+            if post is not None:
+                return self._shard(Post, post)
+            return locate_post(instance.post_id)
+        if isinstance(instance, User) and model is Post:
+            return shard_for(instance.pk)
+        return None
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if issubclass(model, REFERENCE) and isinstance(instance, SHARDED) \
+                and enabled() and not instance._state.adding:
+            # post.author читается с копии на шарде записи.
+            return instance._state.db
+        return self.db_for_write(model, **hints)
+
+    def db_for_write(self, model, **hints):
+        if issubclass(model, SHARDED):
+            return self._shard(model, hints.get('instance'))
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        shards = settings.DATABASE_SHARDS
+        if enabled() and obj1._state.db in shards \
+                and obj2._state.db in shards:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_SHARDS:
+            return True
+        return None
+
+
+def chunked(values, size=BATCH_SIZE):
+    values = iter(values)
+    while True:
+        chunk = list(itertools.islice(values, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def replicate(instance):
+    """Переносит сохранённого в default пользователя или группу на шарды."""
+    model = type(instance)
+    values = {
+        field.attname: getattr(instance, field.attname)
+        for field in model._meta.concrete_fields
+    }
+    for alias in settings.DATABASE_SHARDS[1:]:
+        rows = model._base_manager.using(alias)
+        if not rows.filter(pk=instance.pk).update(**values):
+            rows.bulk_create([model(**values)])
+
+
+def unreplicate(instance):
+    for alias in settings.DATABASE_SHARDS[1:]:
+        type(instance)._base_manager.using(alias).filter(
+            pk=instance.pk).delete()
+
+
+def copy_reference(model, ids, alias):
+    """Копирует из default на шард alias недостающие строки справочника."""
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    for chunk in chunked(set(ids) - {None}):
+        present = model._base_manager.using(alias).filter(
+            pk__in=chunk).values_list('pk', flat=True)
+        missing = set(chunk) - set(present)
+        if missing:
+            model._base_manager.using(alias).bulk_create(
+                model._base_manager.using(DEFAULT_DB_ALIAS)
+                .filter(pk__in=missing),
+                ignore_conflicts=True,
+            )
+
+
+def sync_reference(alias, batch_size=BATCH_SIZE):
+    """Копирует на шард всех пользователей и группы, которых там нет."""
+    copied = 0
+    for model in REFERENCE:
+        ids = model._base_manager.using(DEFAULT_DB_ALIAS).order_by(
+            'pk').values_list('pk', flat=True)
+        for chunk in chunked(ids.iterator(), batch_size):
+            copy_reference(model, chunk, alias)
+            copied += len(chunk)
+    return copied
+
+
+def _delete(model, alias, ids):
+    """
+    Удаляет строки запросом к базе, мимо сигналов и каскада django:
+    переезд не должен трогать счётчики и кеш страниц.
+    """
+    connection = connections[alias]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        for chunk in chunked(ids):
+            marks = ', '.join(['%s'] * len(chunk))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ({marks})', chunk)
+
+
+def _copy(model, rows, target, batch_size):
+    """Копирует строки rows на target пачками, вместе со справочниками."""
+    copied = 0
+    references = {
+        field.attname: field.related_model
+        for field in model._meta.concrete_fields
+        if field.related_model in REFERENCE
+    }
+    for batch in chunked(rows.order_by('pk').iterator(), batch_size):
+        for attname, reference in references.items():
+            copy_reference(
+                reference, [getattr(row, attname) for row in batch], target)
+        with keep_created(model):
+            model._base_manager.using(target).bulk_create(
+                batch, ignore_conflicts=True)
+        copied += len(batch)
+    return copied
+
+
+def move_author(author, target, batch_size=BATCH_SIZE):
+    """
+    Переносит записи автора с комментариями и местами в лентах на target.
+
+    Сайт всё это время работает со старым шардом. Сначала записи и
+    комментарии копируются пачками без блокировок. Затем в одной
+    транзакции на запись в обоих шардах докопируется изменённое за
+    время копирования, удалённое убирается, ленты переносятся целиком,
+    закрепление переключается и строки на старом шарде удаляются.
+    Запись в старый шард ждёт только на этом коротком шаге. Возвращает
+    число перенесённых записей.
+    """
+    source = shard_for(author.pk)
+    if source == target:
+        return 0
+    posts = Post.objects.using(source).filter(author_id=author.pk)
+    comments = Comment.objects.using(source).filter(
+        post__author_id=author.pk)
+    started = timezone.now()
+    _copy(Post, posts, target, batch_size)
+    # Комментарии только к уже скопированным записям.
+    _copy(Comment, comments.filter(post__created__lt=started), target,
+          batch_size)
+    with atomic_write(using=source), atomic_write(using=target):
+        post_ids = set(posts.values_list('pk', flat=True))
+        comment_ids = set(comments.values_list('pk', flat=True))
+        changed_comments = comments.filter(modified__gte=started)
+        # Новый комментарий меняет счётчик записи, но не её modified.
+        changed_posts = set(
+            posts.filter(modified__gte=started).values_list('pk', flat=True)
+        ) | set(changed_comments.values_list('post_id', flat=True))
+        copied_posts = set(
+            Post.objects.using(target).filter(author_id=author.pk)
+            .values_list('pk', flat=True))
+        copied_comments = set(
+            Comment.objects.using(target).filter(post__author_id=author.pk)
+            .values_list('pk', flat=True))
+        _delete(Comment, target, (copied_comments - comment_ids) | set(
+            changed_comments.values_list('pk', flat=True)))
+        _delete(Post, target, (copied_posts - post_ids) | changed_posts)
+        _copy(Post, posts.filter(pk__in=changed_posts), target, batch_size)
+        _copy(Comment, changed_comments, target, batch_size)
+        entries = list(
+            TimelineEntry.objects.using(source)
+            .filter(post__author_id=author.pk)
+            .values_list('pk', 'user_id', 'post_id', 'created'))
+        copy_reference(User, [entry[1] for entry in entries], target)
+        TimelineEntry.objects.using(target).bulk_create(
+            [TimelineEntry(user_id=user_id, post_id=post_id, created=created)
+             for _, user_id, post_id, created in entries],
+            batch_size=batch_size, ignore_conflicts=True)
+        ShardPlacement.objects.using(DEFAULT_DB_ALIAS).update_or_create(
+            author_id=author.pk, defaults={'alias': target})
+        cache.set(placement_key(author.pk), target, PLACEMENT_TIMEOUT)
+        _delete(TimelineEntry, source, [entry[0] for entry in entries])
+        _delete(Comment, source, comment_ids)
+        _delete(Post, source, post_ids)
+    cache.delete_many([location_key(pk) for pk in post_ids])
+    return len(post_ids)
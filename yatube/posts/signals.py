@@ -0,0 +1,293 @@
+import contextvars
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.db.models.signals import (
+    post_delete, post_migrate, post_save, pre_delete, pre_save)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.page_cache import bump_on_commit
+from posts import follows, search, sharding, stats, thumbnails, timeline
+from posts.models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+# Поля автора и группы, которые выводятся в карточке записи.
+CARD_FIELDS = {
+    User: ('username', 'first_name', 'last_name'),
+    Group: ('title', 'slug'),
+}
+# Автор комментария тоже виден в карточке, в превью последних.
+CARD_POSTS = {
+    User: ('author', 'comments__author'),
+    Group: ('group',),
+}
+# Удаление записи или пользователя каскадом удаляет комментарии.
+# Комментарии удаляемых записей ничего не меняют, остальные копятся и
+# применяются одним разом по записи после каскада.
+_cascade = contextvars.ContextVar('comment_cascade', default=None)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    """Новая запись сразу попадает в ленты подписчиков автора."""
+    if created and not raw:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def remember_post_shard(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        sharding.remember_post(instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def replicate_reference(sender, instance, using, **kwargs):
+    """Пользователи и группы из default копируются на остальные шарды."""
+    if sharding.enabled() and using == DEFAULT_DB_ALIAS:
+        sharding.replicate(instance)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def unreplicate_reference(sender, instance, using, **kwargs):
+    if sharding.enabled() and using == DEFAULT_DB_ALIAS:
+        sharding.unreplicate(instance)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnails(sender, instance, raw=False, **kwargs):
+    """Миниатюры строятся в фоне сразу после загрузки картинки."""
+    if not raw:
+        thumbnails.schedule(instance.image)
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change(instance.author_id, 'post_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'post_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.change(instance.author_id, 'follower_count', 1)
+        stats.change(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'follower_count', -1)
+    stats.change(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_delete, sender=Follow)
+def restore_fan_out(sender, instance, **kwargs):
+    """Автор перестал быть знаменитостью: его записи снова в лентах."""
+    timeline.restore(instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def bump_post_version(sender, instance, raw=False, **kwargs):
+    """Любая правка записи делает устаревшей её закешированную карточку."""
+    if not raw and not instance._state.adding:
+        instance.version += 1
+
+
+@receiver(pre_save, sender=User)
+@receiver(pre_save, sender=Group)
+def check_card_fields(sender, instance, raw=False, update_fields=None,
+                      **kwargs):
+    fields = CARD_FIELDS[sender]
+    instance._card_changed = False
+    if raw or instance._state.adding:
+        return
+    if update_fields is not None and not set(update_fields) & set(fields):
+        return
+    old = sender.objects.filter(pk=instance.pk).values(*fields).first()
+    instance._card_changed = old is not None and any(
+        old[field] != getattr(instance, field) for field in fields)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def bump_card_versions(sender, instance, **kwargs):
+    """Смена имени автора или названия группы меняет карточки записей."""
+    if getattr(instance, '_card_changed', False):
+        lookups = Q()
+        for field in CARD_POSTS[sender]:
+            lookups |= Q(**{field: instance.pk})
+        for using in sharding.aliases():
+            posts = Post.objects.using(using)
+            posts.filter(
+                pk__in=posts.filter(lookups).values('pk')
+            ).update(version=F('version') + 1)
+        bump_on_commit('layout', using=instance._state.db)
+
+
+def post_scopes(post):
+    """Области кеша страниц, на которых видна запись."""
+    scopes = ['index', f'profile:{post.author.username}']
+    if post.group_id:
+        scopes.append(f'group:{post.group.slug}')
+    return scopes
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, raw=False, **kwargs):
+    instance._old_group_slug = None
+    if not raw and not instance._state.adding:
+        instance._old_group_slug = (
+            Post.objects.using(instance._state.db).filter(pk=instance.pk)
+            .values_list('group__slug', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, **kwargs):
+    scopes = post_scopes(instance)
+    old_group_slug = getattr(instance, '_old_group_slug', None)
+    if old_group_slug:
+        scopes.append(f'group:{old_group_slug}')
+    bump_on_commit(*scopes, using=instance._state.db)
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_comment_pages(sender, instance, **kwargs):
+    bump_on_commit(*post_scopes(instance.post), using=instance._state.db)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, raw=False, **kwargs):
+    """Новый комментарий виден в карточке записи: счётчик и превью."""
+    if created and not raw:
+        Post.objects.using(instance._state.db).filter(
+            pk=instance.post_id).update(
+            comment_count=F('comment_count') + 1,
+            version=F('version') + 1,
+        )
+
+
+def uncount_comments(using, counts):
+    """
+    Удалённые комментарии меняют карточку, страницу записи и её
+    Last-Modified: update() не трогает auto_now, дата ставится явно.
+    counts - сколько комментариев удалено у каждой записи.
+    """
+    posts = Post.objects.using(using)
+    now = timezone.now()
+    for post_id, count in counts.items():
+        posts.filter(pk=post_id).update(
+            comment_count=Greatest(F('comment_count') - count, 0),
+            version=F('version') + 1,
+            modified=now,
+        )
+
+
+def cascade():
+    state = _cascade.get()
+    if state is None:
+        state = {'posts': set(), 'authors': set(), 'counts': Counter()}
+        _cascade.set(state)
+    return state
+
+
+@receiver(pre_delete, sender=Post)
+def start_post_cascade(sender, instance, **kwargs):
+    cascade()['posts'].add(instance.pk)
+
+
+@receiver(pre_delete, sender=User)
+def start_user_cascade(sender, instance, **kwargs):
+    cascade()['authors'].add(instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    state = _cascade.get()
+    if state is not None:
+        if instance.post_id in state['posts']:
+            # Запись удаляется следом, её страницы сбросит она сама.
+            return
+        if instance.author_id in state['authors']:
+            state['counts'][instance._state.db, instance.post_id] += 1
+            return
+    uncount_comments(instance._state.db, {instance.post_id: 1})
+    bump_on_commit(*post_scopes(instance.post), using=instance._state.db)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=User)
+def finish_cascade(sender, instance, **kwargs):
+    """
+    Комментарии удаляются раньше записей и пользователей, поэтому к
+    первому post_delete записи или пользователя каскад уже пройден.
+    """
+    state = _cascade.get()
+    if state is None:
+        return
+    _cascade.set(None)
+    by_alias = {}
+    for (using, post_id), count in state['counts'].items():
+        by_alias.setdefault(using, {})[post_id] = count
+    scopes = set()
+    for using, counts in by_alias.items():
+        uncount_comments(using, counts)
+        for post in Post.objects.using(using).filter(
+                pk__in=counts).select_related('author', 'group'):
+            scopes.update(post_scopes(post))
+    if scopes:
+        bump_on_commit(*scopes, using=instance._state.db)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_pages(sender, instance, **kwargs):
+    bump_on_commit(
+        f'group:{instance.slug}', 'groups', using=instance._state.db)
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_deleted_group(sender, instance, **kwargs):
+    # Записи группы остаются без неё, ссылки на группу есть везде.
+    bump_on_commit(
+        'layout', f'group:{instance.slug}', using=instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_pages(sender, instance, **kwargs):
+    bump_on_commit(
+        f'profile:{instance.author.username}', using=instance._state.db)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_set(sender, instance, **kwargs):
+    # После фиксации, иначе множество перечитают из старого снимка.
+    user_id = instance.user_id
+    transaction.on_commit(
+        lambda: follows.invalidate(user_id), using=instance._state.db)
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, **kwargs):
+    """Миграции постов могли пересоздать таблицу вместе с триггерами."""
+    if sender.name == 'posts':
+        search.restore_triggers(kwargs['using'])
@@ -0,0 +1,35 @@
+from django.db.models import F
+
+from posts import sharding
+from posts.models import Follow, Post, UserStats
+
+
+def count_for(user_id):
+    """Считает счётчики пользователя по исходным таблицам."""
+    return {
+        'post_count': sharding.using_author(
+            Post.objects.filter(author_id=user_id), user_id).count(),
+        'follower_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def get_stats(user):
+    """Счётчики пользователя; недостающая запись создаётся пересчётом."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        # Пользователь с шарда: счётчики лежат только в default.
+        stats = UserStats.objects.filter(user_id=user.pk).first()
+        if stats is None:
+            stats, _ = UserStats.objects.get_or_create(
+                user_id=user.pk, defaults=count_for(user.pk))
+        return stats
+
+
+def change(user_id, field, delta):
+    """Атомарно сдвигает счётчик на delta, не уходя ниже нуля."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gte': -delta})
+    stats.update(**{field: F(field) + delta})
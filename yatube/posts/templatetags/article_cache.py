@@ -0,0 +1,43 @@
+from django import template
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts import comments, thumbnails
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/article.html'
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def card_key(post):
+    return f'article:{post.pk}:{post.version}'
+
+
+@register.simple_tag
+def article_list(posts):
+    """
+    Карточки записей страницы, разделённые <hr>.
+
+    Готовые карточки берутся из кеша одним get_many, рендерятся только
+    промахи, а миниатюры и последние комментарии для них находятся
+    одним пакетом. Версия записи входит в ключ, поэтому после правки
+    или нового комментария старая карточка просто перестаёт читаться.
+    """
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    misses = [
+        (key, post) for key, post in zip(keys, posts) if key not in cached]
+    thumbnails.prefetch([post for _, post in misses])
+    comments.prefetch_latest([post for _, post in misses])
+    to_cache = {}
+    for key, post in misses:
+        cached[key] = render_to_string(CARD_TEMPLATE, {'post': post})
+        # Карточку с оригиналом вместо миниатюры не кешируем.
+        if not getattr(post.image, 'thumbnail_pending', False):
+            to_cache[key] = cached[key]
+    if to_cache:
+        cache.set_many(to_cache, CARD_TIMEOUT)
+    return mark_safe('<hr>'.join(cached[key] for key in keys))
@@ -0,0 +1,54 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+def ready_thumbnail(image, size):
+    ready = getattr(image, 'ready_thumbnails', {})
+    if size in ready:
+        return ready[size]
+    return thumbnails.get_ready(image, size)
+
+
+@register.simple_tag
+def thumbnail_url(image, size='card'):
+    """
+    URL готовой миниатюры картинки записи.
+
+    Пока фоновый воркер её не построил, отдаётся URL оригинала, а
+    картинка ставится в очередь: запрос не ждёт Pillow.
+    """
+    if not image:
+        return ''
+    thumbnail = ready_thumbnail(image, size)
+    if thumbnail is not None:
+        return thumbnail.url
+    image.thumbnail_pending = True
+    thumbnails.schedule(image)
+    return image.url
+
+
+@register.simple_tag
+def thumbnail_srcset(image, size='card'):
+    """
+    Значение srcset из готовых миниатюр разной ширины.
+
+    Ширина берётся у самой миниатюры: у маленького оригинала крупные
+    варианты не растягиваются и совпадают с меньшими. Если каких-то
+    вариантов ещё нет, картинка ставится в очередь, а карточка с ней
+    не кешируется.
+    """
+    if not image:
+        return ''
+    widths = {}
+    for variant in thumbnails.SRCSET[size]:
+        thumbnail = ready_thumbnail(image, variant)
+        if thumbnail is None:
+            image.thumbnail_pending = True
+            thumbnails.schedule(image)
+            continue
+        widths.setdefault(thumbnail.width, thumbnail.url)
+    return ', '.join(
+        f'{url} {width}w' for width, url in sorted(widths.items()))
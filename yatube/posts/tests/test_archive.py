@@ -0,0 +1,92 @@
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ProfileExportTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.other = User.objects.create(username='TestReader')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Запись с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+        Post.objects.create(author=cls.author, text='Вторая запись')
+        Post.objects.create(author=cls.other, text='Чужая запись')
+        Comment.objects.create(
+            post=cls.post, author=cls.author, text='Свой комментарий')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.author)
+        self.url = reverse(
+            'posts:profile_export', kwargs={'username': self.author})
+
+    def test_zip_archive(self):
+        """ZIP содержит тексты автора и его картинки."""
+        response = self.client.get(self.url)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content)
+        with zipfile.ZipFile(io.BytesIO(content)) as archive:
+            records = [
+                json.loads(line)
+                for line in archive.read('data.ndjson').splitlines()]
+            image = archive.read(f'images/{self.post.image.name}')
+        self.assertEqual(
+            [record['type'] for record in records],
+            ['post', 'post', 'comment'])
+        self.assertNotIn(
+            'Чужая запись', [record.get('text') for record in records])
+        self.assertEqual(image, SMALL_GIF)
+
+    def test_ndjson(self):
+        """NDJSON - те же записи построчно, без картинок."""
+        response = self.client.get(self.url, {'format': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(json.loads(lines[0])['text'], 'Запись с картинкой')
+
+    def test_only_own_data(self):
+        """Чужие данные выгрузить нельзя, гостя отправляют на вход."""
+        other_url = reverse(
+            'posts:profile_export', kwargs={'username': self.other})
+        self.assertEqual(self.client.get(other_url).status_code, 403)
+        response = Client().get(self.url)
+        self.assertRedirects(
+            response, f'{reverse("users:login")}?next={self.url}')
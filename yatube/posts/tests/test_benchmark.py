@@ -0,0 +1,61 @@
+import json
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+User = get_user_model()
+
+
+class SeedAndBenchmarkTests(TestCase):
+    databases = '__all__'
+
+    def seed(self, *args):
+        call_command(
+            'seed_data', '--users', '20', '--posts', '200', '--groups', '3',
+            '--comments', '100', '--follows', '5', '--images', '0', *args,
+            stdout=StringIO())
+
+    def test_seed_data(self):
+        """Команда создаёт связанные данные с перекосом по авторам."""
+        self.seed()
+        self.assertEqual(
+            User.objects.filter(username__startswith='seed_').count(), 20)
+        self.assertEqual(Post.objects.count(), 200)
+        top = User.objects.get(username='seed_00000')
+        last = User.objects.get(username='seed_00019')
+        self.assertGreater(top.posts.count(), last.posts.count())
+        first, last = Post.objects.order_by('created')[::199]
+        self.assertGreater((last.created - first.created).days, 30)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            TimelineEntry.objects.filter(user_id=follow.user_id).count(),
+            Post.objects.filter(
+                author__following__user_id=follow.user_id).count())
+        self.assertEqual(
+            UserStats.objects.get(user=top).post_count, top.posts.count())
+
+    def test_seed_data_flush(self):
+        """Повторный запуск требует --flush и заменяет данные."""
+        self.seed()
+        with self.assertRaises(CommandError):
+            self.seed()
+        self.seed('--flush', '--seed', '1')
+        self.assertEqual(Post.objects.count(), 200)
+
+    def test_benchmark_json(self):
+        """Бенчмарк отдаёт перцентили, запросы и размер по каждой странице."""
+        self.seed()
+        out = StringIO()
+        call_command(
+            'benchmark', '--requests', '3', '--warmup', '1', '--json', '-',
+            stdout=out)
+        results = json.loads(out.getvalue())['results']
+        self.assertEqual(set(results), {
+            'index', 'group_posts', 'profile', 'post_detail', 'follow_index'})
+        for result in results.values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['bytes'], 0)
@@ -0,0 +1,172 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.page_cache import get_generations
+from core.tests.utils import commit_callbacks
+from posts.models import Group, Post
+from posts.templatetags.article_cache import card_key
+
+User = get_user_model()
+
+
+class ArticleCacheTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.user = User.objects.create(username='TestPostAuthor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+
+    def setUp(self):
+        self.guest_client = Client()
+        self.post = Post.objects.create(
+            author=self.user,
+            text='Тестовая запись',
+            group=self.group,
+        )
+        cache.clear()
+
+    def get_group_page(self):
+        return self.guest_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}))
+
+    def test_card_is_cached(self):
+        """Карточка записи после первого показа лежит в кеше."""
+        self.get_group_page()
+        self.assertIn('Тестовая запись', cache.get(card_key(self.post)))
+
+    def test_edit_bumps_version(self):
+        """Правка записи меняет ключ карточки, на странице новый текст."""
+        self.get_group_page()
+        self.post.text = 'Изменённая запись'
+        with commit_callbacks():
+            self.post.save()
+        response = self.get_group_page()
+        self.assertContains(response, 'Изменённая запись')
+
+    def test_author_rename_bumps_version(self):
+        """Смена имени автора обновляет карточки его записей."""
+        self.get_group_page()
+        self.user.first_name = 'Лев'
+        self.user.last_name = 'Толстой'
+        with commit_callbacks():
+            self.user.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 2)
+        response = self.get_group_page()
+        self.assertContains(response, 'Лев Толстой')
+
+    def test_group_rename_bumps_version(self):
+        """Смена названия группы обновляет карточки её записей."""
+        self.group.title = 'Новое название'
+        self.group.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.version, 2)
+
+
+class PageCacheTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.user = User.objects.create(username='TestPostAuthor')
+        cls.post = Post.objects.create(author=cls.user, text='Первая запись')
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_page_is_served_from_cache(self):
+        """Без изменений в базе главная страница отдаётся из кеша."""
+        self.guest_client.get(reverse('posts:index'))
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Первая запись')
+
+    def test_cookies_share_anonymous_entry(self):
+        """Аноним с другими куками получает ту же запись кеша."""
+        self.guest_client.get(reverse('posts:index'))
+        visitor = Client()
+        visitor.cookies['csrftoken'] = 'visitor-token'
+        visitor.cookies['_ga'] = 'GA1.1.42'
+        response = visitor.get(reverse('posts:index'))
+        self.assertIsNone(response.context)
+        self.assertIn('Cookie', response['Vary'])
+
+    def test_new_post_is_visible_at_once(self):
+        """Новая запись видна на закешированных страницах сразу."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user}),
+        ]
+        for url in urls:
+            self.guest_client.get(url)
+        with commit_callbacks():
+            Post.objects.create(author=self.user, text='Вторая запись')
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(
+                    self.guest_client.get(url), 'Вторая запись')
+
+    def test_generation_moves_after_commit(self):
+        """Поколение сдвигается только после фиксации записи."""
+        before = get_generations(['index'])
+        with commit_callbacks():
+            Post.objects.create(author=self.user, text='Вторая запись')
+            self.assertEqual(get_generations(['index']), before)
+        self.assertNotEqual(get_generations(['index']), before)
+
+    def test_post_moved_between_groups(self):
+        """Перенос записи убирает её со страницы прежней группы."""
+        old_group = Group.objects.create(
+            title='Старая', slug='old', description='Описание')
+        new_group = Group.objects.create(
+            title='Новая', slug='new', description='Описание')
+        post = Post.objects.create(
+            author=self.user, text='Переезжающая запись', group=old_group)
+        url = reverse('posts:group_list', kwargs={'slug': old_group.slug})
+        self.assertContains(self.guest_client.get(url), post.text)
+        post.group = new_group
+        with commit_callbacks():
+            post.save()
+        self.assertNotContains(self.guest_client.get(url), post.text)
+
+    def test_client_revalidates_cached_page(self):
+        """Кеш страниц живёт часами, а браузер сверяет страницу каждый раз."""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        response = self.guest_client.get(url)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertNotIn('Expires', response)
+        author_client = Client()
+        author_client.force_login(self.user)
+        self.assertEqual(
+            author_client.get(url)['Cache-Control'], 'private, no-cache')
+
+    def test_page_is_not_shared_between_viewers(self):
+        """Страница вошедшего пользователя не достаётся другим."""
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        author_client = Client()
+        author_client.force_login(self.user)
+        other = User.objects.create(username='TestOther')
+        other_client = Client()
+        other_client.force_login(other)
+        self.assertContains(author_client.get(url), 'Скачать мои данные')
+        for client in (self.guest_client, other_client):
+            with self.subTest(client=client):
+                response = client.get(url)
+                self.assertNotContains(response, 'Скачать мои данные')
+                self.assertNotContains(
+                    response, f'Пользователь: {self.user.username}')
+        self.assertContains(other_client.get(url), 'Подписаться')
+        self.assertContains(author_client.get(url), 'Скачать мои данные')
@@ -0,0 +1,172 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import sharding, views
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+AJAX = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+class CommentPagesTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовая запись')
+        start = timezone.now() - timedelta(days=1)
+        amount = views.COMMENTS_AMOUNT + 5
+        for number in range(amount):
+            comment = Comment.objects.create(
+                post=cls.post, author=cls.reader, text=f'Комментарий {number}')
+            Comment.objects.filter(pk=comment.pk).update(
+                created=start + timedelta(minutes=number))
+
+    def setUp(self):
+        self.client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+        cache.clear()
+
+    def test_first_page_oldest_first(self):
+        """На странице записи первая порция комментариев, ранние сверху."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        comments = response.context['comments']
+        texts = [comment.text for comment in comments]
+        self.assertEqual(len(texts), views.COMMENTS_AMOUNT)
+        self.assertEqual(texts[0], 'Комментарий 0')
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more_fragment(self):
+        """Кнопка ведёт на фрагмент с оставшимися комментариями."""
+        page = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        ).context['comments']
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': page.next_cursor})
+        texts = [comment.text for comment in response.context['comments']]
+        self.assertEqual(
+            texts, [f'Комментарий {number}' for number in range(
+                views.COMMENTS_AMOUNT, views.COMMENTS_AMOUNT + 5)])
+        self.assertNotContains(response, 'Показать ещё')
+        self.assertNotContains(response, '<html')
+
+    def test_ajax_comment_returns_fragment(self):
+        """Скрипту отвечаем разметкой нового комментария, форме - переходом."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        response = self.authorized_client.post(
+            url, {'text': 'Новый комментарий'}, **AJAX)
+        self.assertEqual(response.status_code, 201)
+        comment = sharding.using_post(
+            Comment.objects, self.post.pk).get(text='Новый комментарий')
+        self.assertContains(
+            response, f'id="comment-{comment.pk}"', status_code=201)
+        self.assertNotContains(response, '<html', status_code=201)
+        response = self.authorized_client.post(url, {'text': 'Обычный'})
+        self.assertRedirects(response, reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk}))
+
+    def test_ajax_invalid_comment(self):
+        """Пустой комментарий из скрипта получает 400 с ошибками формы."""
+        response = self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': ''}, **AJAX)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+
+class CommentCountTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def test_count_follows_comments(self):
+        """comment_count и версия записи меняются с комментариями."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        version = post.version
+        comment.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertGreater(post.version, version)
+
+    def test_card_shows_latest_comments(self):
+        """В карточке ленты число комментариев и два последних."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=self.reader, text=f'Реплика {number}')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Комментариев: 3')
+        self.assertNotContains(response, 'Реплика 0')
+        content = response.content.decode()
+        self.assertLess(
+            content.index('Реплика 1'), content.index('Реплика 2'))
+
+    def test_reconcile_fixes_comment_count(self):
+        """reconcile_stats пересчитывает разошедшийся comment_count."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        Post.objects.filter(pk=post.pk).update(comment_count=7)
+        call_command('reconcile_stats', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_post_delete_skips_its_comments(self):
+        """Удаление записи не обновляет её саму на каждый комментарий."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=self.reader, text=f'Реплика {number}')
+        with CaptureQueriesContext(connections[post._state.db]) as queries:
+            post.delete()
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(updates, [])
+
+    def test_user_delete_uncounts_comments_once(self):
+        """Комментарии удалённого пользователя вычитаются одним UPDATE."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        guest = User.objects.create(username='TestGuest')
+        for number in range(3):
+            Comment.objects.create(
+                post=post, author=guest, text=f'Реплика {number}')
+        Comment.objects.create(post=post, author=self.reader, text='Своя')
+        with CaptureQueriesContext(connections[post._state.db]) as queries:
+            guest.delete()
+        updates = [query['sql'] for query in queries
+                   if query['sql'].startswith('UPDATE "posts_post"')]
+        self.assertEqual(len(updates), 1)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
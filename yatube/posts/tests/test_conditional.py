@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.tests.utils import commit_callbacks
+from posts import sharding
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, text='Тестовая запись', group=cls.group)
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def urls(self):
+        return [
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:profile', kwargs={'username': self.author}),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+        ]
+
+    def posts(self):
+        return sharding.using_post(Post.objects, self.post.pk)
+
+    def revisit(self, url, client=None):
+        client = client or self.client
+        etag = client.get(url)['ETag']
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_not_modified(self):
+        """Повторный запрос с тем же ETag получает 304."""
+        for url in self.urls():
+            with self.subTest(url=url):
+                self.assertEqual(self.revisit(url).status_code, 304)
+
+    def test_post_pages_require_revalidation(self):
+        """Страница записи и её комментарии сверяются при каждом показе."""
+        urls = [
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            reverse('api:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache_control = self.client.get(url)['Cache-Control']
+                self.assertIn('no-cache', cache_control)
+                self.assertIn('private', cache_control)
+
+    def test_changes_refresh_pages(self):
+        """Комментарий, правка и подписка меняют ETag своих страниц."""
+        post_url, profile_url, group_url = self.urls()
+        changes = [
+            (lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'),
+             [post_url, profile_url, group_url]),
+            (lambda: self.posts().get(pk=self.post.pk).save(),
+             [post_url, profile_url, group_url]),
+            (lambda: Follow.objects.create(
+                user=self.reader, author=self.author),
+             [post_url, profile_url]),
+        ]
+        for change, urls in changes:
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            with commit_callbacks():
+                change()
+            for url, etag in etags.items():
+                with self.subTest(url=url):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_deleted_comment_refreshes_post(self):
+        """Удаление комментария меняет и ETag, и Last-Modified записи."""
+        url = self.urls()[0]
+        comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Комментарий')
+        # Last-Modified точен до секунды: отодвигаем прошлые правки.
+        past = timezone.now() - timedelta(hours=1)
+        self.posts().filter(pk=self.post.pk).update(modified=past)
+        sharding.using_post(Comment.objects, self.post.pk).filter(
+            pk=comment.pk).update(modified=past)
+        response = self.client.get(url)
+        comment.delete()
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
+        self.assertEqual(self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+        ).status_code, 200)
+
+    def test_etag_depends_on_viewer(self):
+        """Страница, показанная другому пользователю, не считается той же."""
+        reader_client = Client()
+        reader_client.force_login(self.reader)
+        for url in self.urls():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    self.revisit(url, reader_client).status_code, 304)
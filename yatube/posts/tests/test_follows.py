@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.tests.utils import commit_callbacks
+from posts import follows
+from posts.models import Follow
+
+User = get_user_model()
+
+
+class FollowSetTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def fresh_reader(self):
+        return User.objects.get(pk=self.reader.pk)
+
+    def test_cached_after_first_read(self):
+        """Второе чтение подписок идёт из кеша, без запросов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(
+            follows.is_following(self.fresh_reader(), self.author.pk))
+        reader = self.fresh_reader()
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follows.followed_ids(reader), {self.author.pk})
+
+    def test_follow_and_unfollow_invalidate(self):
+        """Подписка и отписка через страницы сразу меняют кнопку."""
+        url = reverse('posts:profile', kwargs={'username': self.author})
+        self.assertFalse(self.client.get(url).context['following'])
+        with commit_callbacks():
+            self.client.get(reverse(
+                'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertTrue(self.client.get(url).context['following'])
+        with commit_callbacks():
+            self.client.get(reverse(
+                'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertFalse(self.client.get(url).context['following'])
+
+    def test_invalidated_after_commit(self):
+        """Кеш подписок сбрасывается только после фиксации Follow."""
+        follows.followed_ids(User.objects.get(pk=self.reader.pk))
+        key = follows.follows_key(self.reader.pk)
+        with commit_callbacks():
+            Follow.objects.create(user=self.reader, author=self.author)
+            self.assertIsNotNone(cache.get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_anonymous(self):
+        """У гостя подписок нет и запросов тоже."""
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                follows.followed_ids(AnonymousUser()), frozenset())
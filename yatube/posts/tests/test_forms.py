@@ -3,12 +3,14 @@ import tempfile
 # import unittest
 from http import HTTPStatus
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
+from posts import sharding
 from posts.models import Post, Group
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -17,9 +19,12 @@ User = get_user_model()
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class TaskCreateFormTests(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
+        cache.clear()
         cls.user = User.objects.create(username='TestPostAuthor')
         cls.group = Group.objects.create(
             title='Тестовая группа',
@@ -42,6 +47,12 @@ class TaskCreateFormTests(TestCase):
         self.auth_client = Client()
         self.auth_client.force_login(self.auth_user)
 
+    def count(self, **lookups):
+        """Число записей на всех шардах."""
+        return sum(
+            Post.objects.using(alias).filter(**lookups).count()
+            for alias in sharding.aliases())
+
     # @unittest.skip
     def test_create_new_comment(self):
         """Валидная форма создает новый комментарий под записью."""
@@ -72,7 +83,7 @@ class TaskCreateFormTests(TestCase):
     # @unittest.skip
     def test_create_new_post(self):
         """Валидная форма создает новую запись на сайте."""
-        posts_count = Post.objects.count()
+        posts_count = self.count()
         small_gif = (
             b'\x47\x49\x46\x38\x39\x61\x01\x00'
             b'\x01\x00\x00\x00\x00\x21\xf9\x04'
@@ -99,13 +110,8 @@ class TaskCreateFormTests(TestCase):
         )
         self.assertRedirects(response, reverse(
             'posts:profile', args=[self.auth_user]))
-        self.assertEqual(Post.objects.count(), posts_count + 1)
-        self.assertTrue(
-            Post.objects.filter(
-                text=test_text,
-                group=selected_group,
-            ).exists()
-        )
+        self.assertEqual(self.count(), posts_count + 1)
+        self.assertTrue(self.count(text=test_text, group=selected_group))
 
     def test_create_new_post_with_wrong_file_instead_image(self):
         """
@@ -138,8 +144,7 @@ class TaskCreateFormTests(TestCase):
             follow=True,
         )
         self.assertEqual(response.status_code, HTTPStatus.OK)
-        self.assertEqual(Post.objects.filter(
-            image__contains='wrong_file.mp4').exists(), False)
+        self.assertFalse(self.count(image__contains='wrong_file.mp4'))
 
     # @unittest.skip
     def test_edit_post(self):
@@ -167,7 +172,7 @@ class TaskCreateFormTests(TestCase):
             slug='test-slug-2',
             description='Тестовое описание 2',
         )
-        posts_count = Post.objects.count()
+        posts_count = self.count()
         response = self.auth_client.get(
             reverse('posts:post_edit', kwargs={'post_id': new_post.pk})
         )
@@ -182,13 +187,9 @@ class TaskCreateFormTests(TestCase):
             data=form_data,
             follow=True
         )
-        self.assertEqual(Post.objects.count(), posts_count)
+        self.assertEqual(self.count(), posts_count)
         self.assertRedirects(response, reverse(
             'posts:post_detail', kwargs={'post_id': new_post.pk}))
         self.assertTrue(
-            Post.objects.filter(
-                text='Тестовый пост 1 ИЗМЕНЁННЫЙ',
-                group=group_2,
-            ).exists()
-        )
+            self.count(text='Тестовый пост 1 ИЗМЕНЁННЫЙ', group=group_2))
         self.assertEqual(response.status_code, 200)
@@ -0,0 +1,60 @@
+import io
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+
+from posts import images
+from posts.forms import PostForm
+
+
+def upload(size=(400, 300), mode='RGB', exif=None, name='photo.jpg'):
+    buffer = io.BytesIO()
+    image = Image.new(mode, size, 'red')
+    options = {'exif': exif} if exif else {}
+    image.save(buffer, 'PNG' if mode == 'RGBA' else 'JPEG', **options)
+    return SimpleUploadedFile(name, buffer.getvalue(), 'image/jpeg')
+
+
+def opened(result):
+    return Image.open(io.BytesIO(result.read()))
+
+
+@override_settings(IMAGE_MAX_SIDE=200)
+class IngestTests(SimpleTestCase):
+    def test_downscaled_and_reencoded(self):
+        """Картинка уменьшается по большей стороне и пережимается."""
+        result = images.ingest(upload((400, 300)))
+        self.assertTrue(result.name.startswith('photo.'))
+        image = opened(result)
+        self.assertEqual(image.format, images.OUTPUT_FORMAT)
+        self.assertEqual(image.size, (200, 150))
+
+    def test_metadata_stripped_and_rotated(self):
+        """Поворот из EXIF применяется, сами метаданные удаляются."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90 градусов.
+        exif[0x010F] = 'Camera maker'
+        image = opened(images.ingest(upload((200, 100), exif=exif)))
+        self.assertEqual(image.size, (100, 200))
+        self.assertEqual(dict(image.getexif()), {})
+
+    def test_transparency_flattened(self):
+        """Прозрачная картинка сохраняется без ошибок."""
+        result = images.ingest(upload((50, 50), mode='RGBA', name='a.png'))
+        self.assertEqual(opened(result).size, (50, 50))
+
+    @override_settings(IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Слишком большая по пикселям картинка отклоняется."""
+        with self.assertRaises(ValidationError) as context:
+            images.ingest(upload((200, 200)))
+        self.assertEqual(context.exception.code, 'too_many_pixels')
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=10)
+    def test_form_rejects_large_file(self):
+        """Форма записи показывает ошибку для слишком большого файла."""
+        form = PostForm(data={'text': 'Текст'}, files={'image': upload()})
+        self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
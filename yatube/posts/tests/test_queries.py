@@ -0,0 +1,106 @@
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+PAGE_SIZE = 10
+
+
+class QueryBudgetMixin:
+    """Проверка бюджета запросов, объявленного у view через query_budget."""
+
+    def assertWithinBudget(self, client, url, data=None):
+        budget = resolve(url).func.query_budget
+        # Запросы считаются на всех базах: с шардами часть уходит мимо
+        # default.
+        with ExitStack() as stack:
+            captured = {
+                alias: stack.enter_context(
+                    CaptureQueriesContext(connections[alias]))
+                for alias in connections
+            }
+            response = client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        queries = [
+            f'{alias}: {query["sql"]}'
+            for alias, context in captured.items()
+            for query in context.captured_queries
+        ]
+        sql = '\n'.join(queries)
+        self.assertLessEqual(
+            len(queries), budget,
+            f'{url}: {len(queries)} запросов при бюджете {budget}\n{sql}')
+        return response
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.reader = User.objects.create(username='TestReader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [
+            User.objects.create(
+                username=f'author{i}', first_name='Имя', last_name='Фамилия')
+            for i in range(3)
+        ]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(PAGE_SIZE * 7):
+            author = cls.authors[i % len(cls.authors)]
+            post = Post.objects.create(
+                author=author, text=f'Запись {i}', group=cls.group)
+            Comment.objects.create(
+                post=post, author=cls.reader, text='Комментарий')
+        cls.post = post
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+        cache.clear()
+
+    def test_list_pages_within_budget(self):
+        """Списки записей укладываются в бюджет на любой странице."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.authors[0]}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.assertWithinBudget(self.client, url)
+                page_obj = response.context['page_obj']
+                cache.clear()
+                self.assertWithinBudget(
+                    self.client, url, {'cursor': page_obj.next_cursor})
+
+    def test_detail_pages_within_budget(self):
+        """Страницы записи и форм укладываются в бюджет."""
+        post = Post.objects.create(author=self.reader, text='Своя запись')
+        for _ in range(PAGE_SIZE):
+            Comment.objects.create(
+                post=post, author=self.authors[0], text='Комментарий')
+        urls = [
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            reverse('posts:post_edit', kwargs={'post_id': post.pk}),
+            reverse('posts:post_create'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertWithinBudget(self.client, url)
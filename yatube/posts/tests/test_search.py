@@ -0,0 +1,89 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import sharding
+from posts.models import Post
+from posts.search import match_expression
+from posts.tests.test_queries import QueryBudgetMixin
+
+User = get_user_model()
+
+PAGE_SIZE = 10
+
+
+class SearchTests(QueryBudgetMixin, TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.cats = Post.objects.create(
+            author=cls.author, text='Фотографии котиков и собак')
+        cls.hedgehog = Post.objects.create(
+            author=cls.author, text='Ёжик в тумане')
+        cls.other = Post.objects.create(
+            author=cls.author, text='Заметки о погоде')
+
+    def setUp(self):
+        self.client = Client()
+        cache.clear()
+
+    def search(self, query, **params):
+        return self.client.get(
+            reverse('posts:post_search'), {'q': query, **params})
+
+    def found(self, query):
+        return list(self.search(query).context['page_obj'])
+
+    def test_word_forms(self):
+        """Поиск находит другие формы слова и не различает е и ё."""
+        self.assertEqual(self.found('котик'), [self.cats])
+        self.assertEqual(self.found('Собака'), [self.cats])
+        self.assertEqual(self.found('ежики'), [self.hedgehog])
+
+    def test_all_words_required(self):
+        """Запись должна содержать все слова запроса."""
+        self.assertEqual(self.found('котики собаки'), [self.cats])
+        self.assertEqual(self.found('котики туман'), [])
+
+    def test_index_follows_changes(self):
+        """Правка и удаление записи сразу видны в поиске."""
+        self.other.text = 'Заметки о котах'
+        self.other.save()
+        self.assertIn(self.other, self.found('коты'))
+        self.assertEqual(self.found('погода'), [])
+        sharding.using_post(Post.objects, self.cats.pk).filter(
+            pk=self.cats.pk).delete()
+        self.assertEqual(self.found('собаки'), [])
+
+    def test_query_syntax_is_escaped(self):
+        """Спецсимволы FTS5 в запросе не ломают поиск."""
+        self.assertEqual(
+            match_expression('кот* OR "собака" -(NEAR'),
+            '"кот"* "or"* "собак"* "near"*')
+        response = self.search('") OR * NEAR(')
+        self.assertEqual(response.status_code, 200)
+        response = self.search('')
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_pages_keep_query(self):
+        """Страницы результатов идут по курсору и сохраняют запрос."""
+        posts = [
+            Post.objects.create(author=self.author, text=f'Кот номер {i}')
+            for i in range(PAGE_SIZE + 5)
+        ]
+        url = reverse('posts:post_search')
+        response = self.assertWithinBudget(self.client, url, {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82&amp;cursor=')
+        cache.clear()
+        response = self.assertWithinBudget(
+            self.client, url, {'q': 'кот', 'cursor': page_obj.next_cursor})
+        second = response.context['page_obj']
+        self.assertFalse(second.has_next())
+        self.assertCountEqual(
+            list(page_obj) + list(second), posts + [self.cats])
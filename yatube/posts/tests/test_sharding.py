@@ -0,0 +1,185 @@
+import json
+import tempfile
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import archive, sharding
+from posts.models import (
+    Comment, Follow, Group, Post, ShardPlacement, TimelineEntry)
+
+User = get_user_model()
+
+
+# Запуск: YATUBE_SHARDS=2 python manage.py test posts.tests.test_sharding
+@skipUnless(len(settings.DATABASE_SHARDS) > 1, 'нужно YATUBE_SHARDS=2')
+class ShardingTests(TestCase):
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.first, self.second = settings.DATABASE_SHARDS[:2]
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.author = User.objects.create(username='TestPostAuthor')
+        self.other = User.objects.create(username='TestOtherAuthor')
+        self.reader = User.objects.create(username='TestReader')
+        ShardPlacement.objects.create(author=self.author, alias=self.first)
+        ShardPlacement.objects.create(author=self.other, alias=self.second)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.reader, author=self.other)
+        # Записи авторов вперемешку, от старых к новым.
+        self.posts = [
+            Post.objects.create(
+                author=(self.author, self.other)[number % 2],
+                text=f'Запись {number}', group=self.group)
+            for number in range(6)
+        ]
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def texts(self, url):
+        page = self.client.get(url).context['page_obj']
+        return [post.text for post in page]
+
+    def newest_first(self):
+        return [post.text for post in reversed(self.posts)]
+
+    def test_posts_on_author_shard(self):
+        """Записи лежат на шарде автора, id не повторяются между шардами."""
+        for author, alias in ((self.author, self.first),
+                              (self.other, self.second)):
+            self.assertEqual(
+                Post.objects.using(alias).filter(author=author).count(), 3)
+        ids = [
+            pk for alias in settings.DATABASE_SHARDS
+            for pk in Post.objects.using(alias).values_list('pk', flat=True)]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertTrue(
+            User.objects.using(self.second).filter(pk=self.reader.pk).exists())
+
+    def test_lists_merge_shards(self):
+        """Главная, группа и подписки сливают шарды по дате."""
+        self.assertEqual(self.texts(reverse('posts:index')),
+                         self.newest_first())
+        self.assertEqual(
+            self.texts(reverse('posts:group_list',
+                               kwargs={'slug': 'test-slug'})),
+            self.newest_first())
+        self.assertEqual(self.texts(reverse('posts:follow_index')),
+                         self.newest_first())
+
+    def test_search_covers_all_shards(self):
+        """Поиск находит записи на всех шардах."""
+        Post.objects.create(author=self.other, text='Рыжие котики')
+        self.assertEqual(
+            self.texts(reverse('posts:post_search') + '?q=котики'),
+            ['Рыжие котики'])
+        self.assertEqual(
+            sorted(self.texts(reverse('posts:post_search') + '?q=запись')),
+            sorted(self.newest_first()))
+
+    def test_exports_read_all_shards(self):
+        """Выгрузки собирают записи и комментарии со всех шардов."""
+        comment = Comment.objects.create(
+            post=self.posts[1], author=self.reader, text='Комментарий')
+        lines = [json.loads(line) for line in archive.records(self.reader)]
+        self.assertEqual([line['id'] for line in lines], [comment.pk])
+        output = StringIO()
+        call_command('export_posts', '-', '--chunk-size', '2',
+                     stdout=output, stderr=StringIO())
+        records = [
+            json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(
+            [record['id'] for record in records if record['type'] == 'post'],
+            [post.pk for post in self.posts])
+        self.assertEqual(
+            [record['id'] for record in records
+             if record['type'] == 'comment'],
+            [comment.pk])
+
+    def test_import_writes_to_author_shard(self):
+        """Загрузка кладёт записи и комментарии на шард автора записи."""
+        comment = Comment.objects.create(
+            post=self.posts[1], author=self.reader, text='Комментарий')
+        with tempfile.NamedTemporaryFile('w+', suffix='.ndjson') as dump:
+            call_command('export_posts', dump.name, stderr=StringIO())
+            for alias in settings.DATABASE_SHARDS:
+                Post.objects.using(alias).all().delete()
+            cache.clear()
+            call_command('import_posts', dump.name, stderr=StringIO())
+        for author, alias in ((self.author, self.first),
+                              (self.other, self.second)):
+            self.assertEqual(
+                Post.objects.using(alias).filter(author=author).count(), 3)
+        self.assertTrue(
+            Comment.objects.using(self.second).filter(pk=comment.pk).exists())
+
+    def test_profile_reads_one_shard(self):
+        """Профиль читает записи только с шарда автора."""
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': self.other}))
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Запись 5', 'Запись 3', 'Запись 1'])
+
+    def test_comment_on_post_shard(self):
+        """Комментарий ложится на шард записи и меняет её счётчик."""
+        post = self.posts[1]
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            {'text': 'Комментарий'})
+        comment = Comment.objects.using(self.second).get()
+        self.assertEqual(comment.author, self.reader)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(len(response.context['comments']), 1)
+
+    def test_move_author(self):
+        """Перенос автора забирает записи, комментарии и ленты."""
+        Comment.objects.create(
+            post=self.posts[1], author=self.reader, text='Комментарий')
+        call_command('move_author', 'TestOtherAuthor', self.first,
+                     stdout=StringIO())
+        self.assertEqual(sharding.shard_for(self.other.pk), self.first)
+        for model in (Post, Comment, TimelineEntry):
+            self.assertFalse(model.objects.using(self.second).exists())
+        self.assertEqual(
+            Post.objects.using(self.first).filter(author=self.other).count(),
+            3)
+        self.assertEqual(
+            Comment.objects.using(self.first).get().post, self.posts[1])
+        self.assertEqual(self.texts(reverse('posts:follow_index')),
+                         self.newest_first())
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.posts[1].pk}))
+        self.assertEqual(response.status_code, 200)
+
+    def test_move_picks_up_concurrent_writes(self):
+        """Запись, сделанная во время копирования, тоже переезжает."""
+        copy = sharding._copy
+        written = []
+
+        def copy_and_write(model, *args):
+            if not written:
+                written.append(Post.objects.create(
+                    author=self.other, text='Во время переноса'))
+            return copy(model, *args)
+
+        with mock.patch.object(sharding, '_copy', copy_and_write):
+            sharding.move_author(self.other, self.first)
+        self.assertTrue(
+            Post.objects.using(self.first).filter(
+                pk=written[0].pk).exists())
+        self.assertFalse(Post.objects.using(self.second).exists())
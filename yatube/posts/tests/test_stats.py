@@ -0,0 +1,56 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts.models import Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class UserStatsTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются вместе с записями и подписками."""
+        post = Post.objects.create(author=self.author, text='Запись')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.post_count, 1)
+        self.assertEqual(self.author.stats.follower_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+        post.delete()
+        follow.delete()
+        self.author.stats.refresh_from_db()
+        self.reader.stats.refresh_from_db()
+        self.assertEqual(self.author.stats.post_count, 0)
+        self.assertEqual(self.author.stats.follower_count, 0)
+        self.assertEqual(self.reader.stats.following_count, 0)
+
+    def test_reconcile_stats_fixes_drift(self):
+        """Команда reconcile_stats исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.author, text='Запись')
+        Post.objects.create(author=self.author, text='Ещё запись')
+        UserStats.objects.filter(user=self.author).update(post_count=42)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('reconcile_stats', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).post_count, 2)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+
+    def test_reconcile_stats_dry_run(self):
+        """С --dry-run команда ничего не меняет."""
+        UserStats.objects.filter(user=self.author).update(post_count=42)
+        call_command('reconcile_stats', '--dry-run', stdout=StringIO())
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).post_count, 42)
@@ -0,0 +1,111 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from sorl.thumbnail.models import KVStore
+
+from posts import sharding, thumbnails
+from posts.models import Post
+from posts.templatetags.post_thumbnails import (
+    thumbnail_srcset, thumbnail_url)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00'
+    b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+    b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+    b'\x00\x00\x01\x00\x01\x00\x00\x02'
+    b'\x02\x4c\x01\x00\x3b'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=User.objects.create(username='TestPostAuthor'),
+            text='Запись с картинкой',
+            image=SimpleUploadedFile(
+                name='small.gif', content=SMALL_GIF, content_type='image/gif'),
+        )
+
+    def test_original_is_shown_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, шаблон получает оригинал картинки."""
+        self.assertEqual(thumbnail_url(self.post.image), self.post.image.url)
+        self.assertTrue(self.post.image.thumbnail_pending)
+
+    def test_thumbnail_is_shown_when_ready(self):
+        """После генерации шаблон получает URL миниатюры."""
+        thumbnails.generate(self.post.image.name)
+        url = thumbnail_url(self.post.image)
+        self.assertNotEqual(url, self.post.image.url)
+        self.assertEqual(url, thumbnails.get_ready(self.post.image).url)
+
+    def test_srcset_lists_ready_widths(self):
+        """srcset собирается из готовых миниатюр с их настоящей шириной."""
+        self.assertEqual(thumbnail_srcset(self.post.image), '')
+        self.assertTrue(self.post.image.thumbnail_pending)
+        thumbnails.generate(self.post.image.name)
+        post = sharding.using_post(Post.objects, self.post.pk).get(
+            pk=self.post.pk)
+        srcset = thumbnail_srcset(post.image)
+        widths = [part.rsplit(' ', 1)[1] for part in srcset.split(', ')]
+        self.assertIn('960w', widths)
+        self.assertEqual(len(widths), len(set(widths)))
+
+    def test_empty_image(self):
+        """Для записи без картинки тег ничего не выводит."""
+        post = Post.objects.create(author=self.post.author, text='Без')
+        self.assertEqual(thumbnail_url(post.image), '')
+
+    def test_prefetch_resolves_page_in_batch(self):
+        """prefetch находит миниатюры страницы без запросов на картинку."""
+        posts = [self.post]
+        for i in range(3):
+            posts.append(Post.objects.create(
+                author=self.post.author,
+                text=f'Запись {i}',
+                image=SimpleUploadedFile(
+                    name=f'small{i}.gif', content=SMALL_GIF,
+                    content_type='image/gif'),
+            ))
+        thumbnails.generate(self.post.image.name)
+        cache.clear()
+        with self.assertNumQueries(1):
+            thumbnails.prefetch(posts)
+        with self.assertNumQueries(0):
+            urls = [thumbnail_url(post.image) for post in posts]
+        self.assertEqual(
+            urls[0], thumbnails.get_ready(self.post.image).url)
+        self.assertEqual(urls[1:], [post.image.url for post in posts[1:]])
+
+    def test_pending_marker_expires(self):
+        """Метка «миниатюры нет» в кеше живёт THUMBNAIL_PENDING_TIMEOUT."""
+        thumbnails.generate(self.post.image.name)
+        rows = list(KVStore.objects.all())
+        # Гонка с воркером: prefetch прочитал базу до того, как воркер
+        # записал миниатюру, а метку положил в кеш уже после него.
+        KVStore.objects.all().delete()
+        cache.clear()
+        with override_settings(THUMBNAIL_PENDING_TIMEOUT=0):
+            thumbnails.prefetch([self.post])
+        self.assertIsNone(self.post.image.ready_thumbnails['card'])
+        KVStore.objects.bulk_create(rows)
+        thumbnails.prefetch([self.post])
+        self.assertEqual(
+            self.post.image.ready_thumbnails['card'].url,
+            thumbnails.get_ready(self.post.image).url)
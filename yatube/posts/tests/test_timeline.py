@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts import sharding
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache.clear()
+        cls.author = User.objects.create(username='TestPostAuthor')
+        cls.reader = User.objects.create(username='TestReader')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Запись до подписки',
+        )
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow(self):
+        self.reader_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+
+    def entries(self):
+        return sharding.using_author(TimelineEntry.objects, self.author.pk)
+
+    def test_follow_backfills_timeline(self):
+        """Подписка добавляет в ленту уже опубликованные записи автора."""
+        self.follow()
+        self.assertTrue(self.entries().filter(
+            user=self.reader, post=self.old_post).exists())
+
+    def test_new_post_fans_out_to_followers(self):
+        """Новая запись сразу попадает в ленты подписчиков."""
+        self.follow()
+        new_post = Post.objects.create(author=self.author, text='Новая')
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post])
+
+    def test_unfollow_clears_timeline(self):
+        """После отписки записей автора в ленте не остаётся."""
+        self.follow()
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertFalse(self.entries().filter(user=self.reader).exists())
+
+    @override_settings(FEED_TIMELINE_LENGTH=2)
+    def test_timeline_is_capped(self):
+        """Лента читателя не растёт больше FEED_TIMELINE_LENGTH."""
+        self.follow()
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Запись {i}')
+        self.assertEqual(self.entries().filter(user=self.reader).count(), 2)
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_read_on_request(self):
+        """Записи популярных авторов подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новая')
+        self.assertFalse(self.entries().filter(user=self.reader).exists())
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context['page_obj']), [new_post, self.old_post])
+
+    @override_settings(FEED_TIMELINE_LENGTH=2)
+    def test_fan_out_caps_every_follower(self):
+        """Публикация обрезает ленты всех подписчиков разом."""
+        readers = [self.reader] + [
+            User.objects.create(username=f'TestReader{i}') for i in range(3)]
+        for reader in readers:
+            Follow.objects.create(user=reader, author=self.author)
+        for i in range(3):
+            Post.objects.create(author=self.author, text=f'Запись {i}')
+        for reader in readers:
+            with self.subTest(reader=reader):
+                self.assertEqual(
+                    self.entries().filter(user=reader).count(), 2)
+
+    @override_settings(FEED_FANOUT_LIMIT=1)
+    def test_former_celebrity_posts_return_to_timelines(self):
+        """Когда подписчиков становится мало, записи автора идут в ленты."""
+        other = User.objects.create(username='TestOtherReader')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        new_post = Post.objects.create(author=self.author, text='Новая')
+        self.assertFalse(self.entries().filter(user=self.reader).exists())
+        Follow.objects.filter(user=other).delete()
+        self.assertEqual(
+            set(self.entries().filter(user=self.reader)
+                .values_list('post_id', flat=True)),
+            {new_post.pk, self.old_post.pk})
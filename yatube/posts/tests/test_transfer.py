@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core.models import keep_created
+from posts import sharding
+from posts.models import Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class TransferTests(TestCase):
+    databases = '__all__'
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create(
+            username='TestPostAuthor', first_name='Имя')
+        self.reader = User.objects.create(username='TestReader')
+        self.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        self.posts = [
+            Post.objects.create(
+                author=self.author, text=f'Запись {number}',
+                group=self.group if number % 2 else None)
+            for number in range(5)
+        ]
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.path = os.path.join(TEMP_DIR, f'{self._testMethodName}.jsonl')
+
+    def export(self, *args):
+        call_command(
+            'export_posts', self.path, '--chunk-size', '2', *args,
+            stderr=StringIO())
+
+    def wipe(self):
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+    def count(self, queryset):
+        """Число строк на всех шардах."""
+        return sum(
+            queryset.using(alias).count() for alias in sharding.aliases())
+
+    def test_round_trip(self):
+        """Выгрузка и загрузка в пустую базу восстанавливают данные."""
+        created = {post.pk: post.created for post in self.posts}
+        self.export()
+        self.wipe()
+        call_command(
+            'import_posts', self.path, '--batch-size', '2',
+            stderr=StringIO())
+        loaded = {}
+        for alias in sharding.aliases():
+            loaded.update(
+                Post.objects.using(alias).values_list('pk', 'created'))
+        self.assertEqual(loaded, created)
+        post = sharding.using_post(
+            Post.objects.all(), self.posts[0].pk).get(pk=self.posts[0].pk)
+        self.assertEqual(post.author.username, 'TestPostAuthor')
+        self.assertEqual(post.author.first_name, 'Имя')
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(post.author.stats.post_count, 5)
+        self.assertFalse(post.author.has_usable_password())
+        self.assertEqual(
+            self.count(Post.objects.filter(group__slug='test-slug')), 2)
+        reader = User.objects.get(username='TestReader')
+        self.assertEqual(
+            self.count(TimelineEntry.objects.filter(user=reader)), 5)
+        new = Post.objects.create(author=reader, text='Новая запись')
+        self.assertGreater(new.pk, max(created))
+
+    def test_import_is_repeatable(self):
+        """Повторная загрузка того же файла ничего не дублирует."""
+        self.export()
+        for _ in range(2):
+            call_command('import_posts', self.path, stderr=StringIO())
+        self.assertEqual(self.count(Post.objects.all()), 5)
+        self.assertEqual(self.count(Comment.objects.all()), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_import_stops_on_taken_id(self):
+        """Чужая запись с тем же id останавливает загрузку."""
+        self.export()
+        post_id = self.posts[0].pk
+        self.posts[0].delete()
+        Post.objects.create(pk=post_id, author=self.reader, text='Чужая')
+        with self.assertRaisesMessage(CommandError, f'id {post_id}'):
+            call_command('import_posts', self.path, stderr=StringIO())
+        self.assertFalse(
+            sharding.using_author(Comment.objects.all(), self.reader.pk)
+            .filter(post_id=post_id).exists())
+
+    def test_kept_dates_stay_in_thread(self):
+        """keep_created не отменяет auto_now_add в других потоках."""
+        past = timezone.now() - timedelta(days=1)
+        field = Post._meta.get_field('created')
+        with keep_created(Post):
+            self.assertEqual(field.pre_save(Post(created=past), True), past)
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                other = pool.submit(
+                    field.pre_save, Post(created=past), True).result()
+        self.assertGreater(other, past)
+        self.assertGreater(field.pre_save(Post(created=past), True), past)
+
+    def test_import_resumes_from_checkpoint(self):
+        """С checkpoint загрузка продолжается со следующей строки."""
+        self.export()
+        with open(self.path) as file:
+            records = [json.loads(line) for line in file]
+        skipped = [
+            number for number, record in enumerate(records, 1)
+            if record['type'] == 'post'][:2]
+        checkpoint = os.path.join(TEMP_DIR, 'import.checkpoint')
+        with open(checkpoint, 'w') as file:
+            json.dump({'line': skipped[-1]}, file)
+        for alias in sharding.aliases():
+            Post.objects.using(alias).all().delete()
+        call_command(
+            'import_posts', self.path, '--checkpoint', checkpoint,
+            stderr=StringIO())
+        self.assertEqual(self.count(Post.objects.all()), 3)
+        self.assertFalse(os.path.exists(checkpoint))
+
+    def test_export_resumes_from_checkpoint(self):
+        """Прерванная выгрузка дописывает файл с последнего pk."""
+        checkpoint = os.path.join(TEMP_DIR, 'export.checkpoint')
+        with open(checkpoint, 'w') as file:
+            json.dump({'kind': 'post', 'pk': self.posts[2].pk}, file)
+        self.export('--checkpoint', checkpoint)
+        with open(self.path) as file:
+            kinds = [json.loads(line)['type'] for line in file]
+        self.assertEqual(kinds, ['post', 'post', 'comment', 'follow'])
+
+    def test_media_copied_both_ways(self):
+        """Картинки уходят в каталог выгрузки и возвращаются в хранилище."""
+        media = os.path.join(TEMP_DIR, 'media')
+        name = 'posts/transfer.gif'
+        with self.settings(MEDIA_ROOT=os.path.join(TEMP_DIR, 'source')):
+            default_storage.save(name, ContentFile(b'GIF89a'))
+            sharding.using_post(Post.objects, self.posts[0].pk).filter(
+                pk=self.posts[0].pk).update(image=name)
+            self.export('--media', media)
+        self.assertTrue(os.path.exists(os.path.join(media, name)))
+        target = os.path.join(TEMP_DIR, 'target')
+        with self.settings(MEDIA_ROOT=target):
+            call_command(
+                'import_posts', self.path, '--media', media,
+                stderr=StringIO())
+        self.assertTrue(os.path.exists(os.path.join(target, name)))
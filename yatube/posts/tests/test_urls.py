@@ -10,9 +10,12 @@ User = get_user_model()
 
 
 class TaskURLTests(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
+        cache.clear()
         cls.user = User.objects.create(username='TestPostAuthor')
         cls.group = Group.objects.create(
             title='Тестовая группа',
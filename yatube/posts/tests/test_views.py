@@ -5,15 +5,20 @@ from django.urls import reverse
 from django import forms
 from django.core.cache import cache
 
+from core.paginator import NEXT, encode_cursor
+from posts import sharding
 from posts.models import Post, Group
 
 User = get_user_model()
 
 
 class TaskViewTests(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
+        cache.clear()
         cls.user = User.objects.create(username='TestPostAuthor')
         cls.group = Group.objects.create(
             title='Тестовая группа',
@@ -38,6 +43,9 @@ class TaskViewTests(TestCase):
         self.post_count = self.post_list.count()
         cache.clear()
 
+    def posts(self):
+        return sharding.using_author(Post.objects.all(), self.user.pk)
+
     def test_cache_index_page(self):
         """Проверка кеширования главной страницы."""
         test_post = Post.objects.create(
@@ -45,13 +53,13 @@ class TaskViewTests(TestCase):
             text='Тестовая запись 2',
             group=self.group,
         )
-        post_count = Post.objects.count()
+        post_count = self.posts().count()
         response = self.guest_client.get(reverse('posts:index'))
         page_obj = response.context.get('page_obj')
         test_post.delete()
         self.assertEqual(len(page_obj), post_count)
         cache.clear()
-        self.assertEqual(Post.objects.count(), post_count - 1)
+        self.assertEqual(self.posts().count(), post_count - 1)
 
     def test_pages_uses_correct_template(self):
         """URL-адрес использует соответствующий шаблон."""
@@ -78,8 +86,7 @@ class TaskViewTests(TestCase):
 
     def test_index_page_show_correct_context(self):
         """Шаблон index сформирован с правильным контекстом."""
-        post_list = Post.objects.all()
-        paginator = Paginator(post_list, 10)
+        paginator = Paginator(self.posts(), 10)
         page_obj = paginator.get_page(1)
         response = (self.guest_client.get(reverse('posts:index')))
         self.assertEqual(
@@ -90,7 +97,7 @@ class TaskViewTests(TestCase):
 
     def test_group_page_show_correct_context(self):
         """Шаблон group_posts сформирован с правильным контекстом."""
-        group_posts = self.group.group_posts.all()
+        group_posts = self.posts().filter(group=self.group)
         paginator = Paginator(group_posts, 10)
         page_obj = paginator.get_page(1)
         response = (self.guest_client.get(
@@ -135,7 +142,7 @@ class TaskViewTests(TestCase):
         self.assertEqual(
             response.context.get('post'), self.post)
         self.assertEqual(
-            response.context.get('comments').count(),
+            len(response.context.get('comments')),
             self.post.comments.count())
 
     def test_edit_form_correct_fields(self):
@@ -237,9 +244,12 @@ class TaskViewTests(TestCase):
 
 
 class PaginatorViewsTest(TestCase):
+    databases = '__all__'
+
     @classmethod
     def setUpClass(cls):
         super().setUpClass()
+        cache.clear()
         cls.user = User.objects.create(username='TestPostAuthor')
         cls.group = Group.objects.create(
             title='Тестовая группа',
@@ -256,6 +266,18 @@ class PaginatorViewsTest(TestCase):
 
     def setUp(self):
         self.guest_client = Client()
+        cache.clear()
+
+    def get_pages(self, url):
+        first_page = self.guest_client.get(url).context['page_obj']
+        response = self.guest_client.get(
+            url, {'cursor': first_page.next_cursor})
+        return first_page, response.context['page_obj']
+
+    def get_second_page(self, url):
+        first_page = self.guest_client.get(url).context['page_obj']
+        return self.guest_client.get(
+            url, {'cursor': first_page.next_cursor})
 
     def test_index_first_page_contains_ten_records(self):
         """Проверка количества записей на главной странице (1стр)."""
@@ -264,7 +286,7 @@ class PaginatorViewsTest(TestCase):
 
     def test_index_second_page_contains_one_records(self):
         """Проверка количества записей на главной странице (2стр)."""
-        response = self.guest_client.get(reverse('posts:index') + '?page=2')
+        response = self.get_second_page(reverse('posts:index'))
         self.assertEqual(len(response.context['page_obj']), 1)
 
     def test_group_first_page_contains_ten_records(self):
@@ -275,9 +297,8 @@ class PaginatorViewsTest(TestCase):
 
     def test_group_second_page_contains_ten_records(self):
         """Проверка количества записей на странице группы (2стр)."""
-        response = self.guest_client.get(
-            reverse(
-                'posts:group_list', kwargs={'slug': 'test-slug'}) + '?page=2')
+        response = self.get_second_page(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}))
         self.assertEqual(len(response.context['page_obj']), 1)
 
     def test_profile_first_page_contains_ten_records(self):
@@ -288,8 +309,51 @@ class PaginatorViewsTest(TestCase):
 
     def test_profile_second_page_contains_ten_records(self):
         """Проверка количества записей на странице профиля (2стр)."""
-        response = self.guest_client.get(
-            reverse(
-                'posts:profile', kwargs={'username': self.user.username}
-            ) + '?page=2')
+        response = self.get_second_page(
+            reverse('posts:profile', kwargs={'username': self.user.username}))
         self.assertEqual(len(response.context['page_obj']), 1)
+
+    def test_second_page_continues_first_page(self):
+        """Вторая страница продолжает первую без пропусков и повторов."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        first_page, second_page = self.get_pages(url)
+        self.assertEqual(
+            list(first_page) + list(second_page),
+            list(sharding.using_author(Post.objects, self.user.pk)
+                 .order_by('-created', '-pk')))
+        self.assertTrue(second_page.has_previous())
+        self.assertFalse(second_page.has_next())
+        self.assertEqual(second_page.number, 2)
+
+    def test_previous_cursor_returns_first_page(self):
+        """Курсор назад со второй страницы ведёт на первую."""
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        first_page, second_page = self.get_pages(url)
+        cache.clear()
+        response = self.guest_client.get(
+            url, {'cursor': second_page.previous_cursor})
+        page_obj = response.context['page_obj']
+        self.assertEqual(list(page_obj), list(first_page))
+        self.assertFalse(page_obj.has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор не ломает страницу, а открывает первую."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': 'не-курсор'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_foreign_cursor_returns_first_page(self):
+        """Курсор с рангом поиска вместо даты открывает первую страницу."""
+        for position in ('1.5', 'nan'):
+            token = encode_cursor(NEXT, float(position), 1, 2)
+            for url in (
+                reverse('posts:index'),
+                reverse('posts:profile',
+                        kwargs={'username': self.user.username}),
+            ):
+                with self.subTest(position=position, url=url):
+                    response = self.guest_client.get(url, {'cursor': token})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(
+                        response.context['page_obj'].number, 1)
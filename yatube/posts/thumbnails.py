@@ -0,0 +1,168 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core.profiling import timed
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры, которые выводят шаблоны записей.
+GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+    'card-480': ('480x170', {'crop': 'center', 'upscale': False}),
+    'card-1440': ('1440x509', {'crop': 'center', 'upscale': False}),
+}
+# Ширины для srcset: браузер сам выбирает подходящую экрану.
+SRCSET = {
+    'card': ('card-480', 'card', 'card-1440'),
+}
+
+
+class ReadyThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет найти миниатюру, не строя её."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        # Те же опции по умолчанию, что и в get_thumbnail, иначе имя
+        # файла миниатюры не совпадёт.
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища sorl или None."""
+        thumbnail = self.thumbnail_file(file_, geometry_string, **options)
+        return default.kvstore.get(thumbnail)
+
+
+backend = ReadyThumbnailBackend()
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def get_ready(image, size='card'):
+    geometry, options = GEOMETRIES[size]
+    with timed('thumb'):
+        return backend.get_ready(image, geometry, **options)
+
+
+def prefetch(posts, sizes=None):
+    """
+    Находит готовые миниатюры для всех картинок страницы одним пакетом.
+
+    Вместо отдельного обращения к хранилищу sorl на каждую картинку и
+    размер - один get_many в кеш и один запрос в базу за промахами.
+    Результат (None, если миниатюры ещё нет) кладётся в словарь
+    image.ready_thumbnails по размерам, его читают теги thumbnail_url
+    и thumbnail_srcset. По умолчанию ищутся все размеры GEOMETRIES.
+    """
+    images = [post.image for post in posts if post.image]
+    kv_cache = getattr(default.kvstore, 'cache', None)
+    if not images or kv_cache is None:
+        return posts
+    with timed('thumb'):
+        _prefetch(images, kv_cache, sizes or list(GEOMETRIES))
+    return posts
+
+
+def _prefetch(images, kv_cache, sizes):
+    by_key = {}
+    for image in images:
+        image.ready_thumbnails = {}
+        for size in sizes:
+            geometry, options = GEOMETRIES[size]
+            thumbnail = backend.thumbnail_file(
+                image.name, geometry, **options)
+            by_key.setdefault(add_prefix(thumbnail.key), []).append(
+                (image, size))
+    values = kv_cache.get_many(list(by_key))
+    missing = [key for key in by_key if key not in values]
+    if missing:
+        stored = dict(
+            KVStore.objects.filter(key__in=missing)
+            .values_list('key', 'value')
+        )
+        if stored:
+            kv_cache.set_many(stored, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        # Метка «миниатюры нет» живёт недолго: воркер мог записать готовую
+        # миниатюру между чтением базы и этой записью, и вечная метка
+        # затёрла бы её в кеше.
+        pending = {key: EMPTY_VALUE for key in missing if key not in stored}
+        if pending:
+            kv_cache.set_many(pending, settings.THUMBNAIL_PENDING_TIMEOUT)
+        values.update(stored)
+        values.update(pending)
+    for key, targets in by_key.items():
+        value = values[key]
+        ready = None
+        if value and value != EMPTY_VALUE:
+            ready = deserialize_image_file(value)
+        for image, size in targets:
+            image.ready_thumbnails[size] = ready
+
+
+def generate(name):
+    """Строит все известные миниатюры картинки."""
+    for geometry, options in GEOMETRIES.values():
+        backend.get_thumbnail(name, geometry, **options)
+
+
+def _work(name):
+    try:
+        generate(name)
+    except Exception:
+        logger.exception('Не удалось построить миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        connection.close()
+
+
+def _submit(name):
+    global _executor
+    if not settings.THUMBNAIL_WORKERS:
+        generate(name)
+        return
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    _executor.submit(_work, name)
+
+
+def schedule(image):
+    """
+    Ставит картинку в очередь фоновой генерации миниатюр.
+
+    Задача уходит в пул после фиксации транзакции, чтобы воркер видел
+    уже сохранённый файл. При THUMBNAIL_WORKERS = 0 миниатюры строятся
+    сразу, в текущем потоке.
+    """
+    if image:
+        name = image.name
+        transaction.on_commit(lambda: _submit(name))
@@ -0,0 +1,224 @@
+import heapq
+import itertools
+
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Q
+
+from core.db import atomic_write
+from core.paginator import CursorPaginator, NEXT
+from posts import follows, sharding
+from posts.models import Follow, Post, TimelineEntry, UserStats
+
+
+def celebrity_ids(author_ids):
+    """Авторы, чьи записи не раскладываются по лентам при публикации."""
+    return set(
+        UserStats.objects.filter(
+            user_id__in=author_ids,
+            follower_count__gt=settings.FEED_FANOUT_LIMIT,
+        ).values_list('user_id', flat=True)
+    )
+
+
+def trim(user_ids, using=None):
+    """
+    Обрезает ленты читателей до FEED_TIMELINE_LENGTH записей.
+
+    Лента лежит по шардам авторов, и обрезается её часть на шарде
+    using: до FEED_TIMELINE_LENGTH записей с каждого. Ленты пачки
+    читателей обрезаются одним DELETE: место записи в ленте считает
+    ROW_NUMBER в том же порядке, в каком лента читается.
+    """
+    using = using or router.db_for_write(TimelineEntry)
+    connection = connections[using]
+    table = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        for batch in sharding.chunked(user_ids):
+            placeholders = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {table} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY created DESC, post_id DESC'
+                f') AS position FROM {table} '
+                f'WHERE user_id IN ({placeholders})) AS ranked '
+                f'WHERE position > %s)',
+                [*batch, settings.FEED_TIMELINE_LENGTH])
+
+
+def fan_out(post):
+    """Раскладывает новую запись по лентам подписчиков автора."""
+    if celebrity_ids([post.author_id]):
+        return
+    follower_ids = list(
+        Follow.objects.filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    using = post._state.db
+    with atomic_write(using=using):
+        TimelineEntry.objects.using(using).bulk_create(
+            [TimelineEntry(user_id=user_id, post=post, created=post.created)
+             for user_id in follower_ids],
+            ignore_conflicts=True,
+        )
+        trim(follower_ids, using)
+
+
+def backfill(user, author):
+    """Добавляет в ленту читателя последние записи нового автора."""
+    if celebrity_ids([author.pk]):
+        return
+    _backfill([user.pk], author.pk)
+
+
+def restore(author_id):
+    """
+    Раскладывает записи автора, переставшего быть знаменитостью.
+
+    Пока подписчиков было больше FEED_FANOUT_LIMIT, его записи
+    подмешивались при чтении и в ленты не попадали. Когда число
+    подписчиков опускается до предела, подписчики получают его
+    последние записи, как при подписке.
+    """
+    follower_count = (
+        UserStats.objects.filter(user_id=author_id)
+        .values_list('follower_count', flat=True).first()
+    )
+    if follower_count != settings.FEED_FANOUT_LIMIT:
+        return
+    _backfill(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True).iterator(),
+        author_id)
+
+
+def _backfill(user_ids, author_id):
+    using = sharding.shard_for(author_id)
+    posts = list(
+        Post.objects.using(using).filter(author_id=author_id)
+        .order_by('-created', '-pk')
+        .values_list('pk', 'created')[:settings.FEED_TIMELINE_LENGTH]
+    )
+    if not posts:
+        return
+    with atomic_write(using=using):
+        for batch in sharding.chunked(user_ids):
+            TimelineEntry.objects.using(using).bulk_create(
+                [TimelineEntry(user_id=user_id, post_id=pk, created=created)
+                 for user_id in batch for pk, created in posts],
+                batch_size=sharding.BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            trim(batch, using)
+
+
+def remove(user, username):
+    """Убирает из ленты читателя записи автора, от которого он отписался."""
+    for using in sharding.aliases():
+        TimelineEntry.objects.using(using).filter(
+            user=user, post__author__username=username).delete()
+
+
+def rebuild(user_ids, batch_size=500):
+    """
+    Собирает ленты читателей заново, как их разложила бы публикация.
+
+    Нужна после массовой загрузки, когда сигналы не срабатывали:
+    подписки и последние записи авторов читаются пачками по
+    batch_size читателей, ленты сливаются в памяти и вставляются
+    одним bulk_create на пачку. Счётчики подписчиков к этому моменту
+    должны быть сверены, по ним отбираются авторы-знаменитости.
+    """
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        _rebuild(user_ids[start:start + batch_size])
+
+
+def _rebuild(user_ids):
+    follows = {}
+    for user_id, author_id in Follow.objects.filter(
+            user_id__in=user_ids).values_list('user_id', 'author_id'):
+        follows.setdefault(user_id, []).append(author_id)
+    author_ids = set(itertools.chain.from_iterable(follows.values()))
+    author_ids -= celebrity_ids(author_ids)
+    # Записи автора и места в лентах лежат на одном шарде, поэтому
+    # каждый шард собирается отдельно из своих записей.
+    for using in sharding.aliases():
+        _rebuild_shard(follows, author_ids, using)
+
+
+def _rebuild_shard(follows, author_ids, using):
+    length = settings.FEED_TIMELINE_LENGTH
+    posts = {}
+    for pk, author_id, created in (
+            Post.objects.using(using).filter(author_id__in=author_ids)
+            .order_by('-created', '-pk')
+            .values_list('pk', 'author_id', 'created').iterator()):
+        author_posts = posts.setdefault(author_id, [])
+        if len(author_posts) < length:
+            author_posts.append((created, pk))
+    entries = []
+    for user_id, authors in follows.items():
+        merged = heapq.merge(
+            *(posts.get(author_id, []) for author_id in authors),
+            reverse=True)
+        entries += [
+            TimelineEntry(user_id=user_id, post_id=pk, created=created)
+            for created, pk in itertools.islice(merged, length)]
+    TimelineEntry.objects.using(using).bulk_create(
+        entries, ignore_conflicts=True)
+
+
+class FeedPaginator(CursorPaginator):
+    """
+    Лента подписок читателя.
+
+    Обычные авторы читаются из готовой ленты TimelineEntry одним
+    диапазонным запросом по индексу. Записи авторов с огромным числом
+    подписчиков при публикации не раскладываются, поэтому добавляются
+    при чтении отдельным запросом и сливаются с лентой по ключу. С
+    несколькими шардами оба запроса идут на каждый шард.
+    """
+
+    def __init__(self, user, per_page, window=0):
+        entries = TimelineEntry.objects.filter(user=user).select_related(
+            'post', 'post__author', 'post__group')
+        super().__init__(entries, per_page, window)
+        self.celebrities = celebrity_ids(follows.followed_ids(user))
+
+    def fetch(self, cursor, direction, limit, keys_only=False):
+        if direction == NEXT:
+            order = ('-created', '-post_id')
+            lookup = 'lt'
+        else:
+            order = ('created', 'post_id')
+            lookup = 'gt'
+        entries = self.queryset.order_by(*order)
+        if cursor is not None:
+            created, pk = cursor
+            entries = entries.filter(
+                Q(**{f'created__{lookup}': created})
+                | Q(created=created, **{f'post_id__{lookup}': pk}))
+
+        def fetch_shard(using):
+            shard = entries.using(using)
+            if keys_only:
+                return list(shard.values_list('created', 'post_id')[:limit])
+            return [entry.post for entry in shard[:limit]]
+        rows = sharding.gather(
+            fetch_shard, direction, limit, None if keys_only else self.key)
+        if not self.celebrities:
+            return rows
+        posts = sharding.ScatterPaginator(
+            Post.objects.filter(author_id__in=self.celebrities)
+            .select_related('author', 'group'),
+            self.per_page,
+        )
+        extra = posts.fetch(cursor, direction, limit, keys_only)
+        return self._merge(rows, extra, direction, limit, keys_only)
+
+    def _merge(self, rows, extra, direction, limit, keys_only):
+        key = (lambda row: row) if keys_only else self.key
+        merged = {key(row)[1]: row for row in rows + extra}
+        return sorted(
+            merged.values(), key=key, reverse=direction == NEXT)[:limit]
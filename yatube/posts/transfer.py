@@ -0,0 +1,120 @@
+import gzip
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Порядок важен: записи ссылаются на авторов и группы, комментарии и
+# подписки - на записи и пользователей.
+KINDS = ('group', 'user', 'post', 'comment', 'follow')
+
+
+class Encoder(DjangoJSONEncoder):
+    """Даты с микросекундами: по ним идут ключи постраничного вывода."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def open_stream(path, mode='r'):
+    """Файл JSONL, с расширением .gz сжимается на лету."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def clear_checkpoint(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def save_checkpoint(path, state):
+    """Пишет состояние через временный файл: обрыв не оставит половину."""
+    if not path:
+        return
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(state, file)
+    os.replace(temporary, path)
+
+
+def export_file(name, directory):
+    target = os.path.join(directory, name)
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with default_storage.open(name) as source, open(target, 'wb') as file:
+        shutil.copyfileobj(source, file)
+
+
+def import_file(name, directory):
+    if default_storage.exists(name):
+        return
+    with open(os.path.join(directory, name), 'rb') as source:
+        default_storage.save(name, File(source))
+
+
+def copy_media(copy, names, directory, workers):
+    """
+    Копирует картинки пачки в несколько потоков.
+
+    Возвращает имена, которые не удалось скопировать: недостающая
+    картинка не должна останавливать перенос всех данных.
+    """
+    names = sorted(set(filter(None, names)))
+    if not names or not directory:
+        return []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            lambda name: _try(copy, name, directory), names)
+        return [name for name, ok in zip(names, results) if not ok]
+
+
+def _try(copy, name, directory):
+    try:
+        copy(name, directory)
+    except OSError:
+        return False
+    return True
+
+
+class Progress:
+    """Считает строки по типам и раз в every секунд печатает скорость."""
+
+    def __init__(self, stream, every=5):
+        self.stream = stream
+        self.every = every
+        self.started = self.reported = time.monotonic()
+        self.counts = {}
+
+    def add(self, kind, count):
+        self.counts[kind] = self.counts.get(kind, 0) + count
+        now = time.monotonic()
+        if now - self.reported >= self.every:
+            self.reported = now
+            self.stream.write(self.line(now))
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def line(self, now=None):
+        elapsed = (now or time.monotonic()) - self.started
+        counts = ', '.join(
+            f'{kind}: {count}' for kind, count in self.counts.items())
+        rate = self.total() / elapsed if elapsed else 0
+        return f'{counts} - {rate:.0f} строк/с за {elapsed:.1f} с'
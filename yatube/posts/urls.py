@@ -10,12 +10,22 @@ urlpatterns = [
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'posts/<int:post_id>/comment/',
         views.add_comment,
         name='add_comment'
     ),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
     path(
         'profile/<str:username>/follow/',
         views.profile_follow,
@@ -27,4 +37,5 @@ urlpatterns = [
         name='profile_unfollow'
     ),
     path('follow/', views.follow_index, name='follow_index'),
+    path('search/', views.post_search, name='post_search'),
 ]
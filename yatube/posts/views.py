@@ -1,21 +1,49 @@
+from django.core.exceptions import PermissionDenied
+from django.http import JsonResponse, StreamingHttpResponse
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.contrib.auth.models import User
-from django.views.decorators.cache import cache_page
+from django.db.models import Count, Max
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
+from core.db import atomic_write
+from core.decorators import query_budget
+from core.page_cache import (
+    cache_page_by_generation, get_generations, make_etag)
+from core.paginator import ChronologicalPaginator, CursorPaginator
+from posts import (
+    archive, follows, search, sharding, stats, thumbnails, timeline)
 from posts.models import Post, Group, Follow
+from posts.search import SearchPaginator
+from posts.sharding import ScatterPaginator
+from posts.timeline import FeedPaginator
 from posts.forms import PostForm, CommentForm
 
 POSTS_AMOUNT = 10
+PAGES_WINDOW = 2
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+COMMENTS_AMOUNT = 20
 
 
-@cache_page(timeout=20, key_prefix='index_page')
+def get_page(request, post_list, paginator_class=CursorPaginator):
+    """Возвращает страницу ленты по курсору из параметра cursor."""
+    paginator = paginator_class(post_list, POSTS_AMOUNT, PAGES_WINDOW)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+def get_comments(request, post):
+    """Страница комментариев к записи: от ранних к поздним, по курсору."""
+    paginator = ChronologicalPaginator(
+        post.comments.select_related('author'), COMMENTS_AMOUNT)
+    return paginator.get_page(request.GET.get('cursor'))
+
+
+@query_budget(6, per_shard=4)
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'index')
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, POSTS_AMOUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_page(request, post_list, ScatterPaginator)
     title = 'Последние обновления на сайте'
     context = {
         'page_obj': page_obj,
@@ -24,12 +52,12 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@query_budget(7, per_shard=4)
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    group_posts = group.group_posts.all()
-    paginator = Paginator(group_posts, POSTS_AMOUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    group_posts = group.group_posts.select_related('author')
+    page_obj = get_page(request, group_posts, ScatterPaginator)
     title = f'Записи сообщества {str(group)}'
     context = {
         'group': group,
@@ -39,35 +67,62 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+# С шардами к запросам добавляется шард автора, пока его нет в кеше.
+@query_budget(8, per_shard=1)
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'profile:{username}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    if User.objects.filter(username=request.user).exists():
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    else:
-        following = False
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, POSTS_AMOUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    followers = author.following.count()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    following = follows.is_following(request.user, author.pk)
+    post_list = author.posts.select_related('group')
+    page_obj = get_page(request, post_list)
+    author_stats = stats.get_stats(author)
     title = f'Профайл пользователя {username}'
     context = {
         'author': author,
-        'count': post_list.count(),
+        'count': author_stats.post_count,
         'page_obj': page_obj,
         'title': title,
-        'followers': followers,
+        'followers': author_stats.follower_count,
         'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+EXPORT_FORMATS = {
+    'zip': (archive.zip_archive, 'application/zip'),
+    'ndjson': (archive.records, 'application/x-ndjson'),
+}
+
+
+@login_required
+def profile_export(request, username):
+    """
+    Все записи и комментарии пользователя одним файлом.
+
+    Ответ собирается по мере отдачи: ZIP с картинками или NDJSON без
+    них, память воркера не зависит от числа записей. Выгрузить можно
+    только свои данные.
+    """
+    if username != request.user.username:
+        raise PermissionDenied
+    export_format = request.GET.get('format', 'zip')
+    if export_format not in EXPORT_FORMATS:
+        export_format = 'zip'
+    stream, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        stream(request.user), content_type=content_type)
+    response['Content-Disposition'] = (
+        f'attachment; filename="yatube-{username}.{export_format}"')
+    response['Cache-Control'] = 'private, no-store'
+    return response
+
+
+@query_budget(8, per_shard=4)
 @login_required
 def follow_index(request):
-    user = get_object_or_404(User, username=request.user)
-    followings = user.follower.all()
-    if followings.count() == 0:
+    user = request.user
+    if not follows.followed_ids(user):
         title = 'У вас ещё нет подписок'
         page_obj = []
         context = {
@@ -75,8 +130,9 @@ def follow_index(request):
             'page_obj': page_obj,
         }
         return render(request, 'posts/follow.html', context)
-    post_list = Post.objects.filter(author__following__user=user)
-    if len(post_list) == 0:
+    paginator = FeedPaginator(user, POSTS_AMOUNT, PAGES_WINDOW)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    if not page_obj:
         title = 'У ваших авторов ещё нет публикаций'
         page_obj = []
         context = {
@@ -84,72 +140,180 @@ def follow_index(request):
             'page_obj': page_obj,
         }
         return render(request, 'posts/follow.html', context)
+    title = 'Ваши подписки'
+    context = {
+        'title': title,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/follow.html', context)
+
+
+# Результаты меняются вместе с любой записью, как и главная страница.
+@query_budget(7, per_shard=2)
+@cache_page_by_generation(PAGE_CACHE_TIMEOUT, 'layout', 'index')
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    if search.available():
+        paginator = SearchPaginator(query, POSTS_AMOUNT, PAGES_WINDOW)
     else:
-        paginator = Paginator(post_list, POSTS_AMOUNT)
-        page_number = request.GET.get('page')
-        page_obj = paginator.get_page(page_number)
-        title = 'Ваши подписки'
-        context = {
-            'title': title,
-            'page_obj': page_obj,
-        }
-        return render(request, 'posts/follow.html', context)
+        post_list = Post.objects.select_related('author', 'group')
+        words = search.terms(query)
+        for word in words:
+            post_list = post_list.filter(text__icontains=word)
+        if not words:
+            post_list = post_list.none()
+        paginator = ScatterPaginator(post_list, POSTS_AMOUNT, PAGES_WINDOW)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    if not query:
+        title = 'Поиск по записям'
+    elif page_obj:
+        title = f'Результаты поиска: {query}'
+    else:
+        title = f'По запросу «{query}» ничего не найдено'
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'title': title,
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    follower = get_object_or_404(User, username=request.user)
+    follower = request.user
     author = get_object_or_404(User, username=username)
     redirect_params = ['posts:profile', author.username]
     if author.username == follower.username:
         return redirect(*redirect_params)
-    Follow.objects.get_or_create(user=follower, author=author)
+    with atomic_write():
+        _, created = Follow.objects.get_or_create(
+            user=follower, author=author)
+        if created:
+            timeline.backfill(follower, author)
     return redirect(*redirect_params)
 
 
 @login_required
 def profile_unfollow(request, username):
-    unfollower = get_object_or_404(User, username=request.user)
-    unfollower.follower.filter(author__username=username).delete()
+    unfollower = request.user
+    with atomic_write():
+        unfollower.follower.filter(author__username=username).delete()
+        timeline.remove(unfollower, username)
     return redirect('posts:profile', username=username)
 
 
+def post_validators(request, post_id, content_type='text/html'):
+    """
+    ETag и Last-Modified страницы записи одним запросом.
+
+    Версию страницы задают даты изменения записи и её комментариев,
+    число комментариев (удаление тоже меняет страницу) и поколения
+    профиля автора, которые сдвигаются при смене его счётчиков и
+    подписок. Результат запоминается на время запроса.
+
+    ETag относится к одному представлению: в него входят тип ответа и
+    адрес с параметрами, у HTML, фрагмента комментариев и API с
+    разными fields он разный.
+    """
+    if not hasattr(request, 'post_validators'):
+        posts = sharding.using_post(Post.objects.all(), post_id)
+        row = (
+            posts.filter(pk=post_id).order_by()
+            .annotate(last_comment=Max('comments__modified'),
+                      comment_total=Count('comments'))
+            .values_list('modified', 'last_comment', 'comment_total',
+                         'author__username')
+            .first()
+        )
+        request.post_validators = (None, None)
+        if row is not None:
+            modified, last_comment, comment_total, username = row
+            generations = get_generations(['layout', f'profile:{username}'])
+            etag = make_etag(
+                request, content_type, request.get_full_path(),
+                modified.isoformat(), last_comment, comment_total,
+                generations)
+            request.post_validators = (
+                etag, max(filter(None, (modified, last_comment))))
+    return request.post_validators
+
+
+def post_etag(request, post_id):
+    return post_validators(request, post_id)[0]
+
+
+def post_last_modified(request, post_id):
+    return post_validators(request, post_id)[1]
+
+
+# С шардами счётчики автора читаются из default отдельно.
+@query_budget(6, per_shard=1)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    post_list = post.author.posts.all()
-    comments = post.comments.all()
-    followers = post.author.following.count()
-    if User.objects.filter(username=request.user).exists():
-        following = Follow.objects.filter(user=request.user,
-                                          author=post.author).exists()
-    else:
-        following = False
+    post = get_object_or_404(
+        sharding.using_post(
+            Post.objects.select_related('author__stats', 'group'), post_id),
+        pk=post_id)
+    thumbnails.prefetch([post])
+    comments = get_comments(request, post)
+    author_stats = stats.get_stats(post.author)
+    following = follows.is_following(request.user, post.author_id)
     form = CommentForm()
     title = post.short_title()
     context = {
         'title': title,
-        'count': post_list.count(),
+        'count': author_stats.post_count,
         'post': post,
         'comments': comments,
         'form': form,
-        'followers': followers,
+        'followers': author_stats.follower_count,
         'following': following,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@query_budget(3)
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
+def post_comments(request, post_id):
+    """Следующая порция комментариев фрагментом для кнопки на странице."""
+    post = get_object_or_404(
+        sharding.using_post(Post.objects.all(), post_id), pk=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments(request, post),
+    }
+    return render(request, 'posts/includes/comments.html', context)
+
+
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    """
+    Сохраняет комментарий.
+
+    Обычной форме отвечает переходом на страницу записи, запросу из
+    скрипта - только разметкой нового комментария или ошибками формы.
+    """
+    post = get_object_or_404(
+        sharding.using_post(Post.objects.all(), post_id), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        # Комментарий и счётчик с версией записи фиксируются вместе.
+        with atomic_write(using=post._state.db):
+            comment.save()
+        if request.is_ajax():
+            return render(request, 'posts/includes/comment.html',
+                          {'comment': comment}, status=201)
+    elif request.is_ajax():
+        return JsonResponse({'errors': form.errors}, status=400)
     return redirect('posts:post_detail', post_id=post_id)
 
 
+@query_budget(3)
 @login_required
 def post_create(request):
     new_post = Post
@@ -158,7 +322,8 @@ def post_create(request):
         if form.is_valid():
             new_post = form.save(commit=False)
             new_post.author = request.user
-            new_post.save()
+            with atomic_write():
+                new_post.save()
             return redirect('posts:profile', username=request.user)
     form = PostForm()
     title = 'Новая запись'
@@ -169,9 +334,11 @@ def post_create(request):
     return render(request, 'posts/post_create.html', context)
 
 
+@query_budget(4)
 def post_edit(request, post_id):
-    edit_post = get_object_or_404(Post, pk=post_id)
-    if edit_post.author != request.user:
+    edit_post = get_object_or_404(
+        sharding.using_post(Post.objects.all(), post_id), pk=post_id)
+    if edit_post.author_id != request.user.pk:
         return redirect('posts:post_detail', post_id=post_id)
     form = PostForm(
         request.POST or None,
@@ -179,7 +346,8 @@ def post_edit(request, post_id):
         instance=edit_post,
     )
     if form.is_valid():
-        edit_post = form.save()
+        with atomic_write(using=edit_post._state.db):
+            edit_post = form.save()
         return redirect('posts:post_detail', post_id=post_id)
     title = 'Редактировать запись'
     is_edit = True
@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -58,6 +59,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -72,7 +75,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.profiling.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -93,13 +96,48 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# core.backends.sqlite3 - sqlite3 с WAL, повтором при занятой базе и
+# очередью на запись внутри процесса.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
 
+# Реплики только для чтения. YATUBE_REPLICAS=2 добавляет алиасы
+# replica1 и replica2 - копии основной базы, которые обновляет
+# manage.py sync_replicas. Запись всегда идёт в default, после неё
+# пользователь REPLICA_PIN_SECONDS читает оттуда же.
+DATABASE_REPLICAS = []
+for number in range(1, int(os.getenv('YATUBE_REPLICAS', '0')) + 1):
+    alias = f'replica{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+# Шарды записей и комментариев. Первый - default, YATUBE_SHARDS=3
+# добавляет shard2 и shard3. Записи автора со всеми комментариями к
+# ним лежат на одном шарде, пользователи и группы копируются на все.
+DATABASE_SHARDS = ['default']
+for number in range(2, int(os.getenv('YATUBE_SHARDS', '1')) + 1):
+    alias = f'shard{number}'
+    DATABASES[alias] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db-{alias}.sqlite3'),
+    }
+    DATABASE_SHARDS.append(alias)
+
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.db_router.PrimaryReplicaRouter',
+]
+REPLICA_PIN_COOKIE = 'db_primary'
+REPLICA_PIN_SECONDS = 30
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -148,6 +186,58 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backend.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+            'MAX_BYTES': 256 * 1024 * 1024,
+        },
     }
 }
+
+# Тесты держат кеш и метрики во временном каталоге, а не в cache/.
+TEST_RUNNER = 'core.runner.TestRunner'
+
+# Лента подписок: сколько записей хранить у читателя и у авторов с каким
+# числом подписчиков не раскладывать записи по лентам при публикации.
+FEED_TIMELINE_LENGTH = 500
+FEED_FANOUT_LIMIT = 1000
+
+# Сколько потоков строят миниатюры в фоне; 0 - строить сразу в запросе.
+THUMBNAIL_WORKERS = 2
+# Сколько секунд prefetch помнит, что миниатюры ещё нет.
+THUMBNAIL_PENDING_TIMEOUT = 10
+
+# Приём картинок записей: больший файл или картинка с большим числом
+# пикселей отклоняются, остальные уменьшаются до IMAGE_MAX_SIDE по
+# большей стороне и пережимаются без метаданных.
+IMAGE_MAX_UPLOAD_SIZE = 20 * 2 ** 20
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_MAX_SIDE = 2560
+IMAGE_QUALITY = 82
+
+# Замеры запросов: заголовок Server-Timing и профили cProfile. Запрос
+# профилируется с вероятностью PROFILE_SAMPLE_RATE или по заголовку
+# PROFILE_HEADER со значением PROFILE_TOKEN (без токена - только в DEBUG).
+SERVER_TIMING = True
+PROFILE_SAMPLE_RATE = 0
+PROFILE_HEADER = 'X-Profile'
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_DIR = os.path.join(BASE_DIR, 'profiles')
+
+# Метрики Prometheus на /metrics/. Воркеры копят их в памяти и сбрасывают
+# в общий файл раз в METRICS_FLUSH_EVERY запросов или
+# METRICS_FLUSH_INTERVAL секунд. Читать их можно с заголовком
+# Authorization: Bearer METRICS_TOKEN или под персоналом.
+METRICS = True
+METRICS_PATH = os.path.join(BASE_DIR, 'cache', 'metrics.sqlite3')
+METRICS_FLUSH_EVERY = 50
+METRICS_FLUSH_INTERVAL = 5
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Журнал медленных запросов: порог в миллисекундах и сколько самых
+# дорогих запросов в нём держать. Воркер копит их в памяти и пишет в
+# базу после ответа, не чаще раза в SLOW_QUERY_FLUSH_INTERVAL секунд.
+SLOW_QUERY_MS = 100
+SLOW_QUERY_LOG_SIZE = 200
+SLOW_QUERY_FLUSH_INTERVAL = 5